@@ -0,0 +1,351 @@
+# Description: Batched version of the Kuba game built on NumPy. It holds K games as one (K, 49) array of marbles plus
+#              per-game capture, turn, Ko and winner arrays, and applies one move to every game in a single call.
+#              Invalid moves are reported through result code arrays instead of print/return False, and legal move
+#              masks for all games are computed at once. The rules are the same as KubaGame.make_move.
+
+import numpy as np
+
+# marble codes in the board array
+EMPTY, WHITE, BLACK, RED = 0, 1, 2, 3
+MARBLE_CODES = {'X': EMPTY, 'W': WHITE, 'B': BLACK, 'R': RED}
+MARBLE_LETTERS = 'XWBR'
+
+# direction codes, in the order used by the last axis of legal_moves
+DIRECTIONS = 'LRFB'
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+OPPOSITE_CODES = np.array([1, 0, 3, 2], dtype=np.int8)
+
+# result codes of step, in the order KubaGame.make_move checks them. OK to NOT_YOUR_TURN are the values of
+# KubaGame.MoveResult.
+OK = 0
+GAME_OVER = 1
+NOT_YOUR_MARBLE = 2
+KNOCKS_OWN_MARBLE = 3
+KO_RULE = 4
+INACCESSIBLE = 5
+NOT_YOUR_TURN = 6
+INACTIVE = 7
+
+# extra column after the 49 slots that is always empty. Rays are padded with it and slots on the edge use it as
+# the slot behind them, so gathers never need bounds checks.
+PAD = 49
+
+_OFFSETS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+def _build_tables():
+    """
+    builds the ray and slot behind tables for every slot and direction
+    :return: tuple of (rays, ray lengths, slots behind) arrays. rays[slot, direction] lists the slots from slot to the
+    edge in direction, padded with PAD. behind[slot, direction] is the slot that must be empty to push that way, or
+    PAD if it is off the board.
+    """
+    rays = np.full((49, 4, 7), PAD, dtype=np.intp)
+    ray_lengths = np.zeros((49, 4), dtype=np.intp)
+    behind = np.full((49, 4), PAD, dtype=np.intp)
+    for slot in range(49):
+        row, col = divmod(slot, 7)
+        for direction, (row_offset, col_offset) in enumerate(_OFFSETS):
+            length = 0
+            curr_row, curr_col = row, col
+            while 0 <= curr_row < 7 and 0 <= curr_col < 7:
+                rays[slot, direction, length] = curr_row * 7 + curr_col
+                length += 1
+                curr_row += row_offset
+                curr_col += col_offset
+            ray_lengths[slot, direction] = length
+
+            behind_row, behind_col = row - row_offset, col - col_offset
+            if 0 <= behind_row < 7 and 0 <= behind_col < 7:
+                behind[slot, direction] = behind_row * 7 + behind_col
+    return rays, ray_lengths, behind
+
+
+RAYS, RAY_LENGTHS, BEHIND = _build_tables()
+_STEPS = np.arange(7)
+
+# 49-bit masks used by the legal move generator, bit row * 7 + column
+_ONE, _SEVEN = np.uint64(1), np.uint64(7)
+_FULL = np.uint64((1 << 49) - 1)
+_COL_0 = np.uint64(sum(1 << (row * 7) for row in range(7)))
+_COL_6 = np.uint64(sum(1 << (row * 7 + 6) for row in range(7)))
+_ROW_0 = np.uint64((1 << 7) - 1)
+_ROW_6 = np.uint64(((1 << 7) - 1) << 42)
+_NOT_COL_0 = _FULL & ~_COL_0
+_NOT_COL_6 = _FULL & ~_COL_6
+
+# number of set bits in each byte, and position of the n-th set bit of each byte
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+_SELECT_BIT = np.array([[bit for bit in range(8) if byte >> bit & 1] + [0] * (8 - bin(byte).count('1'))
+                        for byte in range(256)], dtype=np.intp)
+
+
+def _pack(slot_flags):
+    """
+    packs per-slot flags into 49-bit masks
+    :param slot_flags: (K, 49) bool array
+    :return: (K,) uint64 array with bit row * 7 + column set where the flag is True
+    """
+    packed = np.packbits(slot_flags, axis=1, bitorder='little')
+    padded = np.zeros((slot_flags.shape[0], 8), dtype=np.uint8)
+    padded[:, :7] = packed
+    return padded.view('<u8')[:, 0].astype(np.uint64)
+
+
+class BatchKubaGame:
+    """
+    Represents K independent Kuba games advanced together.
+    Players are referred to by index: 0 for the first player and 1 for the second, matching the order of the
+    KubaGame constructor. A turn of -1 means no one has moved yet, so either player may move.
+    """
+
+    START_BOARD = ('WWXXXBB',
+                   'WWXRXBB',
+                   'XXRRRXX',
+                   'XRRRRRX',
+                   'XXRRRXX',
+                   'BBXRXWW',
+                   'BBXXXWW')
+
+    def __init__(self, num_games, player_colors=('W', 'B')):
+        """
+        initializes BatchKubaGame instance with num_games games in the starting position
+        :param num_games: number of games K
+        :param player_colors: marble colors of the first and second player
+        no return value
+        """
+        start = np.array([MARBLE_CODES[marble] for row in self.START_BOARD for marble in row] + [EMPTY], dtype=np.int8)
+        self._num_games = num_games
+        self._player_colors = np.array([MARBLE_CODES[color] for color in player_colors], dtype=np.int8)
+        self._slots = np.tile(start, (num_games, 1))
+        self._captures = np.zeros((num_games, 2), dtype=np.int8)
+        self._marble_counts = np.tile(np.bincount(start[:49], minlength=4).astype(np.int8), (num_games, 1))
+        self._turn = np.full(num_games, -1, dtype=np.int8)
+        self._winner = np.full(num_games, -1, dtype=np.int8)
+        self._ko_slot = np.full(num_games, -1, dtype=np.intp)
+        self._ko_direction = np.full(num_games, -1, dtype=np.int8)
+
+    def __len__(self):
+        """
+        :return: number of games K
+        """
+        return self._num_games
+
+    def get_boards(self):
+        """
+        no parameters
+        :return: (K, 7, 7) int8 array of marble codes (EMPTY, WHITE, BLACK, RED)
+        """
+        return self._slots[:, :49].reshape(self._num_games, 7, 7)
+
+    def get_board(self, game_index):
+        """
+        gets one game's board in the same form as KubaGame.get_board
+        :param game_index: index of the game
+        :return: board as a list of lists of 'W', 'B', 'R' and 'X'
+        """
+        return [[MARBLE_LETTERS[code] for code in self._slots[game_index, row * 7:row * 7 + 7]] for row in range(7)]
+
+    def get_captures(self):
+        """
+        no parameters
+        :return: (K, 2) array of red marbles captured by each player
+        """
+        return self._captures
+
+    def get_marble_counts(self):
+        """
+        no parameters
+        :return: (K, 3) array of white, black and red marbles on each board
+        """
+        return self._marble_counts[:, 1:]
+
+    def get_turn(self):
+        """
+        no parameters
+        :return: (K,) array of the index of the player whose turn it is, -1 before the first move
+        """
+        return self._turn
+
+    def get_winner(self):
+        """
+        no parameters
+        :return: (K,) array of the index of the winning player, -1 while the game is still going
+        """
+        return self._winner
+
+    def get_ko(self):
+        """
+        no parameters
+        :return: tuple of (K,) arrays of the slot the last pushed line ended on (row * 7 + column) and the direction
+        code it was pushed in, both -1 before the first move
+        """
+        return self._ko_slot, self._ko_direction
+
+    def step(self, players, slots, directions):
+        """
+        makes one move in every game. Moves are checked in the same order as KubaGame.make_move, and a game whose
+        move is invalid is left unchanged.
+        :param players: (K,) array of the index of the player making each move
+        :param slots: (K,) array of the slot (row * 7 + column) of the marble to push, or -1 to skip that game
+        :param directions: (K,) array of direction codes (0 L, 1 R, 2 F, 3 B)
+        :return: (K,) int8 array of result codes, OK where the move was made
+        """
+        players = np.asarray(players, dtype=np.intp)
+        slots = np.asarray(slots, dtype=np.intp)
+        directions = np.asarray(directions, dtype=np.intp)
+        games = np.arange(self._num_games)
+        skipped = slots < 0
+        slots = np.where(skipped, 0, slots)
+
+        own_color = self._player_colors[players]
+        rays = RAYS[slots, directions]
+        ray_lengths = RAY_LENGTHS[slots, directions]
+        line = self._slots[games[:, None], rays]
+
+        # the pushed line runs up to the first empty slot on the ray; if there is none, the edge marble falls off
+        gaps = (line == EMPTY) & (_STEPS < ray_lengths[:, None])
+        has_gap = gaps.any(axis=1)
+        line_end = np.where(has_gap, gaps.argmax(axis=1), ray_lengths - 1)
+        fallen = np.where(has_gap, EMPTY, line[games, ray_lengths - 1])
+
+        ko_direction = np.where(self._ko_direction >= 0, OPPOSITE_CODES[self._ko_direction], -1)
+        result = np.select(
+            [skipped,
+             self._winner >= 0,
+             line[:, 0] != own_color,
+             fallen == own_color,
+             (slots == self._ko_slot) & (directions == ko_direction),
+             self._slots[games, BEHIND[slots, directions]] != EMPTY,
+             (self._turn >= 0) & (self._turn != players)],
+            [INACTIVE, GAME_OVER, NOT_YOUR_MARBLE, KNOCKS_OWN_MARBLE, KO_RULE, INACCESSIBLE, NOT_YOUR_TURN],
+            OK).astype(np.int8)
+
+        moved = np.flatnonzero(result == OK)
+        if moved.size == 0:
+            return result
+        self._push(moved, players[moved], directions[moved], rays[moved], line[moved], line_end[moved], fallen[moved])
+        return result
+
+    def _push(self, games, players, directions, rays, line, line_end, fallen):
+        """
+        used within step to make already checked moves. All arguments are indexed by the games that move.
+        :param games: indices of the games that move
+        :param players: index of the player moving in each game
+        :param directions: direction code of each move
+        :param rays: slots on the ray of each move
+        :param line: marbles on the ray of each move before it is made
+        :param line_end: position on the ray where each pushed line ends
+        :param fallen: marble pushed off the board in each game, EMPTY if none
+        :return: no return value
+        """
+        # every marble from the start of the ray to the end of the line moves one slot along the ray
+        shifted = np.where(_STEPS <= line_end[:, None], np.roll(line, 1, axis=1), line)
+        shifted[:, 0] = EMPTY
+        self._slots[games[:, None], rays] = shifted
+        self._slots[:, PAD] = EMPTY
+
+        self._marble_counts[games, fallen] -= 1
+        self._marble_counts[:, EMPTY] = 0
+        captured_red = fallen == RED
+        self._captures[games[captured_red], players[captured_red]] += 1
+
+        # a player wins with 7 red marbles, or by pushing the other player's last marble off the board
+        won = (captured_red & (self._captures[games, players] == 7)) | (
+                (fallen != EMPTY) & ~captured_red & (self._marble_counts[games, fallen] == 0))
+        self._winner[games[won]] = players[won]
+
+        self._ko_slot[games] = rays[np.arange(games.size), line_end]
+        self._ko_direction[games] = directions
+        self._turn[games] = 1 - players
+
+    def legal_moves(self, players=None):
+        """
+        computes which moves are legal in every game, for the player whose turn it is
+        :param players: (K,) array of the player to use in games where no one has moved yet, defaults to player 0
+        :return: (K, 49, 4) bool array, True where pushing the marble on that slot in that direction is legal
+        """
+        legal_bits = self._legal_bits(players).astype('<u8').view(np.uint8).reshape(self._num_games, 4, 8)
+        legal = np.unpackbits(legal_bits, axis=2, bitorder='little')[:, :, :49]
+        return legal.transpose(0, 2, 1).astype(bool)
+
+    def random_moves(self, rng, players=None):
+        """
+        picks a random legal move in every game
+        :param rng: numpy random Generator
+        :param players: same as legal_moves parameter
+        :return: tuple of (slots, directions) arrays for step, slot -1 where a game has no legal move
+        """
+        games = np.arange(self._num_games)
+        legal_bytes = self._legal_bits(players).astype('<u8').view(np.uint8).reshape(self._num_games, 32)
+        byte_counts = _POPCOUNT[legal_bytes]
+        running_counts = np.cumsum(byte_counts, axis=1, dtype=np.int16)
+        num_legal = running_counts[:, -1]
+
+        # pick the n-th legal move with n uniform below the number of legal moves: find the byte holding it,
+        # then the bit within that byte
+        picks = (rng.random(self._num_games) * num_legal).astype(np.int16)
+        byte_index = np.minimum((running_counts <= picks[:, None]).sum(axis=1), 31)
+        rank = picks - (running_counts[games, byte_index] - byte_counts[games, byte_index])
+        bit_index = byte_index * 8 + _SELECT_BIT[legal_bytes[games, byte_index], np.minimum(rank, 7)]
+
+        slots = np.where(num_legal > 0, bit_index % 64, -1)
+        return slots, bit_index // 64
+
+    def _legal_bits(self, players=None):
+        """
+        computes legal moves as one 49-bit mask per game and direction, bit row * 7 + column set when pushing that
+        slot in that direction is legal. Everything is whole-board shifts on (K,) uint64 arrays.
+        :param players: same as legal_moves parameter
+        :return: (K, 4) uint64 array of legal move masks, in direction code order
+        """
+        if players is None:
+            players = np.zeros(self._num_games, dtype=np.intp)
+        movers = np.where(self._turn >= 0, self._turn, players)
+        own_color = self._player_colors[movers]
+        boards = self._slots[:, :49]
+        own = _pack(boards == own_color[:, None])
+        empty = _pack(boards == EMPTY)
+
+        # slots with an empty slot between them and the edge they are pushed towards, and slots whose line would
+        # end at one of the player's own marbles on that edge, found by spreading along rows and columns
+        gaps = [empty.copy(), empty.copy(), empty.copy(), empty.copy()]
+        own_edges = [own & _COL_0, own & _COL_6, own & _ROW_0, own & _ROW_6]
+        for _ in range(6):
+            for spread in (gaps, own_edges):
+                spread[0] |= (spread[0] << _ONE) & _NOT_COL_0
+                spread[1] |= (spread[1] >> _ONE) & _NOT_COL_6
+                spread[2] |= (spread[2] << _SEVEN) & _FULL
+                spread[3] |= spread[3] >> _SEVEN
+
+        # the slot behind must be empty or off the board
+        behind_open = [((empty >> _ONE) & _NOT_COL_6) | _COL_6, ((empty << _ONE) & _NOT_COL_0) | _COL_0,
+                       (empty >> _SEVEN) | _ROW_6, ((empty << _SEVEN) & _FULL) | _ROW_0]
+
+        legal = np.stack([own & behind_open[direction] & (gaps[direction] | ~own_edges[direction])
+                          for direction in range(4)], axis=1)
+        legal[self._winner >= 0] = 0
+
+        # Ko rule: the slot the last line ended on can't be pushed straight back
+        ko_games = np.flatnonzero(self._ko_slot >= 0)
+        ko_bits = np.left_shift(np.uint64(1), self._ko_slot[ko_games].astype(np.uint64))
+        legal[ko_games, OPPOSITE_CODES[self._ko_direction[ko_games]]] &= ~ko_bits
+        return legal
+
+    def rollout(self, max_moves, rng):
+        """
+        plays random legal moves in every game until each game is won, has no legal move or max_moves moves have
+        been played. Games where no one has moved yet start with player 0.
+        :param max_moves: most moves to play in each game
+        :param rng: numpy random Generator
+        :return: total number of moves made
+        """
+        total_moves = 0
+        for _ in range(max_moves):
+            movers = np.where(self._turn >= 0, self._turn, 0)
+            slots, directions = self.random_moves(rng, movers)
+            made = int(np.count_nonzero(self.step(movers, slots, directions) == OK))
+            if made == 0:
+                break
+            total_moves += made
+        return total_moves
@@ -0,0 +1,351 @@
+# Description: Benchmark suite for the Kuba game. Runs headlessly (pygame rendering uses SDL's offscreen "dummy"
+#              driver) and writes results as JSON. Given a saved baseline, it flags benchmarks that got slower.
+#              Usage: python KubaBench.py --output results.json [--compare baseline.json] [--threshold 0.1]
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from KubaGame import KubaGame, BEHIND_OFFSETS
+from KubaBitboard import BitboardKubaGame
+from KubaStats import MoveStats
+from KubaPerft import perft, STARTING_POSITION_COUNTS
+
+# depth of the perft benchmarks, whose ops are leaf nodes so ops_per_second is the engine's nodes per second
+PERFT_DEPTH = 4
+
+# importing the rules engine must stay below this many seconds, and must not load pygame
+IMPORT_TIME_BUDGET = 0.1
+
+PLAYERS = (('White', 'W'), ('Black', 'B'))
+
+
+def _random_positions(count, seed, engine=KubaGame):
+    """
+    plays random legal moves from the starting position to get a spread of positions. Moves are sorted before one
+    is picked, so the positions don't depend on the order legal_moves generates them in.
+    :param count: number of positions
+    :param seed: seed for the random moves
+    :param engine: KubaGame or BitboardKubaGame
+    :return: list of games, none of which is over
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = engine(PLAYERS[0], PLAYERS[1])
+        playername = rng.choice(PLAYERS)[0]
+        for _ in range(rng.randrange(80)):
+            moves = sorted(game.legal_moves(playername))
+            if not moves:
+                break
+            game.make_move(playername, *rng.choice(moves))
+            if game.get_winner() is not None:
+                break
+            playername = game.get_current_turn()
+        if game.get_winner() is None and game.get_current_turn() is not None:
+            positions.append(game)
+    return positions
+
+
+def _line_length(game, coordinates, direction):
+    """
+    :return: number of marbles a move pushes
+    """
+    row_offset, col_offset = BEHIND_OFFSETS[direction]
+    row, col = coordinates
+    length = 0
+    while 0 <= row < 7 and 0 <= col < 7 and game.get_marble((row, col)) != 'X':
+        length += 1
+        row, col = row - row_offset, col - col_offset
+    return length
+
+
+def _move_cases(positions, accept):
+    """
+    picks one legal move per position that accept likes
+    :param positions: list of games
+    :param accept: function taking (game, coordinates, direction) and returning True for moves to use
+    :return: list of (game, playername, coordinates, direction) tuples
+    """
+    cases = []
+    for game in positions:
+        playername = game.get_current_turn()
+        for coordinates, direction in game.legal_moves(playername):
+            if accept(game, coordinates, direction):
+                cases.append((game, playername, coordinates, direction))
+                break
+    return cases
+
+
+def _time_calls(run, repeats, setup=None):
+    """
+    times run the given number of times, keeping the fastest
+    :param run: function taking setup's result and returning the number of operations it performed
+    :param repeats: number of timed runs
+    :param setup: untimed function called before each run, its result is passed to run
+    :return: dictionary with ops, best seconds per run and operations per second
+    """
+    best = None
+    ops = 0
+    for _ in range(repeats):
+        prepared = setup() if setup is not None else None
+        start = time.perf_counter()
+        ops = run(prepared)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return {'ops': ops, 'seconds': best, 'ops_per_second': ops / best if best > 0 else 0.0}
+
+
+def bench_check_knock_own_marble(positions, repeats):
+    """
+    times check_knock_own_marble for every slot and direction of each position
+    """
+    def run(prepared):
+        calls = 0
+        for game in positions:
+            for direction in 'LRFB':
+                for row in range(7):
+                    for col in range(7):
+                        game.check_knock_own_marble('W', direction, (row, col))
+                        calls += 1
+        return calls
+    return _time_calls(run, repeats)
+
+
+def bench_marble_count(positions, method_name, repeats):
+    """
+    times one marble counting method of each position
+    :param method_name: 'get_marble_count' for the kept counts, '_scan_marble_count' for a scan of the board
+    """
+    def run(prepared):
+        for game in positions:
+            getattr(game, method_name)()
+        return len(positions)
+    return _time_calls(run, repeats)
+
+
+def bench_make_move(cases, repeats, move_stats=None):
+    """
+    times make_move on copies of each case's game
+    :param move_stats: MoveStats to instrument the copies with, None to time the uninstrumented path
+    """
+    def setup():
+        prepared = [(copy.deepcopy(game), playername, coordinates, direction)
+                    for game, playername, coordinates, direction in cases]
+        for game, _, _, _ in prepared:
+            game.set_move_stats(move_stats)
+        return prepared
+
+    def run(prepared):
+        for game, playername, coordinates, direction in prepared:
+            game.make_move(playername, coordinates, direction)
+        return len(prepared)
+    return _time_calls(run, repeats, setup)
+
+
+def bench_import_time(repeats):
+    """
+    times importing KubaGame in a fresh interpreter, and checks that it doesn't load pygame
+    """
+    code = ("import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import KubaGame\n"
+            "print(time.perf_counter() - start, 'pygame' in sys.modules)\n")
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    loads_pygame = False
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True,
+                                check=True).stdout.split()
+        seconds = float(output[0])
+        loads_pygame = loads_pygame or output[1] == 'True'
+        if best is None or seconds < best:
+            best = seconds
+    return {'ops': 1, 'seconds': best, 'ops_per_second': 1 / best, 'loads_pygame': loads_pygame,
+            'budget': IMPORT_TIME_BUDGET, 'within_budget': best <= IMPORT_TIME_BUDGET and not loads_pygame}
+
+
+def bench_playouts(engine, games, seed, repeats):
+    """
+    times whole games of random legal moves, picked from the sorted moves like _random_positions
+    """
+    def run(prepared):
+        rng = random.Random(seed)
+        moves = 0
+        for _ in range(games):
+            game = engine(PLAYERS[0], PLAYERS[1])
+            playername = PLAYERS[0][0]
+            while game.get_winner() is None and moves < 10 ** 7:
+                legal = sorted(game.legal_moves(playername))
+                if not legal:
+                    break
+                game.make_move(playername, *rng.choice(legal))
+                moves += 1
+                playername = game.get_current_turn()
+        return moves
+    result = _time_calls(run, repeats)
+    result['games_per_second'] = games / result['seconds']
+    return result
+
+
+def bench_perft(engine, depth, repeats):
+    """
+    times perft from the starting position, and checks the counts against KubaPerft.STARTING_POSITION_COUNTS
+    """
+    counts = {}
+
+    def run(prepared):
+        counts.update(perft(engine(PLAYERS[0], PLAYERS[1]), depth))
+        return counts['nodes']
+    result = _time_calls(run, repeats)
+    result['counts_match'] = counts == STARTING_POSITION_COUNTS[depth]
+    return result
+
+
+def bench_render(positions, repeats):
+    """
+    times PyGameFeatures.update_interface redrawing after each move of a game, with an offscreen display
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        from KubaGUI import PyGameFeatures
+    except ImportError:
+        return None
+
+    game = KubaGame(PLAYERS[0], PLAYERS[1])
+    players = [game.get_player_from_name(name) for name, _ in PLAYERS]
+    interface = PyGameFeatures(game.get_board(), players[0], players[1])
+    boards = [position.get_board() for position in positions]
+    position_players = [[position.get_player_from_name(name) for name, _ in PLAYERS] for position in positions]
+
+    def run(prepared):
+        for board, (player_1, player_2) in zip(boards, position_players):
+            interface.update_interface(board, player_1, player_2)
+        return len(boards)
+    return _time_calls(run, repeats)
+
+
+def run_benchmarks(quick=False, only=None, seed=2021):
+    """
+    runs the benchmark suite
+    :param quick: use fewer positions and repeats
+    :param only: list of benchmark names to run, None for all
+    :param seed: seed for generating positions and playouts
+    :return: dictionary mapping benchmark name to its result
+    """
+    count = 200 if quick else 1000
+    repeats = 3 if quick else 7
+    playout_games = 5 if quick else 25
+    positions = _random_positions(count, seed)
+    bitboard_positions = _random_positions(count, seed, BitboardKubaGame)
+
+    benchmarks = {
+        'import_time': lambda: bench_import_time(repeats),
+        'legal_moves': lambda: _time_calls(
+            lambda prepared: sum(1 for game in positions for _ in game.legal_moves(game.get_current_turn())),
+            repeats),
+        'check_knock_own_marble': lambda: bench_check_knock_own_marble(positions, repeats),
+        'get_marble_count': lambda: bench_marble_count(positions, 'get_marble_count', repeats),
+        'scan_marble_count': lambda: bench_marble_count(positions, '_scan_marble_count', repeats),
+        'make_move_long_chain': lambda: bench_make_move(
+            _move_cases(positions,
+                        lambda game, coordinates, direction: _line_length(game, coordinates, direction) >= 4),
+            repeats),
+        'make_move_instrumented': lambda: bench_make_move(
+            _move_cases(positions, lambda game, coordinates, direction: True), repeats, MoveStats()),
+        'make_move_bitboard': lambda: bench_make_move(
+            _move_cases(bitboard_positions, lambda game, coordinates, direction: True), repeats),
+        'playout_list': lambda: bench_playouts(KubaGame, playout_games, seed, repeats),
+        'playout_bitboard': lambda: bench_playouts(BitboardKubaGame, playout_games, seed, repeats),
+        'perft_list': lambda: bench_perft(KubaGame, PERFT_DEPTH, repeats),
+        'perft_bitboard': lambda: bench_perft(BitboardKubaGame, PERFT_DEPTH, repeats),
+        'render_update': lambda: bench_render(positions[:100], repeats),
+    }
+    for direction in 'LRFB':
+        benchmarks['make_move_' + direction] = (
+            lambda direction=direction: bench_make_move(
+                _move_cases(positions, lambda game, coordinates, move_direction: move_direction == direction),
+                repeats))
+
+    results = {}
+    for name in sorted(benchmarks):
+        if only and name not in only:
+            continue
+        result = benchmarks[name]()
+        if result is not None:
+            results[name] = result
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    finds benchmarks that got slower than the baseline
+    :param results: results from run_benchmarks
+    :param baseline: results saved from an earlier run
+    :param threshold: fraction of the baseline's operations per second a benchmark may lose before it is flagged
+    :return: list of (name, baseline ops per second, current ops per second, change as a fraction) for regressions
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        old = baseline[name]['ops_per_second']
+        new = result['ops_per_second']
+        change = (new - old) / old if old else 0.0
+        if change < -threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    """
+    command line entry point
+    :param argv: command line arguments, defaults to sys.argv
+    :return: exit status, 1 if a benchmark regressed or import time is over budget
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the Kuba game engine and interface.")
+    parser.add_argument('--output', help="file to write JSON results to, stdout if not given")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="slowdown, as a fraction, that counts as a regression (default 0.1)")
+    parser.add_argument('--quick', action='store_true', help="fewer positions and repeats")
+    parser.add_argument('--only', nargs='*', help="names of benchmarks to run")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.quick, args.only)
+    report = {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(), 'time': time.time()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    status = 0
+    for name, result in sorted(results.items()):
+        print("%-24s %14.1f ops/s" % (name, result['ops_per_second']), file=sys.stderr)
+    if 'import_time' in results and not results['import_time']['within_budget']:
+        print("import_time over budget of %.3fs (or loads pygame)" % IMPORT_TIME_BUDGET, file=sys.stderr)
+        status = 1
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        for name, old, new, change in compare(results, baseline, args.threshold):
+            print("REGRESSION %-24s %12.1f -> %12.1f ops/s (%+.1f%%)" % (name, old, new, change * 100),
+                  file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+# Description: Bitboard-backed version of the Kuba game. The board is stored as three packed 49-bit integers
+#              (one per marble color) instead of a 7x7 list of strings, so pushes, fall-offs and captures are
+#              shift-and-mask operations instead of one set_marble call per slot. Move validation and legal move
+#              generation test whole rays and whole boards with masks, and which marbles are accessible is worked out
+#              from the bitboards when needed instead of being kept up to date on every move.
+
+from KubaGame import KubaGame, MoveResult, ZOBRIST_MARBLES, RAYS, BEHIND_SLOTS, OPPOSITE_DIRECTIONS, SLOT_COORDINATES
+
+# bit index of slot (row, column) is row * 7 + column
+MARBLE_COLORS = ('W', 'B', 'R')
+
+# how far a bit moves when a marble is pushed one slot in each direction, and whether bit indices
+# increase (True) or decrease (False) along the direction of the push
+DIRECTION_SHIFTS = {'L': (1, False), 'R': (1, True), 'F': (7, False), 'B': (7, True)}
+DIRECTION_OFFSETS = {'L': (0, -1), 'R': (0, 1), 'F': (-1, 0), 'B': (1, 0)}
+
+
+def _build_ray_masks():
+    """
+    builds, for each direction and each of the 49 slots, the mask of slots from that slot (inclusive) to the edge
+    of the board in that direction
+    :return: dictionary mapping direction to a list of 49 masks
+    """
+    ray_masks = {}
+    for direction, (row_offset, col_offset) in DIRECTION_OFFSETS.items():
+        masks = []
+        for row in range(7):
+            for col in range(7):
+                mask = 0
+                curr_row, curr_col = row, col
+                while 0 <= curr_row < 7 and 0 <= curr_col < 7:
+                    mask |= 1 << (curr_row * 7 + curr_col)
+                    curr_row += row_offset
+                    curr_col += col_offset
+                masks.append(mask)
+        ray_masks[direction] = masks
+    return ray_masks
+
+
+RAY_MASKS = _build_ray_masks()
+
+# all 49 slots
+BOARD_MASK = (1 << 49) - 1
+
+# for each direction, the bit of the edge slot at the end of each slot's ray
+RAY_END_BITS = {direction: [1 << ray[-1] for ray in rays] for direction, rays in RAYS.items()}
+
+# for each direction, the bit of the slot behind each slot that has to be empty for a push, 0 if it is off the board
+BEHIND_BITS = {direction: [0 if behind is None else 1 << behind for behind in behind_slots]
+               for direction, behind_slots in BEHIND_SLOTS.items()}
+
+# for each direction, the slots whose slot behind is off the board, so they can always be pushed that way
+BEHIND_EDGE_MASKS = {direction: sum(1 << index for index, behind in enumerate(behind_slots) if behind is None)
+                     for direction, behind_slots in BEHIND_SLOTS.items()}
+
+
+def _line_mask(ray, end_bit, increasing):
+    """
+    cuts a ray mask down to the slots from its start up to and including end_bit
+    :param ray: mask from RAY_MASKS
+    :param end_bit: single bit on the ray where the line ends
+    :param increasing: whether bit indices increase along the ray
+    :return: mask of the slots on the line
+    """
+    if increasing:
+        return ray & ((end_bit << 1) - 1)
+    return ray & ~(end_bit - 1)
+
+
+def _hash_bits(keys, bits):
+    """
+    combines the Zobrist keys of every slot whose bit is set
+    :param keys: list of 49 Zobrist keys for one marble color
+    :param bits: mask of slots
+    :return: XOR of the keys of the slots in bits
+    """
+    key = 0
+    while bits:
+        bit = bits & -bits
+        key ^= keys[bit.bit_length() - 1]
+        bits ^= bit
+    return key
+
+
+def _open_behind_mask(empty, direction):
+    """
+    finds the slots that can be pushed in direction because the slot behind them is empty or off the board
+    :param empty: mask of the empty slots
+    :param direction: direction of the push
+    :return: mask of the slots, whether or not they hold a marble
+    """
+    shift, increasing = DIRECTION_SHIFTS[direction]
+    edge = BEHIND_EDGE_MASKS[direction]
+    # the slot behind is one shift back against the push, so move each empty bit one shift forward onto its slot
+    if increasing:
+        behind_empty = empty << shift
+    else:
+        behind_empty = empty >> shift
+    return (behind_empty & BOARD_MASK & ~edge) | edge
+
+
+class BitboardKubaGame(KubaGame):
+    """
+    Represents a Kuba game whose board is kept as one bitboard per marble color.
+    Turn order, captures and winner tracking are inherited from KubaGame; the board storage, the push, move
+    validation and move generation are replaced with mask operations that follow the same rules, so it plays
+    exactly the same games as KubaGame.
+    """
+
+    def __init__(self, player1, player2, debug=False, move_stats=None):
+        """
+        initializes BitboardKubaGame instance. KubaGame.__init__ assigns the starting layout to _board, which is
+        converted into bitboards by the _board property below.
+        :param player1: (name, marble color) tuple of the first player
+        :param player2: (name, marble color) tuple of the second player
+        :param debug: same as KubaGame debug parameter
+        :param move_stats: same as KubaGame move_stats parameter
+        no return value
+        """
+        self._bitboards = dict.fromkeys(MARBLE_COLORS, 0)
+        super().__init__(player1, player2, debug, move_stats)
+
+    @property
+    def _board(self):
+        """
+        list of lists view of the bitboards, in the same layout KubaGame uses for its board
+        """
+        return [[self.get_marble((row, col)) for col in range(7)] for row in range(7)]
+
+    @_board.setter
+    def _board(self, board):
+        """
+        loads a list of lists board into the bitboards
+        :param board: 7x7 list of lists of 'W', 'B', 'R' or 'X'
+        """
+        bitboards = dict.fromkeys(MARBLE_COLORS, 0)
+        for row_num, row in enumerate(board):
+            for col_num, marble in enumerate(row):
+                if marble != 'X':
+                    bitboards[marble] |= 1 << (row_num * 7 + col_num)
+        self._bitboards = bitboards
+
+    @property
+    def _accessible(self):
+        """
+        (coordinates, direction) pushes whose slot behind is open, in the same form KubaGame keeps them, worked out
+        from the bitboards
+        """
+        bitboards = self._bitboards
+        occupied = bitboards['W'] | bitboards['B'] | bitboards['R']
+        accessible = {}
+        for direction in DIRECTION_SHIFTS:
+            pushable = occupied & _open_behind_mask(BOARD_MASK & ~occupied, direction)
+            accessible[direction] = {SLOT_COORDINATES[index] for index in range(49) if pushable >> index & 1}
+        return accessible
+
+    @_accessible.setter
+    def _accessible(self, accessible):
+        """
+        ignores assignments from KubaGame: the accessible pushes are always worked out from the bitboards, so there
+        is nothing to reset
+        """
+        pass
+
+    def _update_accessibility(self, slots):
+        """
+        does nothing, see _accessible
+        :param slots: iterable of coordinates of slots that changed
+        :return: none
+        """
+        pass
+
+    def get_board(self):
+        """
+        returns board as a list of lists. The list is built from the bitboards, so changing it doesn't change the game.
+        """
+        return self._board
+
+    def get_bitboards(self):
+        """
+        no parameters
+        :return: tuple of the (W, B, R) bitboards, bit row * 7 + column is set when that marble is at (row, column)
+        """
+        return self._bitboards['W'], self._bitboards['B'], self._bitboards['R']
+
+    def get_marble(self, coordinates):
+        """
+        returns what is present at the coordinates parameter on the board. Indexing follows the list of lists board,
+        so negative indices count back from the far edge.
+        :param coordinates: coordinates of board spot for which you want to see what is present there
+        :return: return X, W, B, R, depending on what is present at the coordinates location
+        """
+        row, col = coordinates
+        if not (-7 <= row < 7 and -7 <= col < 7):
+            raise IndexError("board coordinates out of range")
+        bit = 1 << (row % 7 * 7 + col % 7)
+        bitboards = self._bitboards
+        if bitboards['W'] & bit:
+            return 'W'
+        if bitboards['B'] & bit:
+            return 'B'
+        if bitboards['R'] & bit:
+            return 'R'
+        return 'X'
+
+    def set_marble(self, coordinates, marble_color):
+        """
+        set's board slot at coordinates position to be marble_Color parameter
+        :param coordinates: coordinates of the slot on board you want to change color of
+        :param marble_color: color you want to change that slot to
+        :return: none
+        """
+        index = coordinates[0] * 7 + coordinates[1]
+        self._board_hash ^= ZOBRIST_MARBLES[self.get_marble(coordinates)][index] ^ ZOBRIST_MARBLES[marble_color][index]
+
+        bit = 1 << index
+        for marble in MARBLE_COLORS:
+            self._bitboards[marble] &= ~bit
+        if marble_color != 'X':
+            self._bitboards[marble_color] |= bit
+
+    def _scan_marble_count(self):
+        """
+        gets number of white, black, and red marbles as tuple in the order (W, B, R) by counting the set bits
+        of each bitboard
+        no parameters
+        :return: tuple of counts of white, black, and red marbles currently on board
+        """
+        return tuple(bin(self._bitboards[marble]).count('1') for marble in MARBLE_COLORS)
+
+    def validate_move(self, playername, coordinates, direction):
+        """
+        checks whether a move is valid without making it, testing the rules in the same order as
+        KubaGame.validate_move with masks: the marble's bit, the pushed ray, and the bit of the slot behind it
+        :param playername: name of player making move
+        :param coordinates: coordinates of marble which the player wishes to make a move on
+        :param direction: direction player wishes to move the marble
+        :return: MoveResult.OK if the move is valid, otherwise the first rule it breaks
+        """
+        row, col = coordinates
+        if not (0 <= row < 7 and 0 <= col < 7):
+            # negative coordinates index from the far edge, as they do on the list board
+            return super().validate_move(playername, coordinates, direction)
+
+        own = self._bitboards[self.get_player_from_name(playername).get_marble_color()]
+        if self._winner is not None:
+            return MoveResult.GAME_OVER
+
+        index = row * 7 + col
+        if not own >> index & 1:
+            return MoveResult.NOT_YOUR_MARBLE
+
+        bitboards = self._bitboards
+        occupied = bitboards['W'] | bitboards['B'] | bitboards['R']
+
+        # a ray with no empty slot pushes its edge marble off
+        if not RAY_MASKS[direction][index] & ~occupied and own & RAY_END_BITS[direction][index]:
+            return MoveResult.KNOCKS_OWN_MARBLE
+
+        if coordinates == self._last_slot_moved and self._prev_direction == OPPOSITE_DIRECTIONS[direction]:
+            return MoveResult.KO_RULE
+
+        if BEHIND_BITS[direction][index] & occupied:
+            return MoveResult.INACCESSIBLE
+
+        if self._current_turn is not None and self._current_turn != playername:
+            return MoveResult.NOT_YOUR_TURN
+
+        return MoveResult.OK
+
+    def legal_moves(self, playername):
+        """
+        generates every move playername can make right now, the same moves as KubaGame.legal_moves. The player's
+        pushable marbles are found for each direction with one mask, and each is then checked for the Ko rule and
+        for knocking off its own marble.
+        :param playername: name of player to generate moves for
+        :return: generator of (coordinates, direction) tuples
+        """
+        if self._winner is not None:
+            return
+        if self._current_turn is not None and self._current_turn != playername:
+            return
+
+        bitboards = self._bitboards
+        own = bitboards[self.get_player_from_name(playername).get_marble_color()]
+        occupied = bitboards['W'] | bitboards['B'] | bitboards['R']
+        empty = BOARD_MASK & ~occupied
+        if self._prev_direction is not None:
+            ko_direction = OPPOSITE_DIRECTIONS[self._prev_direction]
+            ko_index = self._last_slot_moved[0] * 7 + self._last_slot_moved[1]
+        else:
+            ko_direction = ko_index = None
+
+        for direction in DIRECTION_SHIFTS:
+            pushable = own & _open_behind_mask(empty, direction)
+            ray_masks = RAY_MASKS[direction]
+            end_bits = RAY_END_BITS[direction]
+            while pushable:
+                bit = pushable & -pushable
+                pushable ^= bit
+                index = bit.bit_length() - 1
+                if direction == ko_direction and index == ko_index:
+                    continue
+                if not ray_masks[index] & empty and own & end_bits[index]:
+                    continue
+                yield SLOT_COORDINATES[index], direction
+
+    def _push(self, coordinates, direction):
+        """
+        pushes the line of marbles starting at coordinates one slot in direction by shifting the bits of each color
+        that has marbles on the pushed line. The move must already have been validated.
+        :param coordinates: coordinates of the marble being pushed, same as make_move parameter
+        :param direction: direction of move, same as make_move parameter
+        :return: tuple of (slot the pushed line ended on, color of the marble pushed off the board or None)
+        """
+        index = coordinates[0] * 7 + coordinates[1]
+        shift, increasing = DIRECTION_SHIFTS[direction]
+        ray = RAY_MASKS[direction][index]
+        bitboards = self._bitboards
+        empty = ray & ~(bitboards['W'] | bitboards['B'] | bitboards['R'])
+
+        # the pushed line runs from coordinates up to the first empty slot on the ray, or to the edge
+        if not empty:
+            end_bit = RAY_END_BITS[direction][index]
+        elif increasing:
+            end_bit = empty & -empty
+        else:
+            end_bit = 1 << (empty.bit_length() - 1)
+        line = _line_mask(ray, end_bit, increasing)
+
+        fallen_marble = None
+        board_hash = self._board_hash
+        for marble in MARBLE_COLORS:
+            board = bitboards[marble]
+            moving = board & line
+            if not moving:
+                continue
+            if not empty and board & end_bit:
+                fallen_marble = marble
+            # the marble at the edge shifts out of the line and is masked off
+            if increasing:
+                moved = board ^ moving | (moving << shift) & line
+            else:
+                moved = board ^ moving | (moving >> shift) & line
+            bitboards[marble] = moved
+            board_hash ^= _hash_bits(ZOBRIST_MARBLES[marble], board ^ moved)
+        self._board_hash = board_hash
+
+        return SLOT_COORDINATES[end_bit.bit_length() - 1], fallen_marble
+
+    def get_pushed_off_marble(self, coordinates, direction):
+        """
+        finds which marble, if any, pushing the marble at coordinates in direction would push off the board: the
+        marble on the edge end of the ray, if no slot on the ray is empty
+        :param coordinates: coordinates of the marble to push, same as make_move parameter
+        :param direction: direction of move, same as make_move parameter
+        :return: W, B or R for the marble at the end of the line if the line reaches the edge, None if it doesn't
+        """
+        index = coordinates[0] * 7 + coordinates[1]
+        bitboards = self._bitboards
+        if RAY_MASKS[direction][index] & ~(bitboards['W'] | bitboards['B'] | bitboards['R']):
+            return None
+
+        end_bit = RAY_END_BITS[direction][index]
+        for marble in MARBLE_COLORS:
+            if bitboards[marble] & end_bit:
+                return marble
+
+    def _unpush(self, coordinates, direction, end_slot, fallen_marble):
+        """
+        moves the line pushed by _push back one slot by shifting each color's bits on the line the other way,
+        then puts the marble that fell off back on the end of the line
+        :param coordinates: coordinates the line was pushed from
+        :param direction: direction the line was pushed
+        :param end_slot: slot the pushed line ended on, as returned by _push
+        :param fallen_marble: color of the marble pushed off the board or None, as returned by _push
+        :return: none
+        """
+        shift, increasing = DIRECTION_SHIFTS[direction]
+        ray = RAY_MASKS[direction][coordinates[0] * 7 + coordinates[1]]
+        end_bit = 1 << (end_slot[0] * 7 + end_slot[1])
+        line = _line_mask(ray, end_bit, increasing)
+        bitboards = self._bitboards
+
+        board_hash = self._board_hash
+        for marble in MARBLE_COLORS:
+            board = bitboards[marble]
+            moving = board & line
+            if not moving:
+                continue
+            if increasing:
+                moved = board ^ moving | (moving >> shift) & line
+            else:
+                moved = board ^ moving | (moving << shift) & line
+            bitboards[marble] = moved
+            board_hash ^= _hash_bits(ZOBRIST_MARBLES[marble], board ^ moved)
+        self._board_hash = board_hash
+
+        if fallen_marble is not None:
+            bitboards[fallen_marble] |= end_bit
+            self._board_hash ^= ZOBRIST_MARBLES[fallen_marble][end_bit.bit_length() - 1]
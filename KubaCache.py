@@ -0,0 +1,265 @@
+# Description: Persistent evaluation cache for the Kuba game, shared by every process on a host. Entries are keyed on
+#              KubaGame.get_hash() and live in a fixed-size memory-mapped file laid out as an open-addressing table of
+#              small buckets. Readers never lock: each slot stores its key XORed with its data, so a slot torn by a
+#              concurrent write simply fails the key check. Inserts lock only the bucket they write, with a POSIX
+#              record lock where fcntl is available. When a bucket is full, the entry with the least depth after
+#              subtracting its age in generations is evicted. Call new_generation once per run so that entries from
+#              earlier runs age out in favour of new ones while still being used until they are replaced.
+#              EvaluationCache has the same lookup/store interface as KubaSearch.TranspositionTable, so an AIPlayer
+#              can search with one directly.
+
+import mmap
+import os
+import struct
+
+from KubaRecord import encode_move, decode_move
+from KubaSearch import TableEntry, EXACT
+
+try:
+    import fcntl
+except ImportError:
+    # no record locks on this platform, inserts rely on the key check alone
+    fcntl = None
+
+CACHE_MAGIC = b'KUBAEVC2'
+
+# magic, number of slots, slots per bucket, current generation
+CACHE_HEADER = struct.Struct('<8sQII')
+HEADER_SIZE = 64
+
+# each slot is two 64-bit words: key XOR data, then data
+SLOT = struct.Struct('<QQ')
+
+# data word layout, from the low bits: value (32, two's complement), depth (8), bound (2), move (8), generation (13)
+# and a bit that is always set, so a stored entry never packs to 0, which marks an empty slot
+_VALUE_MASK = (1 << 32) - 1
+_GENERATION_MASK = (1 << 13) - 1
+_OCCUPIED_BIT = 1 << 63
+NO_MOVE = 255
+MAX_DEPTH = 255
+
+
+def _pack_data(value, depth, bound, move_byte, generation):
+    """
+    packs an entry's fields into its data word
+    :return: 64-bit integer
+    """
+    return ((value & _VALUE_MASK) | min(depth, MAX_DEPTH) << 32 | bound << 40 | move_byte << 42
+            | (generation & _GENERATION_MASK) << 50 | _OCCUPIED_BIT)
+
+
+def _unpack_data(data):
+    """
+    unpacks a data word made by _pack_data
+    :return: tuple of (value, depth, bound, move byte, generation)
+    """
+    value = data & _VALUE_MASK
+    if value >= 1 << 31:
+        value -= 1 << 32
+    return value, data >> 32 & 0xFF, data >> 40 & 0x3, data >> 42 & 0xFF, data >> 50 & _GENERATION_MASK
+
+
+class EvaluationCache:
+    """
+    Represents an evaluation cache file mapped into memory. Several processes can open the same file; a process
+    sees entries stored by the others as soon as they are written.
+    """
+
+    def __init__(self, path, slots=1 << 20, bucket_size=4, locking=True):
+        """
+        initializes EvaluationCache instance, creating the file if it doesn't exist
+        :param path: path of the cache file
+        :param slots: number of slots, only used when the file is created. Each slot takes 16 bytes.
+        :param bucket_size: number of slots a key can be stored in, only used when the file is created
+        :param locking: lock buckets while inserting
+        no return value
+        """
+        self._path = path
+        self._locking = locking and fcntl is not None
+        self._hits = 0
+        self._misses = 0
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = os.fdopen(fd, 'r+b')
+        if self._locking:
+            fcntl.lockf(fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            if os.fstat(fd).st_size == 0:
+                if slots % bucket_size:
+                    raise ValueError("slots must be a multiple of bucket_size")
+                self._file.truncate(HEADER_SIZE + slots * SLOT.size)
+                self._file.write(CACHE_HEADER.pack(CACHE_MAGIC, slots, bucket_size, 0))
+                self._file.flush()
+        finally:
+            if self._locking:
+                fcntl.lockf(fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+        self._map = mmap.mmap(fd, 0)
+        magic, self._slots, self._bucket_size, _ = CACHE_HEADER.unpack_from(self._map, 0)
+        if magic != CACHE_MAGIC or len(self._map) != HEADER_SIZE + self._slots * SLOT.size:
+            self.close()
+            raise ValueError(path + " is not an evaluation cache")
+        self._buckets = self._slots // self._bucket_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        writes the cache back to disk and closes it
+        no parameters
+        :return: no return value
+        """
+        if not self._map.closed:
+            self._map.flush()
+            self._map.close()
+        self._file.close()
+
+    def flush(self):
+        """
+        writes changes back to the file without closing it
+        no parameters
+        :return: no return value
+        """
+        self._map.flush()
+
+    def get_size(self):
+        """
+        :return: number of slots in the cache
+        """
+        return self._slots
+
+    def get_generation(self):
+        """
+        :return: current generation, shared by every process using the file
+        """
+        return CACHE_HEADER.unpack_from(self._map, 0)[3]
+
+    def new_generation(self):
+        """
+        starts a new generation, typically once per analysis run. Entries from earlier generations are still
+        returned by lookup, but lose one depth per generation of age when choosing what to evict.
+        no parameters
+        :return: the new generation
+        """
+        if self._locking:
+            fcntl.lockf(self._file.fileno(), fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            generation = (self.get_generation() + 1) & _GENERATION_MASK
+            struct.pack_into('<I', self._map, CACHE_HEADER.size - 4, generation)
+        finally:
+            if self._locking:
+                fcntl.lockf(self._file.fileno(), fcntl.LOCK_UN, HEADER_SIZE, 0)
+        return generation
+
+    def new_search(self):
+        """
+        does nothing; it lets AIPlayer use the cache in place of a TranspositionTable. Ages are counted in
+        generations, see new_generation.
+        no parameters
+        :return: no return value
+        """
+        pass
+
+    def get_stats(self):
+        """
+        :return: dictionary of this process's lookup hits and misses and the size of the cache
+        """
+        return {'hits': self._hits, 'misses': self._misses, 'size': self._slots,
+                'generation': self.get_generation()}
+
+    def __len__(self):
+        """
+        :return: number of filled slots
+        """
+        words = memoryview(self._map)[HEADER_SIZE:].cast('Q')
+        try:
+            return sum(1 for index in range(1, len(words), 2) if words[index])
+        finally:
+            words.release()
+
+    def clear(self):
+        """
+        empties the cache for every process using it
+        no parameters
+        :return: no return value
+        """
+        self._map[HEADER_SIZE:] = bytes(self._slots * SLOT.size)
+
+    def _bucket_offset(self, key):
+        """
+        :param key: 64-bit position hash
+        :return: file offset of the first slot of the key's bucket
+        """
+        return HEADER_SIZE + (key % self._buckets) * self._bucket_size * SLOT.size
+
+    def lookup(self, key):
+        """
+        gets the entry stored for a position
+        :param key: hash of the position, from KubaGame.get_hash()
+        :return: TableEntry for the position, None if it isn't in the cache
+        """
+        offset = self._bucket_offset(key)
+        for _ in range(self._bucket_size):
+            check, data = SLOT.unpack_from(self._map, offset)
+            # empty slots have no data; a slot written by another process mid-read fails the key check
+            if data and check ^ data == key:
+                self._hits += 1
+                value, depth, bound, move_byte, generation = _unpack_data(data)
+                move = decode_move(move_byte) if move_byte != NO_MOVE else None
+                return TableEntry(key, depth, value, bound, move, generation)
+            offset += SLOT.size
+        self._misses += 1
+        return None
+
+    def store(self, key, depth, value, bound=EXACT, move=None):
+        """
+        stores a search result for a position. An entry for the same position is replaced unless it was searched
+        deeper in the current generation. Otherwise the empty or least valuable slot of the bucket is used.
+        :param key: hash of the position, from KubaGame.get_hash()
+        :param depth: depth the position was searched to
+        :param value: value found by the search, must fit in 32 bits
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND from KubaSearch
+        :param move: best move found, as a (coordinates, direction) tuple, or None
+        :return: True if the entry was stored, False if the existing entry was kept
+        """
+        generation = self.get_generation()
+        start = self._bucket_offset(key)
+        bucket_bytes = self._bucket_size * SLOT.size
+        fd = self._file.fileno()
+        if self._locking:
+            fcntl.lockf(fd, fcntl.LOCK_EX, bucket_bytes, start)
+        try:
+            victim = None
+            victim_score = None
+            offset = start
+            for _ in range(self._bucket_size):
+                check, data = SLOT.unpack_from(self._map, offset)
+                if data and check ^ data == key:
+                    _, old_depth, _, old_move, old_generation = _unpack_data(data)
+                    if old_generation == generation and old_depth > depth:
+                        return False
+                    if move is None and old_move != NO_MOVE:
+                        move = decode_move(old_move)
+                    victim = offset
+                    break
+
+                if not data:
+                    score = -1 << 20
+                else:
+                    _, old_depth, _, _, old_generation = _unpack_data(data)
+                    score = old_depth - ((generation - old_generation) & _GENERATION_MASK)
+                if victim is None or score < victim_score:
+                    victim, victim_score = offset, score
+                offset += SLOT.size
+
+            move_byte = encode_move(*move) if move is not None else NO_MOVE
+            data = _pack_data(value, depth, bound, move_byte, generation)
+            SLOT.pack_into(self._map, victim, key ^ data, data)
+            return True
+        finally:
+            if self._locking:
+                fcntl.lockf(fd, fcntl.LOCK_UN, bucket_bytes, start)
@@ -0,0 +1,309 @@
+# Description: Pygame interface for the Kuba game. It is kept apart from the rules in KubaGame.py so that programs
+#              which only play games never import pygame. play_game runs an event-driven loop: a move is made by
+#              clicking a marble and then the slot next to it in the direction to push (or an arrow key), and
+#              rejected moves are shown in the window. The loop sleeps in pygame.event.wait until something happens
+#              and only redraws what changed, at most FPS times a second.
+
+import pygame
+
+from KubaGame import move_result_message
+
+# most redraws per second
+FPS = 30
+
+# keys that choose the direction of the selected marble's push
+DIRECTION_KEYS = {pygame.K_LEFT: 'L', pygame.K_RIGHT: 'R', pygame.K_UP: 'F', pygame.K_DOWN: 'B',
+                  pygame.K_l: 'L', pygame.K_r: 'R', pygame.K_f: 'F', pygame.K_b: 'B'}
+
+# direction of a push towards the slot at each (row, column) offset from the marble
+DIRECTION_OFFSETS = {(0, -1): 'L', (0, 1): 'R', (-1, 0): 'F', (1, 0): 'B'}
+
+# the only events play_game acts on, so mouse motion and the like don't wake it up
+_EXPOSE_EVENTS = tuple(getattr(pygame, name) for name in ('VIDEOEXPOSE', 'WINDOWEXPOSED') if hasattr(pygame, name))
+HANDLED_EVENTS = (pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN) + _EXPOSE_EVENTS
+
+
+class PyGameFeatures:
+    """
+    Represents Kuba game interface using Pygame module.
+    One instance lives for the whole game: update_interface redraws only the slots and score lines that changed since
+    the last call and updates just those parts of the window.
+    """
+    BLACK = (0, 0, 0)
+    WHITE = (255, 255, 255)
+    RED = (255, 0, 0)
+    BEIGE = (244, 226, 198)
+    HIGHLIGHT = (255, 200, 0)
+    CIRCLE_WIDTH = 60
+    BORDER_WIDTH = 5
+    CIRCLE_RADIUS = 30
+    BOARD_SIDE_LENGTH = 700
+    BOARD_START_Y = 50
+    BOARD_START_X = 100
+    SCREEN_HEIGHT = 1000
+    SCREEN_WIDTH = 900
+
+    # size of the square each marble sprite is drawn on, small enough to stay inside the grid lines
+    SPRITE_SIZE = 2 * CIRCLE_RADIUS + 4
+
+    # status lines: whose turn it is or who won, and the result of the last move
+    TURN_LINE_Y = BOARD_SIDE_LENGTH + BOARD_START_Y + 50
+    MESSAGE_LINE_Y = SCREEN_HEIGHT - 40
+
+    def __init__(self, my_board, player_1, player_2):
+        """
+        initializes pygame instance, display, pre-renders marble sprites and draws everything that never changes
+        :param my_board: board from KubaGame.get_board
+        :param player_1: Player instance of the first player
+        :param player_2: Player instance of the second player
+        """
+        pygame.init()
+        self.message_font = pygame.font.SysFont('Arial', 15)
+        self.instruction_font = pygame.font.SysFont('Arial', 20)
+        self.instruction_font.set_underline(True)
+        self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
+        pygame.display.set_caption("Albert's Kuba Game")
+        self.screen.fill(self.BEIGE)
+
+        # draw grid lines
+        for i in range(0, 8):
+            pygame.draw.line(self.screen, self.BLACK, ((i + 1) * 100, self.BOARD_START_Y),
+                             ((i + 1) * 100, 700 + self.BOARD_START_Y), 2)
+            pygame.draw.line(self.screen, self.BLACK, (self.BOARD_START_X, i * 100 + self.BOARD_START_Y),
+                             (700 + self.BOARD_START_X, i * 100 + self.BOARD_START_Y), 2)
+            grid_num = self.message_font.render(str(i), False, (0, 0, 0))
+            if i < 7:
+                self.screen.blit(grid_num, (75, i * 100 + 45 + self.BOARD_START_Y))
+                self.screen.blit(grid_num, ((i + 1) * 100 + 45, self.BOARD_START_Y - 30))
+
+        # Show instructions
+        notes = [
+            "Welcome to Albert's Kuba Game!",
+            "For a complete set of rules, please visit - https://sites.google.com/site/boardandpieces/list-of-games/kuba",
+            "To move, click one of your marbles, then click the slot next to it in the direction you want to push it.",
+            "The arrow keys (or L, R, F and B) also push the selected marble. Click it again or press Esc to deselect."
+        ]
+        intro_message = self.instruction_font.render("Notes", False, (0, 0, 0))
+        self.screen.blit(intro_message, (self.BOARD_START_X, self.BOARD_SIDE_LENGTH + self.BOARD_START_Y + 70))
+        increment = 0
+        for note in notes:
+            note_text = self.message_font.render(note, False, (0, 0, 0))
+            self.screen.blit(note_text, (self.BOARD_START_X, self.BOARD_SIDE_LENGTH + self.BOARD_START_Y + 100 + increment))
+            increment += 20
+
+        # pre-render one sprite per marble color, plus an empty one to erase a slot
+        self._sprites = {'X': self._make_sprite(None), 'W': self._make_sprite(self.WHITE),
+                         'B': self._make_sprite(self.BLACK), 'R': self._make_sprite(self.RED)}
+
+        # what is currently drawn in each slot and on each score line, None until first drawn
+        self._drawn_board = [[None] * 7 for _ in range(7)]
+        self._drawn_scores = [None, None]
+        self._drawn_lines = {}
+        self._selected = None
+
+        pygame.display.flip()
+        self.update_interface(my_board, player_1, player_2)
+
+    def _make_sprite(self, color):
+        """
+        draws a marble on a beige square
+        :param color: fill color of the marble, None for an empty slot
+        :return: pygame Surface of size SPRITE_SIZE
+        """
+        sprite = pygame.Surface((self.SPRITE_SIZE, self.SPRITE_SIZE))
+        sprite.fill(self.BEIGE)
+        if color is not None:
+            center = (self.SPRITE_SIZE // 2, self.SPRITE_SIZE // 2)
+            pygame.draw.circle(sprite, color, center, self.CIRCLE_RADIUS, self.CIRCLE_WIDTH)
+            pygame.draw.circle(sprite, self.BLACK, center, self.CIRCLE_RADIUS, self.BORDER_WIDTH)
+        return sprite.convert()
+
+    def _slot_rect(self, row_num, col_num):
+        """
+        :param row_num: row of the slot
+        :param col_num: column of the slot
+        :return: pygame Rect of the slot's sprite on the screen
+        """
+        rect = pygame.Rect(0, 0, self.SPRITE_SIZE, self.SPRITE_SIZE)
+        rect.center = (int((col_num + 1) * 100 + 50), int(row_num * 100 + 50) + self.BOARD_START_Y)
+        return rect
+
+    def update_interface(self, my_board, player_1, player_2):
+        """
+        redraws the slots and score lines that changed since the last call and updates only those parts of the screen
+        :param my_board: board from KubaGame.get_board
+        :param player_1: Player instance of the first player
+        :param player_2: Player instance of the second player
+        :return: list of pygame Rects that were redrawn
+        """
+        dirty_rects = []
+        for row_num, row in enumerate(my_board):
+            for col_num, marble in enumerate(row):
+                if self._drawn_board[row_num][col_num] != marble:
+                    rect = self._slot_rect(row_num, col_num)
+                    self.screen.blit(self._sprites[marble], rect)
+                    self._drawn_board[row_num][col_num] = marble
+                    dirty_rects.append(rect)
+
+        # Show scores
+        for line_num, player in enumerate((player_1, player_2)):
+            score = player.get_playername() + " currently has " + str(player.get_red_count()) + " red marbles."
+            if self._drawn_scores[line_num] != score:
+                rect = pygame.Rect(self.BOARD_START_X, self.BOARD_SIDE_LENGTH + self.BOARD_START_Y + 10 + 20 * line_num,
+                                   self.SCREEN_WIDTH - self.BOARD_START_X, 20)
+                self.screen.fill(self.BEIGE, rect)
+                self.screen.blit(self.message_font.render(score, False, (0, 0, 0)), rect)
+                self._drawn_scores[line_num] = score
+                dirty_rects.append(rect)
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        return dirty_rects
+
+    def slot_at(self, position):
+        """
+        :param position: (x, y) position in the window, such as a mouse click
+        :return: (row, column) of the board slot at position, None if it isn't on the board
+        """
+        col_num = (position[0] - self.BOARD_START_X) // 100
+        row_num = (position[1] - self.BOARD_START_Y) // 100
+        if 0 <= row_num < 7 and 0 <= col_num < 7:
+            return row_num, col_num
+        return None
+
+    def get_selected(self):
+        """
+        :return: (row, column) of the highlighted slot, None if no slot is highlighted
+        """
+        return self._selected
+
+    def set_selected(self, coordinates):
+        """
+        moves the highlight to a slot and updates the parts of the screen that changed
+        :param coordinates: (row, column) of the slot to highlight, None to remove the highlight
+        :return: list of pygame Rects that were redrawn
+        """
+        dirty_rects = []
+        if self._selected is not None:
+            row_num, col_num = self._selected
+            rect = self._slot_rect(row_num, col_num)
+            self.screen.blit(self._sprites[self._drawn_board[row_num][col_num]], rect)
+            dirty_rects.append(rect)
+        if coordinates is not None:
+            rect = self._slot_rect(coordinates[0], coordinates[1])
+            pygame.draw.circle(self.screen, self.HIGHLIGHT, rect.center, self.SPRITE_SIZE // 2, 3)
+            dirty_rects.append(rect)
+        self._selected = coordinates
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        return dirty_rects
+
+    def show_status(self, turn_text, message_text):
+        """
+        redraws the status lines whose text changed
+        :param turn_text: text saying whose turn it is or who won
+        :param message_text: text about the last move, such as why it was rejected, or an empty string
+        :return: list of pygame Rects that were redrawn
+        """
+        dirty_rects = []
+        for line_y, text, color in ((self.TURN_LINE_Y, turn_text, self.BLACK),
+                                    (self.MESSAGE_LINE_Y, message_text, self.RED)):
+            if self._drawn_lines.get(line_y) != text:
+                rect = pygame.Rect(self.BOARD_START_X, line_y, self.SCREEN_WIDTH - self.BOARD_START_X, 20)
+                self.screen.fill(self.BEIGE, rect)
+                self.screen.blit(self.message_font.render(text, False, color), rect)
+                self._drawn_lines[line_y] = text
+                dirty_rects.append(rect)
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        return dirty_rects
+
+
+def _turn_text(game):
+    """
+    :param game: KubaGame being played
+    :return: status line saying who won or whose turn it is
+    """
+    if game.get_winner() is not None:
+        return game.get_winner() + " wins! Close the window to quit."
+    if game.get_current_turn() is None:
+        return "Either player may make the first move."
+    return game.get_current_turn() + " to move."
+
+
+def _mover(game, coordinates):
+    """
+    gets the player to make a move with the marble at coordinates: the player whose turn it is, or before the first
+    move, the player who owns the marble
+    :param game: KubaGame being played
+    :param coordinates: (row, column) of the marble to push
+    :return: name of the player
+    """
+    if game.get_current_turn() is not None:
+        return game.get_current_turn()
+    marble = game.get_marble(coordinates)
+    for playername in game.get_playernames():
+        if game.get_player_from_name(playername).get_marble_color() == marble:
+            return playername
+    return game.get_playernames()[0]
+
+
+def play_game(game, fps=FPS):
+    """
+    opens a window and lets two people play game on it until the window is closed
+    :param game: KubaGame to play
+    :param fps: most redraws per second
+    :return: name of the winner, None if the window was closed before the game was won
+    """
+    player_1, player_2 = (game.get_player_from_name(playername) for playername in game.get_playernames())
+    interface = PyGameFeatures(game.get_board(), player_1, player_2)
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(list(HANDLED_EVENTS))
+    clock = pygame.time.Clock()
+
+    message = ""
+    changed = True
+    while True:
+        if changed:
+            interface.update_interface(game.get_board(), player_1, player_2)
+            interface.show_status(_turn_text(game), message)
+            changed = False
+            # cap the frame rate; when nothing has changed the loop sleeps in event.wait below instead
+            clock.tick(fps)
+            events = pygame.event.get()
+        else:
+            events = [pygame.event.wait()] + pygame.event.get()
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return game.get_winner()
+            if event.type in _EXPOSE_EVENTS:
+                pygame.display.flip()
+                continue
+            if game.get_winner() is not None:
+                continue
+
+            selected = interface.get_selected()
+            direction = None
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    interface.set_selected(None)
+                elif selected is not None:
+                    direction = DIRECTION_KEYS.get(event.key)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                slot = interface.slot_at(event.pos)
+                if slot is None or slot == selected:
+                    interface.set_selected(None)
+                elif selected is not None and (slot[0] - selected[0], slot[1] - selected[1]) in DIRECTION_OFFSETS:
+                    direction = DIRECTION_OFFSETS[(slot[0] - selected[0], slot[1] - selected[1])]
+                elif game.get_marble(slot) != 'X':
+                    interface.set_selected(slot)
+
+            if direction is not None:
+                result = game.make_move(_mover(game, selected), selected, direction)
+                message = "" if result else move_result_message(result, direction)
+                interface.set_selected(None)
+                changed = True
@@ -2,109 +2,124 @@
 # Date: 9-5-2021
 # Description: This program provides code for a game called Kuba. Game information and instructions
 #              can be found here - https://sites.google.com/site/boardandpieces/list-of-games/kuba
+#              The rules engine doesn't need pygame; the interface in KubaGUI.py is only imported when
+#              PyGameFeatures is first used.
 
-import pygame, sys
+import enum
+import logging
+import random
+import time
 
-pygame.font.init()
-message_font = pygame.font.SysFont('Arial', 15)
-instruction_font = pygame.font.SysFont('Arial', 20)
-pygame.font.Font.set_underline(instruction_font, True)
+# offset to the slot behind a marble that has to be empty (or off the board) for it to be pushed in each direction
+BEHIND_OFFSETS = {'L': (0, 1), 'R': (0, -1), 'F': (1, 0), 'B': (-1, 0)}
+OPPOSITE_DIRECTIONS = {'L': 'R', 'R': 'L', 'F': 'B', 'B': 'F'}
 
+# the board is stored as a flat list of 49 slots, slot (row, column) at index row * 7 + column
+SLOT_COORDINATES = [(row, col) for row in range(7) for col in range(7)]
 
-class PyGameFeatures:
+
+def _build_ray_tables():
     """
-    Represents Kuba game interface using Pygame module
+    builds, for each direction and each of the 49 slots, the slots from that slot (inclusive) to the edge of the board
+    in the direction of a push, and the slot behind it
+    :return: tuple of (rays, ray slices, behind slots) dictionaries mapping direction to a list indexed by slot.
+    A ray is a tuple of slot indices in push order, its slice selects the same slots from the flat board, and the
+    behind slot is the index of the slot that has to be empty for the push, None if it is off the board.
     """
-    BLACK = (0, 0, 0)
-    WHITE = (255, 255, 255)
-    RED = (255, 0, 0)
-    BEIGE = (244, 226, 198)
-    CIRCLE_WIDTH = 60
-    BORDER_WIDTH = 5
-    CIRCLE_RADIUS = 30
-    BOARD_SIDE_LENGTH = 700
-    BOARD_START_Y = 50
-    BOARD_START_X = 100
-    SCREEN_HEIGHT = 1000
-    SCREEN_WIDTH = 900
-
-    def __init__(self, my_board, player_1, player_2):
-        """
-        initializes pygame instance, display,
-        """
-        # color constants
-
-        pygame.init()
-        self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
-        pygame.display.set_caption("Albert's Kuba Game")
-        self.screen.fill(self.BEIGE)
-
-        # draw grid lines
-        for i in range(0, 8):
-            pygame.draw.line(self.screen, self.BLACK, ((i + 1) * 100, self.BOARD_START_Y),
-                             ((i + 1) * 100, 700 + self.BOARD_START_Y), 2)
-            pygame.draw.line(self.screen, self.BLACK, (self.BOARD_START_X, i * 100 + self.BOARD_START_Y),
-                             (700 + self.BOARD_START_X, i * 100 + self.BOARD_START_Y), 2)
-            grid_num = message_font.render(str(i), False, (0, 0, 0))
-            if i < 7:
-                self.screen.blit(grid_num, (75, i * 100 + 45 + self.BOARD_START_Y))
-                self.screen.blit(grid_num, ((i + 1) * 100 + 45, self.BOARD_START_Y - 30))
-
-        for row_num, row in enumerate(my_board):
-            for col_num, marble in enumerate(row):
-                if marble == 'W':
-                    pygame.draw.circle(self.screen, self.WHITE,
-                                       (int((col_num + 1) * 100 + 50), int(row_num * 100 + 50) + self.BOARD_START_Y),
-                                       self.CIRCLE_RADIUS, self.CIRCLE_WIDTH)
-                    pygame.draw.circle(self.screen, self.BLACK,
-                                       (int((col_num + 1) * 100 + 50), int(row_num * 100 + 50) + self.BOARD_START_Y),
-                                       self.CIRCLE_RADIUS, self.BORDER_WIDTH)
-                elif marble == 'B':
-                    pygame.draw.circle(self.screen, self.BLACK,
-                                       (int((col_num + 1) * 100 + 50), int(row_num * 100 + 50) + self.BOARD_START_Y),
-                                       self.CIRCLE_RADIUS, self.CIRCLE_WIDTH)
-                    pygame.draw.circle(self.screen, self.BLACK,
-                                       (int((col_num + 1) * 100 + 50), int(row_num * 100 + 50) + self.BOARD_START_Y),
-                                       self.CIRCLE_RADIUS, self.BORDER_WIDTH)
-                elif marble == 'R':
-                    pygame.draw.circle(self.screen, self.RED,
-                                       (int((col_num + 1) * 100 + 50), int(row_num * 100 + 50) + self.BOARD_START_Y),
-                                       self.CIRCLE_RADIUS, self.CIRCLE_WIDTH)
-                    pygame.draw.circle(self.screen, self.BLACK,
-                                       (int((col_num + 1) * 100 + 50), int(row_num * 100 + 50) + self.BOARD_START_Y),
-                                       self.CIRCLE_RADIUS, self.BORDER_WIDTH)
-
-        # Show instructions
-        notes = [
-            "Welcome to Albert's Kuba Game!",
-            "For a complete set of rules, please visit - https://sites.google.com/site/boardandpieces/list-of-games/kuba",
-            "This window is merely a display capturing board state post-turns as well as current scores.",
-            "Please perform all game actions and view all game-related error/information messages through the console."
-        ]
-        intro_message = instruction_font.render("Notes", False, (0, 0, 0))
-        self.screen.blit(intro_message, (self.BOARD_START_X, self.BOARD_SIDE_LENGTH + self.BOARD_START_Y + 70))
-        increment = 0
-        for note in notes:
-            note_text = message_font.render(note, False, (0, 0, 0))
-            self.screen.blit(note_text, (self.BOARD_START_X, self.BOARD_SIDE_LENGTH + self.BOARD_START_Y + 100 + increment))
-            increment += 20
-
-        # Show scores
-        player1_red_count = message_font.render(
-            player_1.get_playername() + " currently has " + str(player_1.get_red_count()) + " red marbles.", False, (0, 0, 0))
-        player2_red_count = message_font.render(
-            player_2.get_playername() + " currently has " + str(player_2.get_red_count()) + " red marbles.", False, (0, 0, 0))
-        self.screen.blit(player1_red_count, (self.BOARD_START_X, self.BOARD_SIDE_LENGTH + self.BOARD_START_Y + 10))
-        self.screen.blit(player2_red_count, (self.BOARD_START_X, self.BOARD_SIDE_LENGTH + self.BOARD_START_Y + 30))
-
-    def update_interface(self, ):
-        """
-        uses get_board method from KubaGame to braw game interface on pygame screen
-        """
-        pass
+    rays = {}
+    ray_slices = {}
+    behind_slots = {}
+    for direction, (row_offset, col_offset) in BEHIND_OFFSETS.items():
+        step = -(row_offset * 7 + col_offset)
+        rays[direction] = []
+        ray_slices[direction] = []
+        behind_slots[direction] = []
+        for row, col in SLOT_COORDINATES:
+            ray = []
+            curr_row, curr_col = row, col
+            while 0 <= curr_row < 7 and 0 <= curr_col < 7:
+                ray.append(curr_row * 7 + curr_col)
+                curr_row, curr_col = curr_row - row_offset, curr_col - col_offset
+            stop = ray[-1] + step
+            rays[direction].append(tuple(ray))
+            ray_slices[direction].append(slice(ray[0], stop if stop >= 0 else None, step))
+
+            behind_row, behind_col = row + row_offset, col + col_offset
+            if 0 <= behind_row < 7 and 0 <= behind_col < 7:
+                behind_slots[direction].append(behind_row * 7 + behind_col)
+            else:
+                behind_slots[direction].append(None)
+    return rays, ray_slices, behind_slots
+
+
+RAYS, RAY_SLICES, BEHIND_SLOTS = _build_ray_tables()
+
+
+class MoveResult(enum.Enum):
+    """
+    result of checking or making a move, in the order the rules are checked. Only OK is truthy, so code that treats
+    the result of make_move as True or False keeps working. The values are the result codes of KubaBatch.step.
+    """
+    OK = 0
+    GAME_OVER = 1
+    NOT_YOUR_MARBLE = 2
+    KNOCKS_OWN_MARBLE = 3
+    KO_RULE = 4
+    INACCESSIBLE = 5
+    NOT_YOUR_TURN = 6
+
+    def __bool__(self):
+        return self is MoveResult.OK
+
+
+MOVE_RESULT_MESSAGES = {MoveResult.OK: "Move made.",
+                        MoveResult.GAME_OVER: "Game has already been won.",
+                        MoveResult.NOT_YOUR_MARBLE: "That marble doesn't belong to you!",
+                        MoveResult.KNOCKS_OWN_MARBLE: "You knocked your own marble off the table. Invalid move.",
+                        MoveResult.KO_RULE: "Ko rule not followed. Invalid move.",
+                        MoveResult.NOT_YOUR_TURN: "It is not this player's turn."}
+INACCESSIBLE_MESSAGES = {'L': "The marble to the left of this one is not accessible",
+                         'R': "The marble to the right of this one is not accessible",
+                         'F': "The marble below this one is not accessible",
+                         'B': "The marble above this one is not accessible"}
+
+# rejected moves are logged at INFO level. Nothing is shown unless the program using KubaGame configures logging.
+_logger = logging.getLogger(__name__)
+
+
+def move_result_message(result, direction=None):
+    """
+    gets the message to show a player for the result of a move
+    :param result: MoveResult returned by make_move or validate_move
+    :param direction: direction of the move, used to say which way an inaccessible marble is blocked
+    :return: message string
+    """
+    if result is MoveResult.INACCESSIBLE:
+        return INACCESSIBLE_MESSAGES.get(direction, "That marble is not accessible")
+    return MOVE_RESULT_MESSAGES[result]
 
+# random 64-bit keys for Zobrist hashing, indexed by slot row * 7 + column. The seed is fixed so the same position
+# hashes the same way in every process.
+_zobrist_random = random.Random(90521)
+ZOBRIST_MARBLES = {marble: [_zobrist_random.getrandbits(64) for _ in range(49)] for marble in ('W', 'B', 'R')}
+ZOBRIST_MARBLES['X'] = [0] * 49
+ZOBRIST_TURN = [_zobrist_random.getrandbits(64) for _ in range(2)]
+ZOBRIST_CAPTURES = [[_zobrist_random.getrandbits(64) for _ in range(8)] for _ in range(2)]
+ZOBRIST_KO = {direction: [_zobrist_random.getrandbits(64) for _ in range(49)] for direction in ('L', 'R', 'F', 'B')}
 
 
+def __getattr__(name):
+    """
+    imports the pygame interface the first time PyGameFeatures is looked up on this module, so importing the rules
+    engine never loads pygame
+    :param name: name of the missing module attribute
+    :return: the PyGameFeatures class
+    """
+    if name == 'PyGameFeatures':
+        from KubaGUI import PyGameFeatures
+        return PyGameFeatures
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+
 
 class KubaGame:
     """
@@ -115,10 +130,12 @@ class KubaGame:
     winner, keeping track of the marbles currently on the board, keeping track of how many red marbles each player has.
     """
 
-    def __init__(self, player1, player2):
+    def __init__(self, player1, player2, debug=False, move_stats=None):
         """
         initializes Kubagame instance.
         player_1 and player_2 are the two players of the game and they will be used to initialize Player class instances
+        debug turns on cross-checking the marble counters against the board after every move
+        move_stats is a KubaStats.MoveStats that times and counts every move, None to leave moves uninstrumented
         no return value
         """
         self._board = [['W', 'W', 'X', 'X', 'X', 'B', 'B'],
@@ -136,12 +153,58 @@ class KubaGame:
         self._last_slot_moved = None
         self._prev_direction = None
 
+        # (coordinates, direction) pushes whose slot behind is open, kept up to date by make_move
+        self._accessible = {direction: set() for direction in BEHIND_OFFSETS}
+        self._update_accessibility((row, col) for row in range(7) for col in range(7))
+
+        # moves made with push_move that pop_move can take back
+        self._undo_stack = []
+
+        # number of W, B and R marbles on the board, updated whenever a marble is pushed off
+        self._marble_counts = dict(zip(('W', 'B', 'R'), self._scan_marble_count()))
+        self._debug = debug
+        self._move_stats = move_stats
+
+        # Zobrist hash of the marbles on the board, updated by set_marble and _push as marbles move
+        self._board_hash = self._scan_board_hash()
+
+    @property
+    def _board(self):
+        """
+        list of lists view of the flat board, one list per row
+        """
+        slots = self._slots
+        return [slots[row:row + 7] for row in range(0, 49, 7)]
+
+    @_board.setter
+    def _board(self, board):
+        """
+        loads a list of lists board into the flat board
+        :param board: 7x7 list of lists of 'W', 'B', 'R' or 'X'
+        """
+        self._slots = [marble for row in board for marble in row]
+
     def get_board(self):
         """
-        returns board as a list of lists
+        returns board as a list of lists. The list is built from the flat board, so changing it doesn't change the game.
         """
         return self._board
 
+    def get_move_stats(self):
+        """
+        no parameters
+        :return: MoveStats recording this game's moves, None if moves aren't instrumented
+        """
+        return self._move_stats
+
+    def set_move_stats(self, move_stats):
+        """
+        turns instrumentation of moves on or off. Several games can share one MoveStats.
+        :param move_stats: KubaStats.MoveStats to record moves in, None to stop recording
+        :return: none
+        """
+        self._move_stats = move_stats
+
     def get_current_turn(self):
         """
         gets player name of whoever has the current turn.
@@ -150,6 +213,32 @@ class KubaGame:
         """
         return self._current_turn
 
+    def get_hash(self):
+        """
+        gets the Zobrist hash of the game state: marbles on the board, whose turn it is, both players' red marble
+        counts and the Ko state. Two games in the same state have the same hash, however they got there.
+        no parameters
+        :return: 64-bit integer hash
+        """
+        key = self._board_hash
+        if self._current_turn is not None:
+            if self._current_turn == self._players[0].get_playername():
+                key ^= ZOBRIST_TURN[0]
+            else:
+                key ^= ZOBRIST_TURN[1]
+        key ^= ZOBRIST_CAPTURES[0][self._players[0].get_red_count()]
+        key ^= ZOBRIST_CAPTURES[1][self._players[1].get_red_count()]
+        if self._last_slot_moved is not None:
+            key ^= ZOBRIST_KO[self._prev_direction][self._last_slot_moved[0] * 7 + self._last_slot_moved[1]]
+        return key
+
+    def get_playernames(self):
+        """
+        no parameters
+        :return: tuple of the names of the two players, in the order they were given to __init__
+        """
+        return self._players[0].get_playername(), self._players[1].get_playername()
+
     def get_player_from_name(self, playername):
         """
         returns Player instance given playername parameter
@@ -167,193 +256,183 @@ class KubaGame:
         :param playername: name of player making move
         :param coordinates: coordinates of marble which the player wishes to make a move on
         :param direction: direction player wishes to move the marble
-        :return: False if move is invalid (game has been won, not the player's turn, invalid coordinates, inaccessible marble)
-        True if move is valid and was made
+        :return: MoveResult.OK if move is valid and was made, otherwise the MoveResult saying why the move is invalid
+        (game has been won, not the player's turn, invalid coordinates, inaccessible marble). Only OK is truthy.
         """
-        curr_player = self.get_player_from_name(playername)
-        curr_player_marble = curr_player.get_marble_color()
+        return self._make_move(playername, coordinates, direction)[0]
+
+    def push_move(self, playername, coordinates, direction):
+        """
+        makes a move the same way make_move does and remembers what it changed so pop_move can take it back.
+        Used by search code to try moves without copying the game.
+        :param playername: name of player making move
+        :param coordinates: coordinates of marble which the player wishes to make a move on
+        :param direction: direction player wishes to move the marble
+        :return: MoveResult, same as make_move
+        """
+        prev_state = (self._last_slot_moved, self._prev_direction, self._current_turn, self._winner)
+        result, end_slot, fallen_marble = self._make_move(playername, coordinates, direction)
+        if result:
+            self._undo_stack.append((playername, coordinates, direction, end_slot, fallen_marble) + prev_state)
+        return result
+
+    def pop_move(self):
+        """
+        takes back the last move made with push_move, restoring the board, red marble counts, turn, winner
+        and Ko state to what they were before it
+        no parameters
+        :return: (playername, coordinates, direction) of the move taken back
+        """
+        (playername, coordinates, direction, end_slot, fallen_marble,
+         self._last_slot_moved, self._prev_direction, self._current_turn, self._winner) = self._undo_stack.pop()
+
+        self._unpush(coordinates, direction, end_slot, fallen_marble)
+        if fallen_marble is not None:
+            self._marble_counts[fallen_marble] += 1
+            if fallen_marble == 'R':
+                self.get_player_from_name(playername).dec_red_count()
+        self._update_accessibility((coordinates, end_slot))
+
+        if self._debug:
+            self._check_consistency()
+
+        return playername, coordinates, direction
 
-        # if Game has already been won - return False
+    def validate_move(self, playername, coordinates, direction):
+        """
+        checks whether a move is valid without making it. Nothing is printed or logged and the game isn't changed,
+        so it can be called on any number of candidate moves.
+        :param playername: name of player making move
+        :param coordinates: coordinates of marble which the player wishes to make a move on
+        :param direction: direction player wishes to move the marble
+        :return: MoveResult.OK if the move is valid, otherwise the first rule it breaks
+        """
+        curr_player_marble = self.get_player_from_name(playername).get_marble_color()
+
+        # if Game has already been won
         if self._winner is not None:
-            print("Game has already been won.")
-            return False
-
-        # if marble at coordinates isn't player's marble color, return false
-        if self._board[coordinates[0]][coordinates[1]] != curr_player_marble:
-            print("That marble doesn't belong to you!")
-            return False
-
-        # if you knock your own marble off the table, return false
-        if self.check_knock_own_marble(curr_player_marble, direction, coordinates) is True:
-            print("You knocked your own marble off the table. Invalid move.")
-            return False
-
-        # if Ko rule is not followed, return false
-        if coordinates == self._last_slot_moved:
-            if direction == 'L' and self._prev_direction == 'R':
-                print("Ko rule not followed. Invalid move.")
-                return False
-            if direction == 'R' and self._prev_direction == 'L':
-                print("Ko rule not followed. Invalid move.")
-                return False
-            if direction == 'F' and self._prev_direction == 'B':
-                print("Ko rule not followed. Invalid move.")
-                return False
-            if direction == 'B' and self._prev_direction == 'F':
-                print("Ko rule not followed. Invalid move.")
-                return False
-
-        # branch depending on direction
-        if direction == 'L':
-            # if not at right edge of board and slot to right isn't a blank, marble isn't accessible
-            if coordinates[1] != 6 and self.get_marble((coordinates[0], coordinates[1] + 1)) != 'X':
-                # print("The marble to the left of this one is not accessible")
-                return False
-
-            # if starting game, set current turn to current player, if current turn != current player,
-            # it's not current player's turn
-            if self._current_turn is None:
-                self._current_turn = playername
-            elif self._current_turn != playername:
-                # print("It is not this player's turn.")
-                return False
-
-            # use in while loop
-            prev_slot = coordinates
-            curr_is_empty = False
-
-            # logic - move towards marbles in direction you are pushing until you encounter a space or
-            # until you get to the left edge of the board. For each slot, copy the marble that is currently
-            # in the previous slot into the current slot.
-            while not curr_is_empty and prev_slot[1] != 0:
-                curr_slot = (prev_slot[0], prev_slot[1] - 1)
-                curr_is_empty = self.get_marble(curr_slot) == 'X'
-                if prev_slot == coordinates:
-                    old_prev_marble = self.get_marble(prev_slot)
-                else:
-                    old_prev_marble = old_curr_marble
-                old_curr_marble = self.get_marble(curr_slot)
-                self.set_marble(curr_slot, old_prev_marble)
-
-                if prev_slot == coordinates:
-                    self.set_marble(prev_slot, 'X')
-
-                prev_slot = curr_slot
-
-            # if at edge of board and the marble that was there was red, it was pushed off
-            if prev_slot[1] == 0 and old_curr_marble == 'R':
-                curr_player.inc_red_count()
-        elif direction == 'R':
-            if coordinates[1] != 0 and self.get_marble((coordinates[0], coordinates[1] - 1)) != 'X':
-                print("The marble to the right of this one is not accessible")
-                return False
-
-            if self._current_turn is None:
-                self._current_turn = playername
-            elif self._current_turn != playername:
-                print("It is not this player's turn.")
-                return False
-
-            prev_slot = coordinates
-            curr_is_empty = False
-
-            while not curr_is_empty and prev_slot[1] != 6:
-                curr_slot = (prev_slot[0], prev_slot[1] + 1)
-                curr_is_empty = self.get_marble(curr_slot) == 'X'
-                if prev_slot == coordinates:
-                    old_prev_marble = self.get_marble(prev_slot)
-                else:
-                    old_prev_marble = old_curr_marble
-                old_curr_marble = self.get_marble(curr_slot)
-                self.set_marble(curr_slot, old_prev_marble)
-
-                if prev_slot == coordinates:
-                    self.set_marble(prev_slot, 'X')
-
-                prev_slot = curr_slot
-
-            if prev_slot[1] == 6 and old_curr_marble == 'R':
-                curr_player.inc_red_count()
-        elif direction == 'F':
-            if coordinates[0] != 6 and self.get_marble((coordinates[0] + 1, coordinates[1])) != 'X':
-                print("The marble below this one is not accessible")
-                return False
-
-            if self._current_turn is None:
-                self._current_turn = playername
-            elif self._current_turn != playername:
-                print("It is not this player's turn.")
-                return False
-
-            prev_slot = coordinates
-            curr_is_empty = False
-
-            while not curr_is_empty and prev_slot[0] != 0:
-                curr_slot = (prev_slot[0] - 1, prev_slot[1])
-                curr_is_empty = self.get_marble(curr_slot) == 'X'
-                if prev_slot == coordinates:
-                    old_prev_marble = self.get_marble(prev_slot)
-                else:
-                    old_prev_marble = old_curr_marble
-                old_curr_marble = self.get_marble(curr_slot)
-                self.set_marble(curr_slot, old_prev_marble)
-
-                if prev_slot == coordinates:
-                    self.set_marble(prev_slot, 'X')
-
-                prev_slot = curr_slot
-
-            if prev_slot[0] == 0 and old_curr_marble == 'R':
-                curr_player.inc_red_count()
-        elif direction == 'B':
-            if coordinates[0] != 0 and self.get_marble((coordinates[0] - 1, coordinates[1])) != 'X':
-                print("The marble above this one is not accessible")
-                return False
-
-            if self._current_turn is None:
-                self._current_turn = playername
-            elif self._current_turn != playername:
-                print("It is not this player's turn.")
-                return False
-
-            prev_slot = coordinates
-            curr_is_empty = False
-
-            while not curr_is_empty and prev_slot[0] != 6:
-                curr_slot = (prev_slot[0] + 1, prev_slot[1])
-                curr_is_empty = self.get_marble(curr_slot) == 'X'
-                if prev_slot == coordinates:
-                    old_prev_marble = self.get_marble(prev_slot)
-                else:
-                    old_prev_marble = old_curr_marble
-                old_curr_marble = self.get_marble(curr_slot)
-                self.set_marble(curr_slot, old_prev_marble)
+            return MoveResult.GAME_OVER
 
-                if prev_slot == coordinates:
-                    self.set_marble(prev_slot, 'X')
+        # if marble at coordinates isn't player's marble color
+        if self.get_marble(coordinates) != curr_player_marble:
+            return MoveResult.NOT_YOUR_MARBLE
 
-                prev_slot = curr_slot
+        # if you knock your own marble off the table
+        if self.check_knock_own_marble(curr_player_marble, direction, coordinates):
+            return MoveResult.KNOCKS_OWN_MARBLE
 
-            if prev_slot[0] == 6 and old_curr_marble == 'R':
-                curr_player.inc_red_count()
+        # if Ko rule is not followed
+        if coordinates == self._last_slot_moved and self._prev_direction == OPPOSITE_DIRECTIONS[direction]:
+            return MoveResult.KO_RULE
 
+        # if the slot behind the marble is on the board and isn't a blank, marble isn't accessible
+        behind = BEHIND_SLOTS[direction][coordinates[0] * 7 + coordinates[1]]
+        if behind is not None and self.get_marble(SLOT_COORDINATES[behind]) != 'X':
+            return MoveResult.INACCESSIBLE
+
+        # either player may make the first move, after that it has to be the player's turn
+        if self._current_turn is not None and self._current_turn != playername:
+            return MoveResult.NOT_YOUR_TURN
+
+        return MoveResult.OK
+
+    def _make_move(self, playername, coordinates, direction):
+        """
+        checks and makes a move for make_move and push_move
+        :param playername: name of player making move
+        :param coordinates: coordinates of marble which the player wishes to make a move on
+        :param direction: direction player wishes to move the marble
+        :return: tuple of (MoveResult, slot the pushed line ended on, color of the marble pushed off the board or None).
+        The slot and color are None if the move is invalid.
+        """
+        if self._move_stats is not None:
+            return self._make_timed_move(playername, coordinates, direction)
+
+        result = self.validate_move(playername, coordinates, direction)
+        if not result:
+            if _logger.isEnabledFor(logging.INFO):
+                _logger.info(move_result_message(result, direction))
+            return result, None, None
+
+        curr_player = self.get_player_from_name(playername)
+        prev_slot, fallen_marble = self._push(coordinates, direction)
+        if fallen_marble is not None:
+            self._capture(curr_player, fallen_marble)
+        self._end_move(curr_player, coordinates, direction, prev_slot)
+        return MoveResult.OK, prev_slot, fallen_marble
+
+    def _make_timed_move(self, playername, coordinates, direction):
+        """
+        same as _make_move, timing each phase of the move and recording it in the move stats
+        :param playername: name of player making move
+        :param coordinates: coordinates of marble which the player wishes to make a move on
+        :param direction: direction player wishes to move the marble
+        :return: same as _make_move
+        """
+        timer = time.perf_counter
+        start = timer()
+        result = self.validate_move(playername, coordinates, direction)
+        validated = timer()
+        if not result:
+            self._move_stats.record_rejection(result, validated - start)
+            if _logger.isEnabledFor(logging.INFO):
+                _logger.info(move_result_message(result, direction))
+            return result, None, None
+
+        curr_player = self.get_player_from_name(playername)
+        prev_slot, fallen_marble = self._push(coordinates, direction)
+        pushed = timer()
+        if fallen_marble is not None:
+            self._capture(curr_player, fallen_marble)
+        captured = timer()
+        self._end_move(curr_player, coordinates, direction, prev_slot)
+        ended = timer()
+
+        # the line ends on the empty slot it fills, or on the edge slot whose marble fell off
+        chain_length = max(abs(prev_slot[0] - coordinates[0]), abs(prev_slot[1] - coordinates[1]))
+        if fallen_marble is not None:
+            chain_length += 1
+        self._move_stats.record_move(direction, chain_length, fallen_marble,
+                                     (validated - start, pushed - validated, captured - pushed, ended - captured))
+        return MoveResult.OK, prev_slot, fallen_marble
+
+    def _capture(self, curr_player, fallen_marble):
+        """
+        used within _make_move to update the marble counters and red marble count for a marble pushed off the board,
+        and check whether that won the game
+        :param curr_player: Player making the move
+        :param fallen_marble: color of the marble pushed off the board
+        :return: none
+        """
+        self._marble_counts[fallen_marble] -= 1
+
+        # if the marble pushed off the edge of the board was red, the current player captured it
+        if fallen_marble == 'R':
+            curr_player.inc_red_count()
+
+            # check for winner via 7 red marbles
+            if curr_player.get_red_count() == 7:
+                self._winner = curr_player.get_playername()
+
+        # check for winner via knocking all of other player's marbles off. Players can't push their own
+        # marbles off, so the marble that fell belongs to the other player
+        elif self._marble_counts[fallen_marble] == 0:
+            self._winner = curr_player.get_playername()
+
+    def _end_move(self, curr_player, coordinates, direction, prev_slot):
+        """
+        used within _make_move to update the Ko state, accessible pushes and turn after the line has been pushed
+        :param curr_player: Player making the move
+        :param coordinates: coordinates the line was pushed from
+        :param direction: direction the line was pushed
+        :param prev_slot: slot the pushed line ended on
+        :return: none
+        """
         self._last_slot_moved = prev_slot
         self._prev_direction = direction
 
-        # check for winner via 7 red marbles
-        for player in self._players:
-            if player.get_red_count() == 7:
-                self._winner = player.get_playername()
-
-        # check for winner via knocking all of other player's marbles off
-        if self.get_marble_count()[0] == 0:
-            for player in self._players:
-                if player.get_marble_color() == 'B':
-                    self._winner = player.get_playername()
-        elif self.get_marble_count()[1] == 0:
-            for player in self._players:
-                if player.get_marble_color() == 'W':
-                    self._winner = player.get_playername()
+        # only the slot the line was pushed from and the slot it ended on change between empty and filled
+        self._update_accessibility((coordinates, prev_slot))
 
         # at end of move, set current turn to be name of other player
         if curr_player == self._players[0]:
@@ -361,54 +440,148 @@ class KubaGame:
         else:
             self._current_turn = self._players[0].get_playername()
 
-        return True
+        if self._debug:
+            self._check_consistency()
 
-    def check_knock_own_marble(self, marble_color, direction, coordinates):
+    def legal_moves(self, playername):
         """
-        used within the make_move method to check if a potential move will knock own's own
-        marble off the board
-        :param marble_color: color of player's marble
-        :param direction: direction of move, same as make_move parameter
-        :param coordinates: coordinates of slot to move, same as make_move parameter
-        :return: True if move will knock own marble off the board, False if it won't
+        generates every move playername can make right now without changing the board. A move is legal when
+        make_move would accept it: the game isn't over, it is the player's turn, the marble is theirs and accessible,
+        it doesn't knock their own marble off the board and it doesn't break the Ko rule.
+        :param playername: name of player to generate moves for
+        :return: generator of (coordinates, direction) tuples
         """
-        curr_spot = coordinates
-
-        if direction == 'L':
-            while self.get_marble(curr_spot) != 'X' and curr_spot[1] != 0:
-                curr_spot = (curr_spot[0], curr_spot[1] - 1)
+        if self._winner is not None:
+            return
+        if self._current_turn is not None and self._current_turn != playername:
+            return
 
-            if curr_spot[1] == 0 and self.get_marble(curr_spot) == marble_color:
-                return True
-            else:
-                return False
+        marble_color = self.get_player_from_name(playername).get_marble_color()
+        if self._prev_direction is not None:
+            ko_direction = OPPOSITE_DIRECTIONS[self._prev_direction]
+        else:
+            ko_direction = None
+
+        for direction, accessible in self._accessible.items():
+            for coordinates in list(accessible):
+                if self.get_marble(coordinates) != marble_color:
+                    continue
+                if direction == ko_direction and coordinates == self._last_slot_moved:
+                    continue
+                if self.check_knock_own_marble(marble_color, direction, coordinates):
+                    continue
+                yield coordinates, direction
+
+    def _update_accessibility(self, slots):
+        """
+        refreshes the accessible pushes of the given slots and of their neighbours, which are the only pushes that
+        change when those slots change between empty and filled
+        :param slots: iterable of coordinates of slots that changed
+        :return: none
+        """
+        refresh = set()
+        for row, col in slots:
+            index = row * 7 + col
+            refresh.add(index)
+            for behind_slots in BEHIND_SLOTS.values():
+                if behind_slots[index] is not None:
+                    refresh.add(behind_slots[index])
+
+        for index in refresh:
+            coordinates = SLOT_COORDINATES[index]
+            filled = self.get_marble(coordinates) != 'X'
+            for direction, behind_slots in BEHIND_SLOTS.items():
+                behind = behind_slots[index]
+                if filled and (behind is None or self.get_marble(SLOT_COORDINATES[behind]) == 'X'):
+                    self._accessible[direction].add(coordinates)
+                else:
+                    self._accessible[direction].discard(coordinates)
 
-        if direction == 'R':
-            while self.get_marble(curr_spot) != 'X' and curr_spot[1] != 6:
-                curr_spot = (curr_spot[0], curr_spot[1] + 1)
+    def _push(self, coordinates, direction):
+        """
+        used within the make_move method to push the line of marbles starting at coordinates one slot in direction.
+        The line runs along the slot's ray up to the first empty slot, or to the edge, and is shifted with one slice
+        assignment. The move must already have been validated.
+        :param coordinates: coordinates of the marble being pushed, same as make_move parameter
+        :param direction: direction of move, same as make_move parameter
+        :return: tuple of (slot the pushed line ended on, color of the marble pushed off the board or None)
+        """
+        index = coordinates[0] * 7 + coordinates[1]
+        ray_slice = RAY_SLICES[direction][index]
+        line = self._slots[ray_slice]
 
-            if curr_spot[1] == 6 and self.get_marble(curr_spot) == marble_color:
-                return True
-            else:
-                return False
+        # the empty slot the line ends on is filled, otherwise the marble at the edge falls off
+        if 'X' in line:
+            length = line.index('X')
+            fallen_marble = None
+            pushed = ['X'] + line[:length] + line[length + 1:]
+        else:
+            length = len(line) - 1
+            fallen_marble = line[-1]
+            pushed = ['X'] + line[:-1]
+
+        self._slots[ray_slice] = pushed
+        ray = RAYS[direction][index]
+        self._rehash_line(ray, line, pushed, length)
+        return SLOT_COORDINATES[ray[length]], fallen_marble
+
+    def _unpush(self, coordinates, direction, end_slot, fallen_marble):
+        """
+        used within the pop_move method to move the line pushed by _push back one slot, undoing the push
+        :param coordinates: coordinates the line was pushed from
+        :param direction: direction the line was pushed
+        :param end_slot: slot the pushed line ended on, as returned by _push
+        :param fallen_marble: color of the marble pushed off the board or None, as returned by _push
+        :return: none
+        """
+        index = coordinates[0] * 7 + coordinates[1]
+        ray_slice = RAY_SLICES[direction][index]
+        ray = RAYS[direction][index]
+        length = ray.index(end_slot[0] * 7 + end_slot[1])
+        line = self._slots[ray_slice]
 
-        if direction == 'F':
-            while self.get_marble(curr_spot) != 'X' and curr_spot[0] != 0:
-                curr_spot = (curr_spot[0] - 1, curr_spot[1])
+        pulled = line[1:length + 1] + [fallen_marble or 'X'] + line[length + 1:]
+        self._slots[ray_slice] = pulled
+        self._rehash_line(ray, line, pulled, length)
 
-            if curr_spot[1] == 0 and self.get_marble(curr_spot) == marble_color:
-                return True
-            else:
-                return False
+    def _rehash_line(self, ray, old_line, new_line, length):
+        """
+        updates the board hash for a line of marbles that moved along a ray
+        :param ray: slot indices of the ray, from RAYS
+        :param old_line: marbles on the ray before the move
+        :param new_line: marbles on the ray after the move
+        :param length: index on the ray of the last slot that changed
+        :return: none
+        """
+        board_hash = self._board_hash
+        for position in range(length + 1):
+            index = ray[position]
+            board_hash ^= ZOBRIST_MARBLES[old_line[position]][index] ^ ZOBRIST_MARBLES[new_line[position]][index]
+        self._board_hash = board_hash
 
-        if direction == 'B':
-            while self.get_marble(curr_spot) != 'X' and curr_spot[0] != 6:
-                curr_spot = (curr_spot[0] - 1, curr_spot[1])
+    def get_pushed_off_marble(self, coordinates, direction):
+        """
+        finds which marble, if any, pushing the marble at coordinates in direction would push off the board,
+        without making the move
+        :param coordinates: coordinates of the marble to push, same as make_move parameter
+        :param direction: direction of move, same as make_move parameter
+        :return: W, B or R for the marble at the end of the line if the line reaches the edge, None if it doesn't
+        """
+        line = self._slots[RAY_SLICES[direction][coordinates[0] * 7 + coordinates[1]]]
+        if 'X' in line:
+            return None
+        return line[-1]
 
-            if curr_spot[1] == 0 and self.get_marble(curr_spot) == marble_color:
-                return True
-            else:
-                return False
+    def check_knock_own_marble(self, marble_color, direction, coordinates):
+        """
+        used within the make_move method to check if a potential move will knock own's own
+        marble off the board
+        :param marble_color: color of player's marble
+        :param direction: direction of move, same as make_move parameter
+        :param coordinates: coordinates of slot to move, same as make_move parameter
+        :return: True if move will knock own marble off the board, False if it won't
+        """
+        return self.get_pushed_off_marble(coordinates, direction) == marble_color
 
     def get_winner(self):
         """
@@ -433,7 +606,10 @@ class KubaGame:
         :param coordinates: coordinates of board spot for which you want to see what is present there
         :return: return X, W, B, R, depending on what is present at the coordinates location
         """
-        return self._board[coordinates[0]][coordinates[1]]
+        row, col = coordinates
+        if not (-7 <= row < 7 and -7 <= col < 7):
+            raise IndexError("board coordinates out of range")
+        return self._slots[row % 7 * 7 + col % 7]
 
     def set_marble(self, coordinates, marble_color):
         """
@@ -442,38 +618,66 @@ class KubaGame:
         :param marble_color: color you want to change that slot to
         :return: none
         """
-        self._board[coordinates[0]][coordinates[1]] = marble_color
+        index = coordinates[0] * 7 + coordinates[1]
+        self._board_hash ^= ZOBRIST_MARBLES[self._slots[index]][index] ^ ZOBRIST_MARBLES[marble_color][index]
+        self._slots[index] = marble_color
 
     def get_marble_count(self):
         """
-        gets number of white, black, and red marbles as tuple in the order (W, B, R) by iterating through board
-        and accumulating counts for each marble
+        gets number of white, black, and red marbles as tuple in the order (W, B, R) from the counters kept up to
+        date by make_move
         no parameters
         :return: tuple of counts of white, black, and red marbles currently on board
         """
+        return self._marble_counts['W'], self._marble_counts['B'], self._marble_counts['R']
 
-        white_count = 0
-        black_count = 0
-        red_count = 0
+    def _scan_marble_count(self):
+        """
+        gets number of white, black, and red marbles as tuple in the order (W, B, R) by counting each marble on
+        the board
+        no parameters
+        :return: tuple of counts of white, black, and red marbles currently on board
+        """
+        return self._slots.count('W'), self._slots.count('B'), self._slots.count('R')
 
-        for sublist in self._board:
-            for space in sublist:
-                if space == 'W':
-                    white_count += 1
-                elif space == 'B':
-                    black_count += 1
-                elif space == 'R':
-                    red_count += 1
+    def _scan_board_hash(self):
+        """
+        computes the Zobrist hash of the marbles on the board by iterating through the board
+        no parameters
+        :return: 64-bit integer hash
+        """
+        key = 0
+        for row_num, row in enumerate(self.get_board()):
+            for col_num, marble in enumerate(row):
+                key ^= ZOBRIST_MARBLES[marble][row_num * 7 + col_num]
+        return key
+
+    def _check_consistency(self):
+        """
+        used in debug mode to check the marble counters, red marble counts and board hash against a full scan
+        of the board
+        no parameters
+        :return: none, raises AssertionError if they disagree
+        """
+        scanned = self._scan_marble_count()
+        if scanned != self.get_marble_count():
+            raise AssertionError("marble counters " + str(self.get_marble_count()) + " don't match board "
+                                 + str(scanned))
 
-        return white_count, black_count, red_count
+        captured = sum(player.get_red_count() for player in self._players)
+        if captured + scanned[2] != 13:
+            raise AssertionError(str(captured) + " red marbles captured but " + str(scanned[2]) + " left on board")
+
+        if self._scan_board_hash() != self._board_hash:
+            raise AssertionError("board hash doesn't match board")
 
     def display_board(self):
         """
         no parameters, displays game board to the console
         :return: none
         """
-        for num in range(7):
-            print(self._board[num])
+        for row in self.get_board():
+            print(row)
 
 
 class Player:
@@ -526,8 +730,19 @@ class Player:
         """
         self._red_marble_count += 1
 
+    def dec_red_count(self):
+        """
+        no parameters
+        decrements red_marble_count data member, used when a capturing move is taken back
+        :return: no return value
+        """
+        self._red_marble_count -= 1
+
 
 if __name__ == "__main__":
+    # use the KubaGame module KubaGUI imports, so its move results match the ones play_game looks up
+    from KubaGame import KubaGame
+    from KubaGUI import play_game
 
     player_1 = input("Please enter the name and marble color of the first player as a tuple. (Ex. ('PlayerA', 'W')): ")
     player_1_as_tuple = tuple(player_1.split(','))
@@ -535,30 +750,7 @@ if __name__ == "__main__":
     player_2_as_tuple = tuple(player_2.split(','))
     my_game = KubaGame(player_1_as_tuple, player_2_as_tuple)
 
-    while my_game.get_winner() is None:
-        my_pygame = PyGameFeatures(my_game.get_board(), my_game.get_player_from_name(player_1_as_tuple[0]),
-                                   my_game.get_player_from_name(player_2_as_tuple[0]))
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                sys.exit()
-
-        pygame.display.update()
-
-        if my_game.get_current_turn() is None:
-            coordinates = input(
-                player_1_as_tuple[0] + ", please provide the coordinates (as a tuple in the format (row, column) of the marble you would like to move: ")
-            coords_as_tuple = tuple(map(int, coordinates.split(',')))
-            direction = input(player_1_as_tuple[0] + ", please provide the direction (L, R, F, or B) you would like to move to marble towards: ")
-            my_game.make_move(player_1_as_tuple[0], coords_as_tuple, direction)
-        else:
-            coordinates = input(
-                my_game.get_current_turn() + ", please provide the coordinates (as a tuple in the format (row, column) of the marble you would like to move: ")
-            coords_as_tuple = tuple(map(int, coordinates.split(',')))
-            direction = input(
-                my_game.get_current_turn() + ", please provide the direction (L, R, F, or B) you would like to move to marble towards: ")
-            my_game.make_move(my_game.get_current_turn(), coords_as_tuple, direction)
-
-
-
-
+    # moves are made and rejected moves are shown in the window
+    winner = play_game(my_game)
+    if winner is not None:
+        print(winner + " won the game.")
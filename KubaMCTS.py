@@ -0,0 +1,343 @@
+# Description: Monte Carlo tree search player for the Kuba game. MCTSPlayer grows a UCT search tree with
+#              KubaGame.push_move/pop_move, scores new leaves with short random playouts that fall back on
+#              AIPlayer.evaluate when they are cut off, and plays the most visited move through KubaGame.make_move.
+#              The subtree under the position reached is kept for the next turn. With processes > 1, worker
+#              processes grow independent trees from the same position (root parallelism) and their root
+#              statistics are added to the player's own tree before the move is chosen.
+
+import math
+import multiprocessing
+import pickle
+import random
+import time
+
+from KubaGame import Player
+from KubaSearch import AIPlayer
+
+# playouts stop after this many moves and are scored from the position reached
+ROLLOUT_DEPTH = 40
+
+# evaluation points that move a cut-off playout's score about halfway from a draw to a win
+ROLLOUT_SCALE = 20.0
+
+
+class MCTSNode:
+    """
+    Represents a position in the search tree. wins counts playout rewards for the player who made the move that
+    led here, so a parent picks the child that is best for the player to move at the parent.
+    """
+
+    __slots__ = ('move', 'mover', 'parent', 'children', 'untried', 'key', 'visits', 'wins')
+
+    def __init__(self, move, mover, parent, key):
+        """
+        initializes MCTSNode instance
+        :param move: (coordinates, direction) move that led here, None for the root
+        :param mover: name of the player who made move, None for the root
+        :param parent: parent MCTSNode, None for the root
+        :param key: KubaGame.get_hash() of the position
+        no return value
+        """
+        self.move = move
+        self.mover = mover
+        self.parent = parent
+        self.children = {}
+        self.untried = None
+        self.key = key
+        self.visits = 0
+        self.wins = 0.0
+
+
+class MCTSPlayer(Player):
+    """
+    Represents a computer player of the Kuba game that picks moves with UCT Monte Carlo tree search. It searches
+    until its time budget or playout budget runs out, whichever comes first, and plays through KubaGame.make_move
+    like any other player. After each search, get_search_info reports the playouts run and playouts per second.
+    """
+
+    def __init__(self, name, marble_color, time_budget=1.0, playouts=None, exploration=math.sqrt(2),
+                 processes=1, rollout_depth=ROLLOUT_DEPTH, seed=None):
+        """
+        initializes MCTSPlayer instance
+        :param name: name of player, must match the name the KubaGame was created with
+        :param marble_color: player's marble color
+        :param time_budget: seconds allowed for choosing each move, None for no time limit
+        :param playouts: playouts allowed for choosing each move, counted in each process, None for no limit
+        :param exploration: UCT exploration constant, higher values try less visited moves more often
+        :param processes: number of processes searching each move. The player searches in this process and starts a
+        pool of processes - 1 workers the first time it needs one; call close when done with the player.
+        :param rollout_depth: moves after which a playout is stopped and scored by evaluation
+        :param seed: seed of the random playouts, None for an unseeded search
+        no return value
+        """
+        super().__init__(name, marble_color)
+        if time_budget is None and playouts is None:
+            raise ValueError("MCTSPlayer needs a time budget or a playout budget")
+        self._time_budget = time_budget
+        self._playouts = playouts
+        self._exploration = exploration
+        self._processes = processes
+        self._rollout_depth = rollout_depth
+        self._seed = seed
+        self._rng = random.Random(seed)
+        self._pool = None
+        self._root = None
+        self._search_info = None
+
+    def close(self):
+        """
+        stops the worker pool, if one was started
+        no parameters
+        :return: no return value
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def get_search_info(self):
+        """
+        no parameters
+        :return: dictionary describing the last search (playouts, seconds, playouts_per_second, reused visits of the
+        tree kept from the last turn, visits and win rate of the chosen move, processes), None if no search has been run
+        """
+        return self._search_info
+
+    def play(self, game):
+        """
+        chooses a move and makes it in game
+        :param game: KubaGame to play in
+        :return: MoveResult from make_move if a move was made, False if there was no legal move
+        """
+        move = self.choose_move(game)
+        if move is None:
+            return False
+        return game.make_move(self.get_playername(), move[0], move[1])
+
+    def choose_move(self, game):
+        """
+        searches game for the best move for this player. The game is searched in place with push_move/pop_move and
+        is left as it was.
+        :param game: KubaGame in which it is this player's turn
+        :return: (coordinates, direction) tuple of the move to make, None if there is no legal move
+        """
+        start = time.perf_counter()
+        root = self._reuse_root(game)
+        reused = root.visits
+
+        pending = None
+        if self._processes > 1:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self._processes - 1)
+            # the pool pickles tasks on another thread while this process searches the game, so pickle it first
+            game_bytes = pickle.dumps(game)
+            seed = self._rng.getrandbits(32)
+            tasks = [(game_bytes, self.get_playername(), self.get_marble_color(), self._time_budget, self._playouts,
+                      self._exploration, self._rollout_depth, seed + worker)
+                     for worker in range(1, self._processes)]
+            pending = self._pool.map_async(_search_worker, tasks)
+
+        playouts = self._search(game, root)
+        if pending is not None:
+            for worker_playouts, stats in pending.get():
+                playouts += worker_playouts
+                self._merge_root_stats(game, root, stats)
+
+        elapsed = time.perf_counter() - start
+        if not root.children:
+            self._root = None
+            self._search_info = None
+            return None
+
+        best = max(root.children.values(), key=lambda child: child.visits)
+        self._search_info = {
+            'playouts': playouts,
+            'seconds': elapsed,
+            'playouts_per_second': playouts / elapsed if elapsed > 0 else 0.0,
+            'reused_visits': reused,
+            'visits': best.visits,
+            'win_rate': best.wins / best.visits if best.visits else 0.0,
+            'processes': self._processes,
+        }
+
+        # keep the subtree of the chosen move for the next turn
+        best.parent = None
+        self._root = best
+        return best.move
+
+    def _reuse_root(self, game):
+        """
+        finds the node for the game's position in the tree kept from the last turn: the kept node itself, or one of
+        its children if the other player has moved since
+        :param game: KubaGame in which it is this player's turn
+        :return: MCTSNode to search from, a new one if the position isn't in the kept tree
+        """
+        key = game.get_hash()
+        old_root = self._root
+        if old_root is not None:
+            if old_root.key == key:
+                return old_root
+            for child in old_root.children.values():
+                if child.key == key:
+                    child.parent = None
+                    return child
+        return MCTSNode(None, None, None, key)
+
+    def _merge_root_stats(self, game, root, stats):
+        """
+        adds a worker's root statistics to the root of this player's tree
+        :param game: KubaGame being searched
+        :param root: root MCTSNode
+        :param stats: dictionary mapping move to (visits, wins) from a worker
+        :return: no return value
+        """
+        playername = self.get_playername()
+        for move, (visits, wins) in stats.items():
+            child = root.children.get(move)
+            if child is None:
+                game.push_move(playername, move[0], move[1])
+                child = MCTSNode(move, playername, root, game.get_hash())
+                game.pop_move()
+                root.children[move] = child
+                if root.untried is not None and move in root.untried:
+                    root.untried.remove(move)
+            child.visits += visits
+            child.wins += wins
+            root.visits += visits
+
+    def _search(self, game, root):
+        """
+        runs playouts from root until the budget runs out
+        :param game: KubaGame at the root position
+        :param root: root MCTSNode
+        :return: number of playouts run
+        """
+        playername = self.get_playername()
+        if root.untried is None:
+            root.untried = [move for move in self._moves(game, playername) if move not in root.children]
+        if not root.untried and not root.children:
+            return 0
+
+        deadline = None if self._time_budget is None else time.perf_counter() + self._time_budget
+        playouts = 0
+        while self._playouts is None or playouts < self._playouts:
+            if deadline is not None and playouts & 15 == 0 and time.perf_counter() > deadline:
+                break
+            self._playout(game, root, playername)
+            playouts += 1
+        return playouts
+
+    def _playout(self, game, root, playername):
+        """
+        runs one playout: selects a leaf with UCT, expands it by one move, plays randomly from there and passes the
+        result back up the tree. The game is left as it was.
+        :param game: KubaGame at the root position
+        :param root: root MCTSNode
+        :param playername: name of the player to move at the root
+        :return: no return value
+        """
+        node = root
+        to_move = playername
+        pushed = 0
+        try:
+            # selection: follow UCT through fully expanded nodes
+            while True:
+                if node.untried is None:
+                    # nodes added from a worker's root statistics haven't listed their moves yet
+                    node.untried = [] if game.get_winner() is not None else [
+                        move for move in self._moves(game, to_move) if move not in node.children]
+                if node.untried or not node.children:
+                    break
+                node = self._select_child(node)
+                game.push_move(to_move, node.move[0], node.move[1])
+                pushed += 1
+                to_move = game.get_current_turn()
+
+            # expansion: add one untried move, unless the game is over here
+            if node.untried and game.get_winner() is None:
+                move = node.untried.pop(self._rng.randrange(len(node.untried)))
+                game.push_move(to_move, move[0], move[1])
+                pushed += 1
+                child = MCTSNode(move, to_move, node, game.get_hash())
+                node.children[move] = child
+                node = child
+                to_move = game.get_current_turn()
+
+            # simulation: random moves until the game ends or the playout is cut off
+            scorer = to_move
+            for _ in range(self._rollout_depth):
+                if game.get_winner() is not None:
+                    break
+                moves = self._moves(game, to_move)
+                if not moves:
+                    break
+                move = moves[self._rng.randrange(len(moves))]
+                game.push_move(to_move, move[0], move[1])
+                pushed += 1
+                to_move = game.get_current_turn()
+            reward = self._score(game, scorer)
+        finally:
+            for _ in range(pushed):
+                game.pop_move()
+
+        # backpropagation: reward is for scorer, each node keeps it for the player who moved into it
+        while node is not None:
+            node.visits += 1
+            if node.mover == scorer:
+                node.wins += reward
+            else:
+                node.wins += 1.0 - reward
+            node = node.parent
+
+    def _select_child(self, node):
+        """
+        picks the child with the highest UCT value
+        :param node: fully expanded MCTSNode
+        :return: child MCTSNode
+        """
+        log_visits = math.log(node.visits)
+        exploration = self._exploration
+        best = None
+        best_value = None
+        for child in node.children.values():
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if best is None or value > best_value:
+                best, best_value = child, value
+        return best
+
+    @staticmethod
+    def _moves(game, playername):
+        """
+        :param game: KubaGame
+        :param playername: name of the player to move
+        :return: sorted list of playername's legal moves, sorted so seeded searches repeat exactly
+        """
+        return sorted(game.legal_moves(playername))
+
+    @staticmethod
+    def _score(game, playername):
+        """
+        scores the end of a playout for playername
+        :param game: KubaGame at the end of the playout
+        :param playername: name of the player to score for
+        :return: 1 for a win, 0 for a loss, otherwise between 0 and 1 from AIPlayer.evaluate
+        """
+        winner = game.get_winner()
+        if winner is not None:
+            return 1.0 if winner == playername else 0.0
+        return 0.5 + 0.5 * math.tanh(AIPlayer.evaluate(game, playername) / ROLLOUT_SCALE)
+
+
+def _search_worker(args):
+    """
+    searches a position in a worker process for root-parallel search
+    :param args: tuple of (pickled game, player name, marble color, time budget, playout budget, exploration constant,
+    rollout depth, seed)
+    :return: tuple of (playouts run, dictionary mapping each root move to (visits, wins))
+    """
+    game_bytes, playername, marble_color, time_budget, playouts, exploration, rollout_depth, seed = args
+    game = pickle.loads(game_bytes)
+    player = MCTSPlayer(playername, marble_color, time_budget, playouts, exploration, 1, rollout_depth, seed)
+    root = MCTSNode(None, None, None, game.get_hash())
+    count = player._search(game, root)
+    return count, {move: (child.visits, child.wins) for move, child in root.children.items()}
@@ -0,0 +1,238 @@
+# Description: Move-tree counting ("perft") for the Kuba game. perft walks every sequence of legal moves to a fixed
+#              depth from a position with push_move/pop_move and counts the leaf moves, broken down by what the last
+#              move did: captured a red marble, knocked off an opponent marble, or won the game. It also counts the
+#              moves the Ko rule blocks at the last ply. Subtrees of the root moves can be split across a process
+#              pool. STARTING_POSITION_COUNTS holds the counts from the starting position, so any engine backend can be
+#              checked against them; nodes per second at a fixed depth is the engine's throughput figure.
+#              Usage: python KubaPerft.py DEPTH [--engine bitboard] [--processes N] [--divide] [--check]
+
+import argparse
+import json
+import multiprocessing
+import pickle
+import sys
+import time
+
+from KubaGame import KubaGame, MoveResult, BEHIND_SLOTS, OPPOSITE_DIRECTIONS, SLOT_COORDINATES
+from KubaBitboard import BitboardKubaGame
+
+ENGINES = {'list': KubaGame, 'bitboard': BitboardKubaGame}
+PLAYERS = (('White', 'W'), ('Black', 'B'))
+
+# what perft counts about the leaf moves
+COUNT_NAMES = ('nodes', 'red_captures', 'knock_offs', 'wins', 'ko_blocked')
+
+# counts from the starting position, with either player allowed to move first
+STARTING_POSITION_COUNTS = {
+    1: {'nodes': 16, 'red_captures': 0, 'knock_offs': 0, 'wins': 0, 'ko_blocked': 0},
+    2: {'nodes': 128, 'red_captures': 0, 'knock_offs': 0, 'wins': 0, 'ko_blocked': 0},
+    3: {'nodes': 1280, 'red_captures': 0, 'knock_offs': 0, 'wins': 0, 'ko_blocked': 0},
+    4: {'nodes': 12768, 'red_captures': 0, 'knock_offs': 32, 'wins': 0, 'ko_blocked': 16},
+    5: {'nodes': 141592, 'red_captures': 0, 'knock_offs': 1248, 'wins': 0, 'ko_blocked': 328},
+    6: {'nodes': 1564336, 'red_captures': 0, 'knock_offs': 18760, 'wins': 0, 'ko_blocked': 5640},
+}
+
+
+def _movers(game):
+    """
+    :param game: KubaGame
+    :return: list of names of the players who may move: the player whose turn it is, or both before the first move
+    """
+    if game.get_current_turn() is None:
+        return list(game.get_playernames())
+    return [game.get_current_turn()]
+
+
+def _ko_blocked(game, playername):
+    """
+    counts the moves playername can't make only because of the Ko rule. The rule forbids pushing the marble on the
+    slot the last move ended on back the way it came, so there is at most one.
+    :param game: KubaGame
+    :param playername: name of the player to move
+    :return: 1 if that move is blocked by the Ko rule and would otherwise be legal, else 0
+    """
+    coordinates = game._last_slot_moved
+    if coordinates is None:
+        return 0
+    direction = OPPOSITE_DIRECTIONS[game._prev_direction]
+    if game.validate_move(playername, coordinates, direction) != MoveResult.KO_RULE:
+        return 0
+    behind = BEHIND_SLOTS[direction][coordinates[0] * 7 + coordinates[1]]
+    return int(behind is None or game.get_marble(SLOT_COORDINATES[behind]) == 'X')
+
+
+def _count_leaves(game, playername, counts):
+    """
+    adds the counts of playername's moves in game, without making them
+    :param game: KubaGame
+    :param playername: name of the player to move
+    :param counts: dictionary of counts to add to
+    :return: no return value
+    """
+    player = game.get_player_from_name(playername)
+    marble_color = player.get_marble_color()
+    white_count, black_count, _ = game.get_marble_count()
+    opponent_left = black_count if marble_color == 'W' else white_count
+
+    nodes = red_captures = knock_offs = wins = 0
+    for coordinates, direction in game.legal_moves(playername):
+        nodes += 1
+        fallen_marble = game.get_pushed_off_marble(coordinates, direction)
+        if fallen_marble == 'R':
+            red_captures += 1
+            if player.get_red_count() == 6:
+                wins += 1
+        elif fallen_marble is not None:
+            # legal moves never push off the mover's own marble
+            knock_offs += 1
+            if opponent_left == 1:
+                wins += 1
+
+    counts['nodes'] += nodes
+    counts['red_captures'] += red_captures
+    counts['knock_offs'] += knock_offs
+    counts['wins'] += wins
+    counts['ko_blocked'] += _ko_blocked(game, playername)
+
+
+def _perft(game, depth, counts):
+    """
+    adds the counts of the move tree below game to counts
+    :param game: KubaGame, searched in place and left as it was
+    :param depth: number of moves, at least 1
+    :param counts: dictionary of counts to add to
+    :return: no return value
+    """
+    for playername in _movers(game):
+        if depth == 1:
+            _count_leaves(game, playername, counts)
+            continue
+        for coordinates, direction in list(game.legal_moves(playername)):
+            game.push_move(playername, coordinates, direction)
+            if game.get_winner() is None:
+                _perft(game, depth - 1, counts)
+            game.pop_move()
+
+
+def _perft_task(args):
+    """
+    counts the subtree below one root move in a worker process
+    :param args: tuple of (pickled game, name of the player making the move, coordinates, direction, depth)
+    :return: tuple of (move, dictionary of counts)
+    """
+    game_bytes, playername, coordinates, direction, depth = args
+    game = pickle.loads(game_bytes)
+    return (playername, coordinates, direction), perft_move(game, playername, coordinates, direction, depth)
+
+
+def perft_move(game, playername, coordinates, direction, depth):
+    """
+    counts the move tree below one move
+    :param game: KubaGame, searched in place and left as it was
+    :param playername: name of the player making the move
+    :param coordinates: coordinates of the marble to push
+    :param direction: direction to push it
+    :param depth: number of moves including this one, at least 1
+    :return: dictionary of counts, keyed by COUNT_NAMES. With depth 1 the move itself is the only leaf.
+    """
+    counts = dict.fromkeys(COUNT_NAMES, 0)
+    game.push_move(playername, coordinates, direction)
+    try:
+        if depth == 1:
+            # the Ko count of a single leaf is for the position it was chosen in, see perft
+            counts['nodes'] = 1
+            fallen_marble = game._undo_stack[-1][4]
+            if fallen_marble == 'R':
+                counts['red_captures'] = 1
+            elif fallen_marble is not None:
+                counts['knock_offs'] = 1
+            if game.get_winner() is not None:
+                counts['wins'] = 1
+        elif game.get_winner() is None:
+            _perft(game, depth - 1, counts)
+    finally:
+        game.pop_move()
+    return counts
+
+
+def perft(game, depth, processes=1, divide=False):
+    """
+    counts the leaves of the legal move tree of a position. Leaves are sequences of depth legal moves; like mates
+    in chess perft, a game won before the last move adds no leaves. Before the first move of a game either player
+    may move, so both players' moves are counted at the root.
+    :param game: KubaGame or a subclass. It is searched in place with push_move/pop_move and left as it was.
+    :param depth: number of moves, 0 or more
+    :param processes: number of processes to split the root moves across, 1 to count in this process
+    :param divide: also return the counts below each root move
+    :return: dictionary of counts keyed by COUNT_NAMES: leaf moves, leaf moves that capture a red marble, leaf moves
+    that knock off an opponent marble, leaf moves that win, and moves blocked by the Ko rule in the positions the leaf
+    moves are made from. With divide, a tuple of that dictionary and a dictionary mapping each root move
+    (player name, coordinates, direction) to its counts.
+    """
+    counts = dict.fromkeys(COUNT_NAMES, 0)
+    if depth == 0:
+        counts['nodes'] = 1
+        return (counts, {}) if divide else counts
+
+    root_moves = [(playername, coordinates, direction) for playername in _movers(game)
+                  for coordinates, direction in sorted(game.legal_moves(playername))]
+
+    if processes > 1 and depth > 1:
+        game_bytes = pickle.dumps(game)
+        tasks = [(game_bytes, playername, coordinates, direction, depth)
+                 for playername, coordinates, direction in root_moves]
+        with multiprocessing.Pool(processes) as pool:
+            divided = dict(pool.imap_unordered(_perft_task, tasks))
+    else:
+        divided = {move: perft_move(game, move[0], move[1], move[2], depth) for move in root_moves}
+
+    for move_counts in divided.values():
+        for name in COUNT_NAMES:
+            counts[name] += move_counts[name]
+    if depth == 1:
+        for playername in _movers(game):
+            counts['ko_blocked'] += _ko_blocked(game, playername)
+
+    if divide:
+        return counts, {move: divided[move] for move in root_moves}
+    return counts
+
+
+def main(argv=None):
+    """
+    command line entry point: runs perft from the starting position and prints the counts and nodes per second as
+    JSON. With --check, exits with status 1 if the counts don't match STARTING_POSITION_COUNTS.
+    :param argv: command line arguments, defaults to sys.argv
+    :return: no return value
+    """
+    parser = argparse.ArgumentParser(description="Count the Kuba move tree from the starting position.")
+    parser.add_argument('depth', type=int)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='list')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--divide', action='store_true', help="also print the counts below each root move")
+    parser.add_argument('--check', action='store_true', help="compare the counts with STARTING_POSITION_COUNTS")
+    args = parser.parse_args(argv)
+
+    game = ENGINES[args.engine](PLAYERS[0], PLAYERS[1])
+    start = time.perf_counter()
+    counts, divided = perft(game, args.depth, args.processes, divide=True)
+    seconds = time.perf_counter() - start
+
+    if args.divide:
+        for (playername, coordinates, direction), move_counts in divided.items():
+            print(json.dumps({'move': [playername, list(coordinates), direction], 'counts': move_counts}))
+    print(json.dumps({'depth': args.depth, 'engine': args.engine, 'counts': counts, 'seconds': seconds,
+                      'nodes_per_second': counts['nodes'] / seconds if seconds > 0 else 0.0}))
+
+    if args.check:
+        expected = STARTING_POSITION_COUNTS.get(args.depth)
+        if expected is None:
+            print("no known counts for depth " + str(args.depth), file=sys.stderr)
+            sys.exit(1)
+        if counts != expected:
+            print("counts don't match: expected " + json.dumps(expected), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
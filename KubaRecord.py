@@ -0,0 +1,280 @@
+# Description: Compact binary records of Kuba games. Each move is stored in one byte (slot * 4 + direction, with
+#              slot = row * 7 + column and directions in the order L, R, F, B), after a small header holding the
+#              players' names and colors and which of them moved first. An archive is a file header followed by any
+#              number of game records. Archives can be read as a stream, one game at a time, or memory-mapped for
+#              random access by game index, and records can be replayed through KubaGame lazily.
+
+import mmap
+import struct
+from array import array
+from collections import namedtuple
+
+from KubaGame import KubaGame
+
+ARCHIVE_MAGIC = b'KUBAREC1'
+
+# name 1 length, name 2 length, color 1, color 2, index of the player who moved first, number of moves
+RECORD_HEADER = struct.Struct('<BBccBI')
+
+DIRECTIONS = 'LRFB'
+
+# move byte -> (coordinates, direction), for the 196 valid move bytes
+MOVES = [((slot // 7, slot % 7), direction) for slot in range(49) for direction in DIRECTIONS]
+
+# one recorded game. player1 and player2 are (name, marble color) tuples as passed to KubaGame, first_mover is 0 or 1
+# for the player who made the first move, and moves is a bytes object of move bytes.
+GameRecord = namedtuple('GameRecord', ['player1', 'player2', 'first_mover', 'moves'])
+
+
+def encode_move(coordinates, direction):
+    """
+    packs a move into one byte
+    :param coordinates: (row, column) of the marble pushed
+    :param direction: L, R, F or B
+    :return: integer from 0 to 195
+    """
+    row, col = coordinates
+    if not (0 <= row < 7 and 0 <= col < 7) or direction not in DIRECTIONS:
+        raise ValueError("not a move: " + str((coordinates, direction)))
+    return (row * 7 + col) * 4 + DIRECTIONS.index(direction)
+
+
+def decode_move(move_byte):
+    """
+    unpacks a move byte made by encode_move
+    :param move_byte: integer from 0 to 195
+    :return: (coordinates, direction) tuple
+    """
+    if not 0 <= move_byte < len(MOVES):
+        raise ValueError("not a move byte: " + str(move_byte))
+    return MOVES[move_byte]
+
+
+def encode_game(player1, player2, first_mover, moves):
+    """
+    packs a game into a record
+    :param player1: (name, marble color) tuple of the first player, as passed to KubaGame
+    :param player2: (name, marble color) tuple of the second player
+    :param first_mover: 0 if player1 made the first move, 1 if player2 did
+    :param moves: iterable of (coordinates, direction) moves in the order they were made
+    :return: bytes of the record
+    """
+    names = [player[0].encode('utf-8') for player in (player1, player2)]
+    if max(len(name) for name in names) > 255:
+        raise ValueError("player names are limited to 255 bytes")
+    if first_mover not in (0, 1):
+        raise ValueError("first_mover must be 0 or 1")
+
+    move_bytes = bytes(encode_move(coordinates, direction) for coordinates, direction in moves)
+    header = RECORD_HEADER.pack(len(names[0]), len(names[1]), player1[1].encode('ascii'),
+                                player2[1].encode('ascii'), first_mover, len(move_bytes))
+    return header + names[0] + names[1] + move_bytes
+
+
+def decode_game(data, offset=0):
+    """
+    unpacks the record starting at offset
+    :param data: bytes, bytearray or mmap holding the record
+    :param offset: position of the record in data
+    :return: tuple of (GameRecord, offset just past the record)
+    """
+    name1_length, name2_length, color1, color2, first_mover, move_count = RECORD_HEADER.unpack_from(data, offset)
+    start = offset + RECORD_HEADER.size
+    name1 = bytes(data[start:start + name1_length]).decode('utf-8')
+    start += name1_length
+    name2 = bytes(data[start:start + name2_length]).decode('utf-8')
+    start += name2_length
+    moves = bytes(data[start:start + move_count])
+    if len(moves) != move_count:
+        raise ValueError("game record is cut short")
+
+    record = GameRecord((name1, color1.decode('ascii')), (name2, color2.decode('ascii')), first_mover, moves)
+    return record, start + move_count
+
+
+class RecordWriter:
+    """
+    writes game records to an archive file opened in binary mode. The archive header is written when the writer is
+    created, so the file should be empty.
+    """
+
+    def __init__(self, archive_file):
+        """
+        initializes RecordWriter instance and writes the archive header
+        :param archive_file: file object opened for binary writing
+        no return value
+        """
+        self._file = archive_file
+        self._file.write(ARCHIVE_MAGIC)
+        self._games = 0
+
+    def get_game_count(self):
+        """
+        :return: number of games written
+        """
+        return self._games
+
+    def write_game(self, player1, player2, first_mover, moves):
+        """
+        appends one game to the archive
+        :param player1: (name, marble color) tuple of the first player
+        :param player2: (name, marble color) tuple of the second player
+        :param first_mover: 0 if player1 made the first move, 1 if player2 did
+        :param moves: iterable of (coordinates, direction) moves in the order they were made
+        :return: no return value
+        """
+        self.write_record(encode_game(player1, player2, first_mover, moves))
+
+    def write_record(self, record_bytes):
+        """
+        appends a game already packed by encode_game to the archive
+        :param record_bytes: bytes returned by encode_game
+        :return: no return value
+        """
+        self._file.write(record_bytes)
+        self._games += 1
+
+
+def read_records(archive_file):
+    """
+    reads the games of an archive one at a time, without loading the whole file
+    :param archive_file: file object opened for binary reading, positioned at the start of the archive
+    :return: generator of GameRecord
+    """
+    if archive_file.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+        raise ValueError("not a Kuba record archive")
+
+    while True:
+        header = archive_file.read(RECORD_HEADER.size)
+        if not header:
+            return
+        if len(header) != RECORD_HEADER.size:
+            raise ValueError("game record is cut short")
+        name1_length, name2_length, _, _, _, move_count = RECORD_HEADER.unpack(header)
+        body = archive_file.read(name1_length + name2_length + move_count)
+        yield decode_game(header + body)[0]
+
+
+def replay(record, engine=KubaGame):
+    """
+    replays a recorded game move by move. The same game object is yielded after every move, so copy it if a position
+    has to be kept.
+    :param record: GameRecord to replay
+    :param engine: KubaGame or a subclass such as BitboardKubaGame
+    :return: generator of (move number starting from 1, (coordinates, direction), game) tuples
+    """
+    return _replay_moves(record, engine(record.player1, record.player2))
+
+
+def _replay_moves(record, game):
+    """
+    makes a record's moves in a game at the starting position
+    :param record: GameRecord to replay
+    :param game: game created with the record's players, which is changed in place
+    :return: generator of (move number starting from 1, (coordinates, direction), game) tuples
+    """
+    playername = (record.player1, record.player2)[record.first_mover][0]
+    for move_number, move_byte in enumerate(record.moves, 1):
+        coordinates, direction = decode_move(move_byte)
+        result = game.make_move(playername, coordinates, direction)
+        if not result:
+            raise ValueError("recorded move " + str(move_number) + " is invalid: " + result.name)
+        yield move_number, (coordinates, direction), game
+        playername = game.get_current_turn()
+
+
+def final_position(record, engine=KubaGame):
+    """
+    replays a recorded game to the end
+    :param record: GameRecord to replay
+    :param engine: KubaGame or a subclass such as BitboardKubaGame
+    :return: game after the last recorded move
+    """
+    game = engine(record.player1, record.player2)
+    for _ in _replay_moves(record, game):
+        pass
+    return game
+
+
+class RecordArchive:
+    """
+    Represents an archive file memory-mapped for random access. Game offsets are found by reading only the record
+    headers, the first time a game is looked up by index, and records are decoded when they are asked for.
+    """
+
+    def __init__(self, path):
+        """
+        initializes RecordArchive instance by memory-mapping the archive at path
+        :param path: path of the archive file
+        no return value
+        """
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            self._file.close()
+            raise ValueError("not a Kuba record archive")
+        if self._map[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError("not a Kuba record archive")
+        self._offsets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        unmaps and closes the archive
+        no parameters
+        :return: no return value
+        """
+        self._map.close()
+        self._file.close()
+
+    def _index(self):
+        """
+        finds the offset of every record by stepping from header to header
+        no parameters
+        :return: array of record offsets
+        """
+        if self._offsets is None:
+            offsets = array('Q')
+            offset = len(ARCHIVE_MAGIC)
+            size = len(self._map)
+            while offset < size:
+                if offset + RECORD_HEADER.size > size:
+                    raise ValueError("game record is cut short")
+                offsets.append(offset)
+                name1_length, name2_length, _, _, _, move_count = RECORD_HEADER.unpack_from(self._map, offset)
+                offset += RECORD_HEADER.size + name1_length + name2_length + move_count
+            if offset > size:
+                raise ValueError("game record is cut short")
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self):
+        """
+        :return: number of games in the archive
+        """
+        return len(self._index())
+
+    def __getitem__(self, game_index):
+        """
+        :param game_index: index of the game in the archive, negative indices count from the end
+        :return: GameRecord of that game
+        """
+        return decode_game(self._map, self._index()[game_index])[0]
+
+    def __iter__(self):
+        """
+        :return: generator of the archive's GameRecords in order
+        """
+        offset = len(ARCHIVE_MAGIC)
+        size = len(self._map)
+        while offset < size:
+            record, offset = decode_game(self._map, offset)
+            yield record
@@ -0,0 +1,430 @@
+# Description: Search support for the Kuba game. Positions are keyed on KubaGame.get_hash(), the Zobrist hash of the
+#              full game state, so work done on a position is reused however the search reached it. AIPlayer picks
+#              its moves with an iterative-deepening alpha-beta search on top of KubaGame.push_move/pop_move.
+
+import time
+from collections import namedtuple
+
+from KubaGame import Player
+
+TableEntry = namedtuple('TableEntry', ['key', 'depth', 'value', 'bound', 'move', 'generation'])
+
+# what the value stored in a TableEntry means
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    """
+    Represents a fixed-size table of search results keyed on KubaGame.get_hash().
+    Each hash maps to one slot. When two positions want the same slot, the replacement policy decides which is kept:
+    'always' keeps the newest entry, 'depth' keeps the deeper search unless the stored entry is left over from an
+    earlier search (see new_search).
+    """
+
+    REPLACEMENT_POLICIES = ('always', 'depth')
+
+    def __init__(self, size=1 << 20, replacement='depth'):
+        """
+        initializes TranspositionTable instance
+        :param size: number of slots in the table
+        :param replacement: replacement policy, 'always' or 'depth'
+        no return value
+        """
+        if replacement not in self.REPLACEMENT_POLICIES:
+            raise ValueError("replacement must be one of " + str(self.REPLACEMENT_POLICIES))
+        self._size = size
+        self._replacement = replacement
+        self._slots = [None] * size
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        """
+        :return: number of filled slots
+        """
+        return self._size - self._slots.count(None)
+
+    def get_size(self):
+        """
+        :return: number of slots in the table
+        """
+        return self._size
+
+    def get_stats(self):
+        """
+        :return: dictionary of lookup hits and misses and the number of filled slots
+        """
+        return {'hits': self._hits, 'misses': self._misses, 'filled': len(self), 'size': self._size}
+
+    def new_search(self):
+        """
+        marks the start of a new search. Entries stored before this are still returned by lookup, but the 'depth'
+        policy lets newer entries replace them regardless of depth so the table doesn't fill up with stale results.
+        no parameters
+        :return: no return value
+        """
+        self._generation += 1
+
+    def clear(self):
+        """
+        empties the table
+        no parameters
+        :return: no return value
+        """
+        self._slots = [None] * self._size
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, key):
+        """
+        gets the entry stored for a position
+        :param key: hash of the position, from KubaGame.get_hash()
+        :return: TableEntry for the position, None if it isn't in the table
+        """
+        entry = self._slots[key % self._size]
+        if entry is not None and entry.key == key:
+            self._hits += 1
+            return entry
+        self._misses += 1
+        return None
+
+    def store(self, key, depth, value, bound=EXACT, move=None):
+        """
+        stores a search result for a position, subject to the replacement policy
+        :param key: hash of the position, from KubaGame.get_hash()
+        :param depth: depth the position was searched to
+        :param value: value found by the search
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND
+        :param move: best move found, as a (coordinates, direction) tuple, or None
+        :return: True if the entry was stored, False if the policy kept the existing entry
+        """
+        index = key % self._size
+        old = self._slots[index]
+        if (self._replacement == 'depth' and old is not None and old.key != key
+                and old.generation == self._generation and old.depth > depth):
+            return False
+
+        # keep the old best move when a shallower result for the same position doesn't have one
+        if move is None and old is not None and old.key == key:
+            move = old.move
+        self._slots[index] = TableEntry(key, depth, value, bound, move, self._generation)
+        return True
+
+
+# evaluation weights, in points per red marble captured and per marble ahead on the board
+RED_WEIGHT = 10
+MARBLE_WEIGHT = 8
+WIN_VALUE = 100000
+
+# values at least this far from 0 are wins or losses rather than evaluations
+WIN_THRESHOLD = WIN_VALUE // 2
+
+
+def _value_to_table(value, ply):
+    """
+    converts a search value for storing in a table. Win and loss values count moves from the root of the search, so
+    they are stored counting moves from the position itself, which is right wherever the position is reached from.
+    :param value: value of the position for the player to move
+    :param ply: number of moves from the root to the position
+    :return: value to store
+    """
+    if value >= WIN_THRESHOLD:
+        return value + ply
+    if value <= -WIN_THRESHOLD:
+        return value - ply
+    return value
+
+
+def _value_from_table(value, ply):
+    """
+    converts a value stored by _value_to_table back to a search value
+    :param value: stored value
+    :param ply: number of moves from the root of the current search to the position
+    :return: value of the position for the player to move, with wins and losses counted from the root
+    """
+    if value >= WIN_THRESHOLD:
+        return value - ply
+    if value <= -WIN_THRESHOLD:
+        return value + ply
+    return value
+
+
+class SearchTimeout(Exception):
+    """
+    raised inside the search when the time budget for a move runs out
+    """
+    pass
+
+
+class AIPlayer(Player):
+    """
+    represents a computer player of the Kuba game. It picks moves with an iterative-deepening alpha-beta search that
+    stops within a wall-clock budget, and plays them through KubaGame.make_move like any other player.
+    After each search, get_search_info reports the depth reached, nodes searched per second and principal variation.
+    """
+
+    def __init__(self, name, marble_color, time_budget=1.0, max_depth=32, table_size=1 << 18, table=None,
+                 tablebase=None):
+        """
+        initializes AIPlayer instance
+        :param name: name of player, must match the name the KubaGame was created with
+        :param marble_color: player's marble color
+        :param time_budget: seconds allowed for choosing each move
+        :param max_depth: deepest search to try, in moves
+        :param table_size: number of slots in the transposition table
+        :param table: table to search with instead of a new TranspositionTable, such as a KubaCache.EvaluationCache
+        shared with other processes. table_size is ignored when it is given.
+        :param tablebase: KubaTablebase.Tablebase giving exact values of the positions it covers, or None
+        no return value
+        """
+        super().__init__(name, marble_color)
+        self._time_budget = time_budget
+        self._max_depth = max_depth
+        self._table = table if table is not None else TranspositionTable(table_size)
+        self._tablebase = tablebase
+        self._search_info = None
+
+        # per-search state
+        self._game = None
+        self._deadline = None
+        self._nodes = 0
+
+    def get_search_info(self):
+        """
+        no parameters
+        :return: dictionary describing the last search (depth, value, nodes, seconds, nodes_per_second,
+        principal_variation), None if no search has been run
+        """
+        return self._search_info
+
+    def play(self, game):
+        """
+        chooses a move and makes it in game
+        :param game: KubaGame to play in
+        :return: MoveResult from make_move if a move was made, False if there was no legal move
+        """
+        move = self.choose_move(game)
+        if move is None:
+            return False
+        return game.make_move(self.get_playername(), move[0], move[1])
+
+    def choose_move(self, game):
+        """
+        searches game for the best move for this player, deepening one move at a time until the time budget runs out.
+        The game is searched in place with push_move/pop_move and is left as it was.
+        :param game: KubaGame in which it is this player's turn
+        :return: (coordinates, direction) tuple of the move to make, None if there is no legal move
+        """
+        playername = self.get_playername()
+        start = time.perf_counter()
+        self._game = game
+        self._deadline = start + self._time_budget
+        self._nodes = 0
+        self._table.new_search()
+
+        root_moves = self._order_moves(list(game.legal_moves(playername)), playername, None)
+        if not root_moves:
+            self._search_info = None
+            return None
+
+        best_move = root_moves[0]
+        best_value = None
+        depth_reached = 0
+        for depth in range(1, self._max_depth + 1):
+            try:
+                value, move = self._search_root(root_moves, playername, depth)
+            except SearchTimeout:
+                break
+            best_value, best_move, depth_reached = value, move, depth
+
+            # search the best move first on the next iteration
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(value) >= WIN_VALUE - self._max_depth:
+                break
+
+        elapsed = time.perf_counter() - start
+        self._search_info = {
+            'depth': depth_reached,
+            'value': best_value,
+            'nodes': self._nodes,
+            'seconds': elapsed,
+            'nodes_per_second': self._nodes / elapsed if elapsed > 0 else 0.0,
+            'principal_variation': self._principal_variation(best_move, playername, depth_reached),
+        }
+        self._game = None
+        return best_move
+
+    def _search_root(self, root_moves, playername, depth):
+        """
+        searches each move at the root of the tree to depth
+        :param root_moves: legal moves for playername, best first
+        :param playername: name of the player to move
+        :param depth: number of moves to search
+        :return: tuple of (value of best move, best move)
+        """
+        game = self._game
+        alpha = -WIN_VALUE - 1
+        best_move = root_moves[0]
+        for move in root_moves:
+            game.push_move(playername, move[0], move[1])
+            try:
+                value = -self._negamax(depth - 1, -WIN_VALUE - 1, -alpha, 1)
+            finally:
+                game.pop_move()
+            if value > alpha:
+                alpha, best_move = value, move
+
+        # the root is 0 moves from itself, so its value is stored as it is
+        self._table.store(game.get_hash(), depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def _negamax(self, depth, alpha, beta, ply):
+        """
+        alpha-beta search of the current position of the game being searched, from the point of view of the player
+        whose turn it is
+        :param depth: number of moves left to search
+        :param alpha: value the player to move is already guaranteed
+        :param beta: value above which the other player won't allow this position
+        :param ply: number of moves made since the root
+        :return: value of the position for the player to move
+        """
+        self._nodes += 1
+        if self._nodes & 255 == 0 and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+        game = self._game
+        playername = game.get_current_turn()
+
+        # the player who just moved won; prefer the quickest win and the slowest loss
+        if game.get_winner() is not None:
+            return ply - WIN_VALUE
+
+        # a tablebase value is exact, moves to the end of the game are counted from the root like other wins
+        if self._tablebase is not None:
+            value = self._tablebase.probe(game)
+            if value is not None:
+                if value > 0:
+                    return WIN_VALUE - ply - value
+                if value < 0:
+                    return ply - value - WIN_VALUE
+                return 0
+        if depth == 0:
+            return self.evaluate(game, playername)
+
+        key = game.get_hash()
+        entry = self._table.lookup(key)
+        table_move = None
+        if entry is not None:
+            table_move = entry.move
+            if entry.depth >= depth:
+                value = _value_from_table(entry.value, ply)
+                if entry.bound == EXACT:
+                    return value
+                if entry.bound == LOWER_BOUND and value >= beta:
+                    return value
+                if entry.bound == UPPER_BOUND and value <= alpha:
+                    return value
+
+        moves = self._order_moves(list(game.legal_moves(playername)), playername, table_move)
+        if not moves:
+            return self.evaluate(game, playername)
+
+        original_alpha = alpha
+        best_value = -WIN_VALUE - 1
+        best_move = None
+        for move in moves:
+            game.push_move(playername, move[0], move[1])
+            try:
+                value = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game.pop_move()
+
+            if value > best_value:
+                best_value, best_move = value, move
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self._table.store(key, depth, _value_to_table(best_value, ply), bound, best_move)
+        return best_value
+
+    def _order_moves(self, moves, playername, first_move):
+        """
+        sorts moves so alpha-beta cuts off sooner: the transposition table's best move, then moves that capture a red
+        marble, then moves that knock off an opponent marble, then the rest
+        :param moves: list of legal (coordinates, direction) moves
+        :param playername: name of the player making the moves
+        :param first_move: move to search first, or None
+        :return: sorted list of moves
+        """
+        game = self._game
+        marble_color = game.get_player_from_name(playername).get_marble_color()
+
+        def move_rank(move):
+            if move == first_move:
+                return 0
+            pushed_off = game.get_pushed_off_marble(move[0], move[1])
+            if pushed_off == 'R':
+                return 1
+            if pushed_off is not None and pushed_off != marble_color:
+                return 2
+            return 3
+
+        moves.sort(key=move_rank)
+        return moves
+
+    def _principal_variation(self, best_move, playername, depth):
+        """
+        follows best moves through the transposition table to find the line of play the search expects
+        :param best_move: best move found at the root
+        :param playername: name of the player to move at the root
+        :param depth: depth of the last completed search
+        :return: list of (coordinates, direction) moves
+        """
+        game = self._game
+        variation = []
+        move = best_move
+        mover = playername
+        while move is not None and len(variation) < max(depth, 1):
+            if not game.push_move(mover, move[0], move[1]):
+                break
+            variation.append(move)
+            if game.get_winner() is not None:
+                break
+            mover = game.get_current_turn()
+            entry = self._table.lookup(game.get_hash())
+            move = entry.move if entry is not None else None
+
+        for _ in variation:
+            game.pop_move()
+        return variation
+
+    @staticmethod
+    def evaluate(game, playername):
+        """
+        scores a position for playername from red marbles captured and marbles left on the board
+        :param game: KubaGame to score
+        :param playername: name of the player to score the position for
+        :return: score, positive when playername is ahead
+        """
+        player = game.get_player_from_name(playername)
+        first, second = game.get_playernames()
+        opponent = game.get_player_from_name(second if playername == first else first)
+
+        white_count, black_count, red_count = game.get_marble_count()
+        if player.get_marble_color() == 'W':
+            marble_lead = white_count - black_count
+        else:
+            marble_lead = black_count - white_count
+        return RED_WEIGHT * (player.get_red_count() - opponent.get_red_count()) + MARBLE_WEIGHT * marble_lead
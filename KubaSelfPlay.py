@@ -0,0 +1,301 @@
+# Description: Self-play runner for the Kuba game. Plays many games between move policies across a process pool and
+#              streams one result per game as soon as it finishes. Each game gets its own seed, so a run can be
+#              repeated exactly. Search policies can share a KubaCache evaluation cache file between workers and
+#              runs, in which case a game's moves also depend on what the cache already holds. Run this file to play
+#              games from the command line and write results as JSON lines.
+
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+from KubaGame import KubaGame
+from KubaBitboard import BitboardKubaGame
+from KubaCache import EvaluationCache
+from KubaMCTS import MCTSPlayer
+from KubaRecord import RecordWriter, encode_game
+from KubaSearch import AIPlayer
+
+ENGINES = {'list': KubaGame, 'bitboard': BitboardKubaGame}
+PLAYERS = (('White', 'W'), ('Black', 'B'))
+
+# depth of the search policy. It searches to a fixed depth instead of a time budget so results depend only on the seed.
+SEARCH_DEPTH = 2
+
+# playouts per move of the mcts policy, a playout budget instead of a time budget for the same reason
+MCTS_PLAYOUTS = 200
+
+# evaluation caches opened by this process, by path, so every game a worker plays shares one mapping
+_caches = {}
+
+
+def random_policy(playername, marble_color, rng):
+    """
+    move policy that plays a random legal move
+    :param playername: name of the player the policy moves for
+    :param marble_color: that player's marble color
+    :param rng: random.Random for this game
+    :return: function taking a KubaGame and returning a (coordinates, direction) move, or None if there is none
+    """
+    def choose(game):
+        moves = list(game.legal_moves(playername))
+        if not moves:
+            return None
+        return rng.choice(moves)
+    return choose
+
+
+def greedy_policy(playername, marble_color, rng):
+    """
+    move policy that plays the legal move with the best immediate evaluation, breaking ties at random
+    :param playername: name of the player the policy moves for
+    :param marble_color: that player's marble color
+    :param rng: random.Random for this game
+    :return: function taking a KubaGame and returning a (coordinates, direction) move, or None if there is none
+    """
+    def choose(game):
+        best_moves = []
+        best_value = None
+        for move in list(game.legal_moves(playername)):
+            game.push_move(playername, move[0], move[1])
+            if game.get_winner() is not None:
+                value = float('inf')
+            else:
+                value = AIPlayer.evaluate(game, playername)
+            game.pop_move()
+
+            if best_value is None or value > best_value:
+                best_moves, best_value = [move], value
+            elif value == best_value:
+                best_moves.append(move)
+
+        if not best_moves:
+            return None
+        return rng.choice(best_moves)
+    return choose
+
+
+def search_policy(playername, marble_color, rng, table=None):
+    """
+    move policy that plays the move chosen by a fixed-depth AIPlayer search
+    :param playername: name of the player the policy moves for
+    :param marble_color: that player's marble color
+    :param rng: random.Random for this game, unused because the search is deterministic
+    :param table: EvaluationCache to search with instead of a new transposition table
+    :return: function taking a KubaGame and returning a (coordinates, direction) move, or None if there is none
+    """
+    player = AIPlayer(playername, marble_color, time_budget=float('inf'), max_depth=SEARCH_DEPTH, table_size=1 << 14,
+                      table=table)
+    return player.choose_move
+
+
+def mcts_policy(playername, marble_color, rng):
+    """
+    move policy that plays the move chosen by an MCTSPlayer with a fixed playout budget
+    :param playername: name of the player the policy moves for
+    :param marble_color: that player's marble color
+    :param rng: random.Random for this game, seeds the playouts
+    :return: function taking a KubaGame and returning a (coordinates, direction) move, or None if there is none
+    """
+    player = MCTSPlayer(playername, marble_color, time_budget=None, playouts=MCTS_PLAYOUTS, seed=rng.getrandbits(32))
+    return player.choose_move
+
+
+POLICIES = {'random': random_policy, 'greedy': greedy_policy, 'search': search_policy, 'mcts': mcts_policy}
+
+
+def get_cache(path):
+    """
+    opens an evaluation cache once per process
+    :param path: path of the cache file, created if it doesn't exist
+    :return: EvaluationCache
+    """
+    if path not in _caches:
+        _caches[path] = EvaluationCache(path)
+    return _caches[path]
+
+
+def play_game(game_index, seed=0, policies=('random', 'random'), max_moves=1000, engine='list', record=False,
+              cache_path=None):
+    """
+    plays one game between two policies
+    :param game_index: number of the game in the run, added to seed to get this game's seed
+    :param seed: seed of the run
+    :param policies: tuple of two policy names from POLICIES, or policy functions, for the W and B players
+    :param max_moves: number of moves after which the game is stopped without a winner
+    :param engine: 'list' for KubaGame or 'bitboard' for BitboardKubaGame
+    :param record: also return the game's moves as a KubaRecord game record
+    :param cache_path: path of an evaluation cache file for the search policy to read and fill
+    :return: dictionary with the game's index, seed, winner, how the game ended, move count, red marbles captured
+    by each player and marbles left on the board, and the game record as bytes under 'record' if record is True
+    """
+    game_seed = seed + game_index
+    rng = random.Random(game_seed)
+    game = ENGINES[engine](PLAYERS[0], PLAYERS[1])
+
+    choosers = {}
+    for (playername, marble_color), policy in zip(PLAYERS, policies):
+        if not callable(policy):
+            policy = POLICIES[policy]
+        if policy is search_policy and cache_path is not None:
+            choosers[playername] = policy(playername, marble_color, rng, get_cache(cache_path))
+        else:
+            choosers[playername] = policy(playername, marble_color, rng)
+
+    # either player may make the first move
+    playername = rng.choice(PLAYERS)[0]
+    first_mover = 0 if playername == PLAYERS[0][0] else 1
+    played = []
+    moves = 0
+    end = 'move_limit'
+    while moves < max_moves:
+        move = choosers[playername](game)
+        if move is None:
+            end = 'no_moves'
+            break
+        game.make_move(playername, move[0], move[1])
+        if record:
+            played.append(move)
+        moves += 1
+        if game.get_winner() is not None:
+            end = 'red' if game.get_captured(game.get_winner()) == 7 else 'wipeout'
+            break
+        playername = game.get_current_turn()
+
+    result = {
+        'game': game_index,
+        'seed': game_seed,
+        'winner': game.get_winner(),
+        'end': end,
+        'moves': moves,
+        'captures': {name: game.get_captured(name) for name, _ in PLAYERS},
+        'marbles': dict(zip(('W', 'B', 'R'), game.get_marble_count())),
+    }
+    if record:
+        result['record'] = encode_game(PLAYERS[0], PLAYERS[1], first_mover, played)
+    return result
+
+
+def _play_game_task(args):
+    """
+    unpacks a play_game call for Pool.imap_unordered
+    :param args: tuple of play_game arguments
+    :return: play_game result
+    """
+    return play_game(*args)
+
+
+def run_selfplay(num_games, seed=0, policies=('random', 'random'), max_moves=1000, engine='list', processes=None,
+                 chunksize=4, record=False, cache_path=None):
+    """
+    plays num_games games across a process pool, yielding each result as soon as its game finishes. Results come back
+    in completion order; the 'game' field of each result gives its place in the run.
+    :param num_games: number of games to play
+    :param seed: seed of the run, game i is played with seed + i
+    :param policies: tuple of two policy names from POLICIES for the W and B players. Policy functions also work if
+    they are defined at module level so the pool can pickle them.
+    :param max_moves: number of moves after which a game is stopped without a winner
+    :param engine: 'list' for KubaGame or 'bitboard' for BitboardKubaGame
+    :param processes: number of worker processes, defaults to the number of CPUs. 1 plays in this process.
+    :param chunksize: number of games handed to a worker at a time
+    :param record: include each game's record, same as play_game parameter
+    :param cache_path: evaluation cache file shared by every worker, same as play_game parameter
+    :return: generator of play_game result dictionaries
+    """
+    tasks = ((game_index, seed, policies, max_moves, engine, record, cache_path) for game_index in range(num_games))
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if processes == 1:
+        for task in tasks:
+            yield _play_game_task(task)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(_play_game_task, tasks, chunksize):
+            yield result
+
+
+def summarize(results, seconds):
+    """
+    totals up a run of results
+    :param results: list of play_game result dictionaries
+    :param seconds: wall-clock time the run took
+    :return: dictionary with the number of games, wins per player, games without a winner, total moves,
+    games per second and moves per second
+    """
+    wins = {name: 0 for name, _ in PLAYERS}
+    no_winner = 0
+    total_moves = 0
+    for result in results:
+        if result['winner'] is None:
+            no_winner += 1
+        else:
+            wins[result['winner']] += 1
+        total_moves += result['moves']
+
+    return {
+        'games': len(results),
+        'wins': wins,
+        'no_winner': no_winner,
+        'moves': total_moves,
+        'seconds': seconds,
+        'games_per_second': len(results) / seconds if seconds > 0 else 0.0,
+        'moves_per_second': total_moves / seconds if seconds > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    """
+    command line entry point: plays games and writes one JSON line per game to stdout and a summary to stderr.
+    With --record, the games are also written to a KubaRecord archive.
+    :param argv: command line arguments, defaults to sys.argv
+    :return: no return value
+    """
+    parser = argparse.ArgumentParser(description="Play Kuba games between move policies.")
+    parser.add_argument('games', type=int, help="number of games to play")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--white', choices=sorted(POLICIES), default='random', help="policy of the W player")
+    parser.add_argument('--black', choices=sorted(POLICIES), default='random', help="policy of the B player")
+    parser.add_argument('--max-moves', type=int, default=1000)
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='list')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--record', metavar='PATH', help="write the games to a KubaRecord archive at PATH")
+    parser.add_argument('--cache', metavar='PATH',
+                        help="evaluation cache file for search policies, kept between runs")
+    args = parser.parse_args(argv)
+
+    if args.cache:
+        # entries from earlier runs are still used, but are evicted before this run's
+        get_cache(args.cache).new_generation()
+
+    writer = None
+    if args.record:
+        archive_file = open(args.record, 'wb')
+        writer = RecordWriter(archive_file)
+
+    results = []
+    start = time.perf_counter()
+    for result in run_selfplay(args.games, args.seed, (args.white, args.black), args.max_moves, args.engine,
+                               args.processes, record=writer is not None, cache_path=args.cache):
+        if writer is not None:
+            writer.write_record(result.pop('record'))
+        results.append(result)
+        print(json.dumps(result))
+    summary = summarize(results, time.perf_counter() - start)
+    print(json.dumps(summary), file=sys.stderr)
+
+    if writer is not None:
+        archive_file.close()
+    if args.cache:
+        cache = get_cache(args.cache)
+        # lookups were made by the workers, so only the size and fill of the shared file are reported here
+        print(json.dumps({'cache_generation': cache.get_generation(), 'cache_filled': len(cache),
+                          'cache_size': cache.get_size()}), file=sys.stderr)
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
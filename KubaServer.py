@@ -0,0 +1,664 @@
+# Description: Asyncio server hosting many Kuba games in one process. Clients talk to it over a local TCP or Unix
+#              socket with one JSON object per line. Every request carries an "op" and an optional "id" that is
+#              copied into its response; subscribers of a session are also sent an "update" line after every move.
+#              Moves are checked and made through KubaGame.make_move, so the rules are the same as everywhere else.
+#              The load command plays random games against a server and reports moves per second and latency.
+#
+#              Requests (responses have "ok" and either the fields below or "error"):
+#                {"op": "create", "players": [["A", "W"], ["B", "B"]]}        -> "session"
+#                {"op": "move", "session": 1, "player": "A", "coordinates": [6, 6], "direction": "F"}
+#                                                                              -> "result", "message", "state"
+#                {"op": "state", "session": 1}                                 -> "state"
+#                {"op": "legal_moves", "session": 1, "player": "A"}           -> "moves"
+#                {"op": "subscribe", "session": 1} / {"op": "unsubscribe", "session": 1}
+#                {"op": "close", "session": 1}
+#                {"op": "list"}                                                -> "sessions"
+#                {"op": "stats"}                                               -> "stats"
+#
+#              Usage: python KubaServer.py serve [--port 8765 | --unix PATH] [--stats-interval SECONDS]
+#                     python KubaServer.py load [--port 8765 | --unix PATH | --local] [--connections 50] [--games 20]
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from KubaGame import KubaGame, move_result_message
+from KubaStats import MoveStats, PeriodicDump
+
+DIRECTIONS = ('L', 'R', 'F', 'B')
+LISTEN_BACKLOG = 4096
+
+# bytes waiting to be written to a client above which its session updates are held back
+WRITE_HIGH_WATER = 64 * 1024
+
+
+class RequestError(Exception):
+    """
+    raised while handling a request that can't be carried out, its message is sent back as the response's error
+    """
+    pass
+
+
+class Session:
+    """
+    represents one game hosted by the server, and the connections subscribed to its updates
+    """
+
+    def __init__(self, session_id, player1, player2, engine=KubaGame, move_stats=None):
+        """
+        initializes Session instance
+        :param session_id: integer id of the session
+        :param player1: (name, marble color) tuple of the first player
+        :param player2: (name, marble color) tuple of the second player
+        :param engine: KubaGame or a subclass to play with
+        :param move_stats: MoveStats to record the game's moves in, or None
+        no return value
+        """
+        self._session_id = session_id
+        self._game = engine(player1, player2, move_stats=move_stats)
+        self._players = (tuple(player1), tuple(player2))
+        self._subscribers = set()
+        self._moves = 0
+
+    def get_session_id(self):
+        """
+        :return: id of the session
+        """
+        return self._session_id
+
+    def get_game(self):
+        """
+        :return: the session's game
+        """
+        return self._game
+
+    def get_subscribers(self):
+        """
+        :return: set of Connections subscribed to the session
+        """
+        return self._subscribers
+
+    def get_summary(self):
+        """
+        :return: dictionary with the session's id, players, number of moves and winner, for the list op
+        """
+        return {'session': self._session_id, 'players': self._players, 'moves': self._moves,
+                'winner': self._game.get_winner()}
+
+    def get_state(self):
+        """
+        :return: dictionary describing the game: board as one string per row, whose turn it is, winner, red marbles
+        captured by each player and marbles left on the board
+        """
+        game = self._game
+        return {
+            'session': self._session_id,
+            'board': [''.join(row) for row in game.get_board()],
+            'turn': game.get_current_turn(),
+            'winner': game.get_winner(),
+            'captured': {name: game.get_captured(name) for name, _ in self._players},
+            'marbles': dict(zip(('W', 'B', 'R'), game.get_marble_count())),
+            'moves': self._moves,
+        }
+
+    def check_player(self, playername):
+        """
+        :param playername: name sent by a client
+        :return: no return value, raises RequestError if no player of the session has that name
+        """
+        if playername not in (self._players[0][0], self._players[1][0]):
+            raise RequestError("no player named " + repr(playername) + " in this session")
+
+    def move(self, playername, coordinates, direction):
+        """
+        makes a move in the session's game
+        :param playername: name of player making move
+        :param coordinates: (row, column) tuple of the marble to push
+        :param direction: L, R, F or B
+        :return: MoveResult from make_move
+        """
+        self.check_player(playername)
+        if not isinstance(direction, str) or direction not in DIRECTIONS:
+            raise RequestError("direction must be one of L, R, F, B")
+        if not (0 <= coordinates[0] < 7 and 0 <= coordinates[1] < 7):
+            raise RequestError("coordinates must be on the board")
+
+        result = self._game.make_move(playername, coordinates, direction)
+        if result:
+            self._moves += 1
+        return result
+
+
+class Connection:
+    """
+    represents one client connection. Responses are written without waiting, and the handler waits for the buffer to
+    drain after each request, so a client that stops reading slows down only its own requests. Session updates are
+    pushed to subscribers whether or not they send requests, so once more than the high-water mark of bytes is
+    waiting to be written to a client, its updates are held back instead, keeping only the latest line for each
+    session. The held lines are written when the buffer has drained, so a subscriber that stops reading costs at
+    most one line per session it subscribes to.
+    """
+
+    def __init__(self, writer, high_water=WRITE_HIGH_WATER):
+        """
+        initializes Connection instance
+        :param writer: asyncio.StreamWriter of the connection
+        :param high_water: bytes waiting to be written above which updates are held back
+        no return value
+        """
+        self._writer = writer
+        self._subscriptions = set()
+        self._high_water = high_water
+        # drain waits until the buffer is back under a quarter of the high-water mark
+        writer.transport.set_write_buffer_limits(high=high_water)
+        self._held_updates = {}
+        self._flush_task = None
+
+    def get_subscriptions(self):
+        """
+        :return: set of Sessions the connection is subscribed to
+        """
+        return self._subscriptions
+
+    def send(self, message):
+        """
+        queues one JSON line to the client. Held updates are written first, so lines arrive in the order they were
+        sent.
+        :param message: dictionary to send
+        :return: no return value
+        """
+        if self._writer.is_closing():
+            return
+        if self._held_updates:
+            self._write_held_updates()
+        self._write(message)
+
+    def send_update(self, session_id, message):
+        """
+        queues one line about a session to the client, or holds it back in place of any earlier held line about the
+        same session if the client isn't keeping up
+        :param session_id: id of the session the line is about
+        :param message: dictionary to send
+        :return: no return value
+        """
+        if self._writer.is_closing():
+            return
+        if self._held_updates or self._writer.transport.get_write_buffer_size() > self._high_water:
+            self._held_updates[session_id] = message
+            if self._flush_task is None:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush_held_updates())
+            return
+        self._write(message)
+
+    async def drain(self):
+        """
+        waits until the queued lines have been handed to the socket
+        no parameters
+        :return: no return value
+        """
+        await self._writer.drain()
+
+    def close(self):
+        """
+        drops any held updates and closes the connection
+        no parameters
+        :return: no return value
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._held_updates.clear()
+        self._writer.close()
+
+    def _write(self, message):
+        """
+        writes one JSON line to the transport
+        :param message: dictionary to send
+        :return: no return value
+        """
+        self._writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    def _write_held_updates(self):
+        """
+        writes the held updates, oldest session first
+        no parameters
+        :return: no return value
+        """
+        held = self._held_updates
+        self._held_updates = {}
+        for message in held.values():
+            self._write(message)
+
+    async def _flush_held_updates(self):
+        """
+        waits for the client to read enough of its buffer, then writes the held updates
+        no parameters
+        :return: no return value
+        """
+        try:
+            await self._writer.drain()
+        except ConnectionError:
+            # the handler closes the connection when it notices
+            self._held_updates.clear()
+        else:
+            if not self._writer.is_closing() and self._held_updates:
+                self._write_held_updates()
+        finally:
+            self._flush_task = None
+
+
+class KubaServer:
+    """
+    Represents the server: the sessions it hosts and the request handlers. Sessions live until a client closes them,
+    independently of the connection that created them, so players can reconnect or play from different connections.
+    """
+
+    def __init__(self, engine=KubaGame, max_sessions=100000, move_stats=None, write_high_water=WRITE_HIGH_WATER):
+        """
+        initializes KubaServer instance
+        :param engine: KubaGame or a subclass that sessions play with
+        :param max_sessions: number of sessions the server hosts before refusing to create more
+        :param move_stats: MoveStats shared by every session's game, None to leave moves uninstrumented
+        :param write_high_water: bytes waiting to be written to a client above which its updates are held back
+        no return value
+        """
+        self._engine = engine
+        self._write_high_water = write_high_water
+        self._move_stats = move_stats
+        self._max_sessions = max_sessions
+        self._sessions = {}
+        self._next_session_id = 1
+        self._connections = 0
+        self._requests = 0
+        self._moves = 0
+
+    def get_stats(self):
+        """
+        :return: dictionary with the number of sessions, open connections, requests handled and moves made, and a
+        MoveStats snapshot under 'move_stats' if moves are instrumented
+        """
+        stats = {'sessions': len(self._sessions), 'connections': self._connections, 'requests': self._requests,
+                 'moves': self._moves}
+        if self._move_stats is not None:
+            stats['move_stats'] = self._move_stats.snapshot()
+        return stats
+
+    async def start(self, host='127.0.0.1', port=8765, unix_path=None):
+        """
+        starts listening for clients
+        :param host: address to listen on
+        :param port: TCP port to listen on, 0 picks a free port
+        :param unix_path: path of a Unix socket to listen on instead of TCP
+        :return: asyncio.Server
+        """
+        # a lobby can have many clients connecting at once, more than asyncio's default backlog of 100
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, unix_path, backlog=LISTEN_BACKLOG)
+        return await asyncio.start_server(self.handle_connection, host, port, backlog=LISTEN_BACKLOG)
+
+    async def handle_connection(self, reader, writer):
+        """
+        serves one client until it disconnects
+        :param reader: asyncio.StreamReader of the connection
+        :param writer: asyncio.StreamWriter of the connection
+        :return: no return value
+        """
+        connection = Connection(writer, self._write_high_water)
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # the rest of an over-long line can't be told apart from the next request, so give up on the client
+                    connection.send({'ok': False, 'error': "request line is too long"})
+                    await connection.drain()
+                    break
+                if not line:
+                    break
+                connection.send(self.handle_line(line, connection))
+                await connection.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._connections -= 1
+            for session in connection.get_subscriptions():
+                session.get_subscribers().discard(connection)
+            connection.close()
+
+    def handle_line(self, line, connection):
+        """
+        parses and handles one request line
+        :param line: bytes of the line
+        :param connection: Connection the line came from
+        :return: response dictionary
+        """
+        self._requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+        except ValueError:
+            return {'ok': False, 'error': "request isn't valid JSON"}
+        except RequestError as error:
+            return {'ok': False, 'error': str(error)}
+
+        response = {'ok': True}
+        if 'id' in request:
+            response['id'] = request['id']
+        handler = getattr(self, '_op_' + str(request.get('op')), None)
+        try:
+            if handler is None:
+                raise RequestError("unknown op " + repr(request.get('op')))
+            response.update(handler(request, connection))
+        except RequestError as error:
+            response['ok'] = False
+            response['error'] = str(error)
+        except Exception as error:
+            # a bad request must not take the connection down with it
+            response['ok'] = False
+            response['error'] = "internal error: " + type(error).__name__ + ": " + str(error)
+        return response
+
+    def _get_session(self, request):
+        """
+        :param request: request dictionary with a "session" id
+        :return: Session the request names
+        """
+        session_id = request.get('session')
+        # bool is an int subclass, but True isn't a session id
+        if not isinstance(session_id, int) or isinstance(session_id, bool):
+            raise RequestError("session must be an integer id")
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise RequestError("no session " + repr(request.get('session')))
+        return session
+
+    def _op_create(self, request, connection):
+        """
+        creates a session, and subscribes the connection to it if "subscribe" is true
+        """
+        if len(self._sessions) >= self._max_sessions:
+            raise RequestError("server is full")
+        try:
+            (name1, color1), (name2, color2) = request['players']
+        except (KeyError, TypeError, ValueError):
+            raise RequestError("players must be two [name, color] pairs")
+        if not all(isinstance(value, str) for value in (name1, color1, name2, color2)):
+            raise RequestError("player names and colors must be strings")
+        if name1 == name2 or sorted((color1, color2)) != ['B', 'W']:
+            raise RequestError("players need different names and the colors W and B")
+
+        session = Session(self._next_session_id, (name1, color1), (name2, color2), self._engine, self._move_stats)
+        self._sessions[session.get_session_id()] = session
+        self._next_session_id += 1
+        if request.get('subscribe'):
+            self._op_subscribe({'session': session.get_session_id()}, connection)
+        return {'session': session.get_session_id()}
+
+    def _op_move(self, request, connection):
+        """
+        makes a move and sends the new state to the session's subscribers
+        """
+        session = self._get_session(request)
+        coordinates = request.get('coordinates')
+        # like session ids, coordinates must be JSON integers, not strings, floats or booleans
+        if (not isinstance(coordinates, list) or len(coordinates) != 2
+                or not all(isinstance(value, int) and not isinstance(value, bool) for value in coordinates)):
+            raise RequestError("coordinates must be [row, column]")
+        coordinates = tuple(coordinates)
+        direction = request.get('direction')
+
+        result = session.move(request.get('player'), coordinates, direction)
+        state = session.get_state()
+        if result:
+            self._moves += 1
+            update = {'event': 'update', 'state': state}
+            for subscriber in session.get_subscribers():
+                if subscriber is not connection:
+                    subscriber.send_update(session.get_session_id(), update)
+        return {'result': result.name, 'message': move_result_message(result, direction), 'state': state}
+
+    def _op_state(self, request, connection):
+        """
+        gets a session's state
+        """
+        return {'state': self._get_session(request).get_state()}
+
+    def _op_legal_moves(self, request, connection):
+        """
+        lists the moves a player can make in a session
+        """
+        session = self._get_session(request)
+        session.check_player(request.get('player'))
+        game = session.get_game()
+        return {'moves': [[list(coordinates), direction]
+                          for coordinates, direction in game.legal_moves(request.get('player'))]}
+
+    def _op_subscribe(self, request, connection):
+        """
+        subscribes the connection to a session's updates
+        """
+        session = self._get_session(request)
+        session.get_subscribers().add(connection)
+        connection.get_subscriptions().add(session)
+        return {'state': session.get_state()}
+
+    def _op_unsubscribe(self, request, connection):
+        """
+        stops sending a session's updates to the connection
+        """
+        session = self._get_session(request)
+        session.get_subscribers().discard(connection)
+        connection.get_subscriptions().discard(session)
+        return {}
+
+    def _op_close(self, request, connection):
+        """
+        removes a session from the server
+        """
+        session = self._get_session(request)
+        session_id = session.get_session_id()
+        del self._sessions[session_id]
+        for subscriber in session.get_subscribers():
+            subscriber.get_subscriptions().discard(session)
+            if subscriber is not connection:
+                # replaces any update held back for the session, which is no longer worth sending
+                subscriber.send_update(session_id, {'event': 'closed', 'session': session_id})
+        return {}
+
+    def _op_list(self, request, connection):
+        """
+        lists the hosted sessions
+        """
+        return {'sessions': [session.get_summary() for session in self._sessions.values()]}
+
+    def _op_stats(self, request, connection):
+        """
+        gets the server's counters
+        """
+        return {'stats': self.get_stats()}
+
+
+async def _request(reader, writer, request):
+    """
+    sends one request and waits for its response, skipping pushed update lines
+    :param reader: asyncio.StreamReader of the connection
+    :param writer: asyncio.StreamWriter of the connection
+    :param request: request dictionary, its "id" is used to match the response
+    :return: response dictionary
+    """
+    writer.write(json.dumps(request, separators=(',', ':')).encode() + b'\n')
+    while True:
+        message = json.loads(await reader.readline())
+        if message.get('id') == request.get('id'):
+            return message
+
+
+async def _load_connection(connect, connection_index, games, max_moves, seed, latencies):
+    """
+    plays games over one connection, choosing random legal moves from a local copy of each game
+    :param connect: coroutine function returning a (reader, writer) pair
+    :param connection_index: number of the connection, used for its seed and player names
+    :param games: number of games to play
+    :param max_moves: number of moves after which a game is abandoned
+    :param seed: seed of the run
+    :param latencies: list that the round-trip time of each move request is appended to, in seconds
+    :return: number of moves made
+    """
+    rng = random.Random(seed + connection_index)
+    reader, writer = await connect()
+    players = (('W' + str(connection_index), 'W'), ('B' + str(connection_index), 'B'))
+    request_id = 0
+    moves = 0
+    try:
+        for _ in range(games):
+            request_id += 1
+            response = await _request(reader, writer, {'id': request_id, 'op': 'create', 'players': players})
+            session_id = response['session']
+            local_game = KubaGame(players[0], players[1])
+            playername = rng.choice(players)[0]
+
+            for _ in range(max_moves):
+                legal = list(local_game.legal_moves(playername))
+                if not legal:
+                    break
+                coordinates, direction = rng.choice(legal)
+                local_game.make_move(playername, coordinates, direction)
+
+                request_id += 1
+                start = time.perf_counter()
+                response = await _request(reader, writer, {'id': request_id, 'op': 'move', 'session': session_id,
+                                                           'player': playername, 'coordinates': coordinates,
+                                                           'direction': direction})
+                latencies.append(time.perf_counter() - start)
+                if response.get('result') != 'OK':
+                    raise RuntimeError("server rejected a legal move: " + str(response))
+                moves += 1
+                if local_game.get_winner() is not None:
+                    break
+                playername = local_game.get_current_turn()
+
+            request_id += 1
+            await _request(reader, writer, {'id': request_id, 'op': 'close', 'session': session_id})
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return moves
+
+
+async def run_load(connect, connections=50, games=20, max_moves=300, seed=0):
+    """
+    plays random games against a server from many connections at once
+    :param connect: coroutine function returning a (reader, writer) pair connected to the server
+    :param connections: number of concurrent connections
+    :param games: number of games each connection plays, one after another
+    :param max_moves: number of moves after which a game is abandoned
+    :param seed: seed of the run
+    :return: dictionary with moves made, seconds taken, moves per second and move latency percentiles in
+    milliseconds
+    """
+    latencies = []
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(_load_connection(connect, index, games, max_moves, seed, latencies)
+                                    for index in range(connections)))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(fraction):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    return {
+        'connections': connections,
+        'games': connections * games,
+        'moves': sum(counts),
+        'seconds': seconds,
+        'moves_per_second': sum(counts) / seconds if seconds > 0 else 0.0,
+        'latency_ms': {'p50': percentile(0.5), 'p90': percentile(0.9), 'p99': percentile(0.99),
+                       'max': percentile(1.0)},
+    }
+
+
+async def _serve(args):
+    """
+    runs the server until it is interrupted
+    """
+    move_stats = None
+    dumper = None
+    if args.stats_interval:
+        move_stats = MoveStats()
+        dumper = PeriodicDump(move_stats, args.stats_interval).start()
+
+    server = await KubaServer(move_stats=move_stats).start(args.host, args.port, args.unix)
+    for sock in server.sockets:
+        print("listening on", sock.getsockname(), file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if dumper is not None:
+            dumper.stop()
+
+
+async def _load(args):
+    """
+    runs the load generator against a server, or against one started in this process with --local
+    """
+    server = None
+    host, port = args.host, args.port
+    if args.local:
+        server = await KubaServer().start(args.host, 0, args.unix)
+        if args.unix is None:
+            port = server.sockets[0].getsockname()[1]
+
+    if args.unix:
+        def connect():
+            return asyncio.open_unix_connection(args.unix)
+    else:
+        def connect():
+            return asyncio.open_connection(host, port)
+
+    report = await run_load(connect, args.connections, args.games, args.max_moves, args.seed)
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+    print(json.dumps(report))
+
+
+def main(argv=None):
+    """
+    command line entry point
+    :param argv: command line arguments, defaults to sys.argv
+    :return: no return value
+    """
+    parser = argparse.ArgumentParser(description="Host Kuba games over a local socket, or load test a server.")
+    parser.add_argument('command', choices=('serve', 'load'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="use a Unix socket at PATH instead of TCP")
+    parser.add_argument('--stats-interval', type=float, metavar='SECONDS',
+                        help="serve: instrument moves and dump their stats to stderr every SECONDS")
+    parser.add_argument('--local', action='store_true', help="load: start a server in this process to test against")
+    parser.add_argument('--connections', type=int, default=50, help="load: number of concurrent connections")
+    parser.add_argument('--games', type=int, default=20, help="load: games played by each connection")
+    parser.add_argument('--max-moves', type=int, default=300, help="load: moves after which a game is abandoned")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(_load(args))
+
+
+if __name__ == "__main__":
+    main()
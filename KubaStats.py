@@ -0,0 +1,168 @@
+# Description: Opt-in instrumentation of KubaGame moves. A MoveStats passed to KubaGame (or set with set_move_stats)
+#              times each phase of every move and counts moves accepted, moves rejected by reason, push chain lengths
+#              and marbles knocked off by color. Games without one take the uninstrumented path, which costs a single
+#              attribute check per move. snapshot() returns the numbers as a dictionary and PeriodicDump writes
+#              them as JSON lines on a background thread.
+
+import json
+import sys
+import threading
+import time
+
+# phases of an accepted move, in the order they run: checking the rules (including Ko), pushing the line, updating
+# the marble counters and checking for a winner, and updating Ko state, accessible pushes and turn
+MOVE_PHASES = ('validate', 'push', 'capture', 'end_move')
+
+
+class MoveStats:
+    """
+    Represents counters and timers for the moves of one or more games. Recording and snapshots are guarded by a lock
+    so a PeriodicDump thread can read while games are being played.
+    """
+
+    def __init__(self):
+        """
+        initializes MoveStats instance with every counter at zero
+        no parameters
+        no return value
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        sets every counter and timer back to zero
+        no parameters
+        :return: no return value
+        """
+        with self._lock:
+            self._accepted = 0
+            self._rejected = {}
+            self._directions = dict.fromkeys('LRFB', 0)
+            self._chain_lengths = [0] * 8
+            self._knocked_off = dict.fromkeys('WBR', 0)
+            self._phase_seconds = dict.fromkeys(MOVE_PHASES, 0.0)
+            self._rejection_seconds = 0.0
+            self._started = time.time()
+
+    def record_move(self, direction, chain_length, fallen_marble, phase_seconds):
+        """
+        called by KubaGame after an accepted move
+        :param direction: direction of the move
+        :param chain_length: number of marbles the move pushed
+        :param fallen_marble: color of the marble pushed off the board, or None
+        :param phase_seconds: tuple of seconds spent in each of MOVE_PHASES
+        :return: no return value
+        """
+        with self._lock:
+            self._accepted += 1
+            self._directions[direction] += 1
+            self._chain_lengths[chain_length] += 1
+            if fallen_marble is not None:
+                self._knocked_off[fallen_marble] += 1
+            totals = self._phase_seconds
+            for phase, seconds in zip(MOVE_PHASES, phase_seconds):
+                totals[phase] += seconds
+
+    def record_rejection(self, result, seconds):
+        """
+        called by KubaGame after a move is rejected
+        :param result: MoveResult saying why
+        :param seconds: seconds spent checking the move
+        :return: no return value
+        """
+        with self._lock:
+            self._rejected[result.name] = self._rejected.get(result.name, 0) + 1
+            self._rejection_seconds += seconds
+
+    def snapshot(self):
+        """
+        no parameters
+        :return: dictionary with moves accepted, moves rejected by reason, accepted moves by direction, push chain
+        lengths, marbles knocked off by color, and total and mean microseconds per move in each phase
+        """
+        with self._lock:
+            accepted = self._accepted
+            rejected = sum(self._rejected.values())
+            phases = {}
+            for phase, seconds in self._phase_seconds.items():
+                phases[phase] = {'seconds': seconds, 'mean_us': seconds / accepted * 1e6 if accepted else 0.0}
+            phases['rejection'] = {'seconds': self._rejection_seconds,
+                                   'mean_us': self._rejection_seconds / rejected * 1e6 if rejected else 0.0}
+            return {
+                'since': self._started,
+                'accepted': accepted,
+                'rejected': dict(self._rejected),
+                'directions': dict(self._directions),
+                'chain_lengths': {length: count for length, count in enumerate(self._chain_lengths) if count},
+                'knocked_off': dict(self._knocked_off),
+                'phases': phases,
+            }
+
+    def dump(self, stream=None):
+        """
+        writes a snapshot as one JSON line
+        :param stream: text stream to write to, defaults to sys.stderr
+        :return: no return value
+        """
+        snapshot = self.snapshot()
+        snapshot['time'] = time.time()
+        stream = stream if stream is not None else sys.stderr
+        stream.write(json.dumps(snapshot) + '\n')
+        stream.flush()
+
+
+class PeriodicDump:
+    """
+    Represents a daemon thread that dumps a MoveStats every interval seconds until stopped
+    """
+
+    def __init__(self, move_stats, interval=10.0, stream=None, reset=False):
+        """
+        initializes PeriodicDump instance. The thread starts when start is called.
+        :param move_stats: MoveStats to dump
+        :param interval: seconds between dumps
+        :param stream: text stream to write to, defaults to sys.stderr
+        :param reset: reset the counters after each dump, so each line covers one interval
+        no return value
+        """
+        self._move_stats = move_stats
+        self._interval = interval
+        self._stream = stream
+        self._reset = reset
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='KubaStatsDump', daemon=True)
+
+    def start(self):
+        """
+        starts dumping
+        no parameters
+        :return: self, so it can be created and started in one line
+        """
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        stops the thread after writing one last dump
+        no parameters
+        :return: no return value
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        """
+        body of the thread
+        """
+        while not self._stopped.wait(self._interval):
+            self._dump()
+        self._dump()
+
+    def _dump(self):
+        """
+        writes one dump, resetting the counters if asked to
+        """
+        self._move_stats.dump(self._stream)
+        if self._reset:
+            self._move_stats.reset()
@@ -0,0 +1,246 @@
+# Description: Symmetry of Kuba positions. The 7x7 board has 8 dihedral symmetries (rotations and reflections),
+#              and swapping the W and B colors gives 16 transforms in all. The starting layout is unchanged by
+#              several of them, and equivalent positions play out the same way, so caches, opening books and
+#              evaluation tables keyed on canonical_key store one entry per class of equivalent positions instead
+#              of up to 16. Transforms are numbered 0-15: transform % 8 picks the dihedral transform and
+#              transform >= 8 means the colors are swapped. Moves found in the canonical position are mapped back
+#              to the real one with untransform_move.
+
+import copy
+
+from KubaGame import (Player, BEHIND_OFFSETS, SLOT_COORDINATES, ZOBRIST_MARBLES, ZOBRIST_TURN, ZOBRIST_CAPTURES,
+                      ZOBRIST_KO)
+
+# the 8 dihedral transforms of a slot (row, column), with 6 being the far edge
+_DIHEDRAL = (
+    lambda row, col: (row, col),
+    lambda row, col: (col, 6 - row),
+    lambda row, col: (6 - row, 6 - col),
+    lambda row, col: (6 - col, row),
+    lambda row, col: (row, 6 - col),
+    lambda row, col: (6 - row, col),
+    lambda row, col: (col, row),
+    lambda row, col: (6 - col, 6 - row),
+)
+
+# (row, column) step a marble takes when pushed in each direction
+DIRECTION_STEPS = {direction: (-row_offset, -col_offset)
+                   for direction, (row_offset, col_offset) in BEHIND_OFFSETS.items()}
+
+TRANSFORM_COUNT = 16
+SWAPPED_COLORS = {'W': 'B', 'B': 'W', 'R': 'R', 'X': 'X'}
+IDENTITY_COLORS = {'W': 'W', 'B': 'B', 'R': 'R', 'X': 'X'}
+
+
+def _build_tables():
+    """
+    builds the slot permutation, direction map and color map of every transform, and the inverse of each transform
+    :return: tuple of (slot maps, direction maps, color maps, inverses), each a list indexed by transform
+    """
+    slot_maps = []
+    direction_maps = []
+    color_maps = []
+    for transform in range(TRANSFORM_COUNT):
+        dihedral = _DIHEDRAL[transform % 8]
+        slot_maps.append([dihedral(row, col)[0] * 7 + dihedral(row, col)[1] for row, col in SLOT_COORDINATES])
+
+        # a direction maps to the direction between the transformed center slot and its transformed neighbour
+        center = dihedral(3, 3)
+        direction_map = {}
+        for direction, (row_step, col_step) in DIRECTION_STEPS.items():
+            neighbour = dihedral(3 + row_step, 3 + col_step)
+            step = (neighbour[0] - center[0], neighbour[1] - center[1])
+            direction_map[direction] = next(name for name, other in DIRECTION_STEPS.items() if other == step)
+        direction_maps.append(direction_map)
+        color_maps.append(SWAPPED_COLORS if transform >= 8 else IDENTITY_COLORS)
+
+    inverses = []
+    for transform in range(TRANSFORM_COUNT):
+        for other in range(TRANSFORM_COUNT):
+            if (all(slot_maps[other][slot_maps[transform][slot]] == slot for slot in range(49))
+                    and (transform >= 8) == (other >= 8)):
+                inverses.append(other)
+                break
+    return slot_maps, direction_maps, color_maps, inverses
+
+
+SLOT_MAPS, DIRECTION_MAPS, COLOR_MAPS, INVERSES = _build_tables()
+
+# Zobrist key of marble at slot after each transform, so a transformed board hashes without building the board
+_TRANSFORMED_KEYS = [{marble: [ZOBRIST_MARBLES[COLOR_MAPS[transform][marble]][SLOT_MAPS[transform][slot]]
+                               for slot in range(49)]
+                      for marble in ('W', 'B', 'R')}
+                     for transform in range(TRANSFORM_COUNT)]
+
+
+def inverse_transform(transform):
+    """
+    :param transform: transform number, 0-15
+    :return: the transform that undoes it
+    """
+    return INVERSES[transform]
+
+
+def transform_slot(coordinates, transform):
+    """
+    :param coordinates: (row, column) of a slot
+    :param transform: transform number, 0-15
+    :return: (row, column) of the slot after the transform
+    """
+    return SLOT_COORDINATES[SLOT_MAPS[transform][coordinates[0] * 7 + coordinates[1]]]
+
+
+def transform_direction(direction, transform):
+    """
+    :param direction: L, R, F or B
+    :param transform: transform number, 0-15
+    :return: the direction after the transform
+    """
+    return DIRECTION_MAPS[transform][direction]
+
+
+def transform_color(marble_color, transform):
+    """
+    :param marble_color: W, B, R or X
+    :param transform: transform number, 0-15
+    :return: the color after the transform, W and B are swapped by transforms 8-15
+    """
+    return COLOR_MAPS[transform][marble_color]
+
+
+def transform_move(move, transform):
+    """
+    maps a move in a position to the same move in the transformed position
+    :param move: (coordinates, direction) tuple
+    :param transform: transform number, 0-15
+    :return: (coordinates, direction) tuple of the transformed move. With transforms 8-15 it is made by the player
+    of the other color.
+    """
+    return transform_slot(move[0], transform), transform_direction(move[1], transform)
+
+
+def untransform_move(move, transform):
+    """
+    maps a move in a transformed position, such as the canonical position, back to the original position
+    :param move: (coordinates, direction) tuple in the transformed position
+    :param transform: transform that was applied, for example the one returned by canonical_key
+    :return: (coordinates, direction) tuple in the original position
+    """
+    return transform_move(move, INVERSES[transform])
+
+
+def _color_state(game):
+    """
+    gets the parts of a game's state that transforms act on, with players identified by color instead of name
+    :param game: KubaGame
+    :return: tuple of (list of (slot, marble) for occupied slots, color of the player to move or None,
+    dictionary of red marbles captured by color, Ko slot index or None, Ko direction or None)
+    """
+    marbles = [(slot, marble) for slot, marble in enumerate(m for row in game.get_board() for m in row)
+               if marble != 'X']
+    captured = {}
+    turn_color = None
+    for playername in game.get_playernames():
+        player = game.get_player_from_name(playername)
+        captured[player.get_marble_color()] = player.get_red_count()
+        if playername == game.get_current_turn():
+            turn_color = player.get_marble_color()
+
+    ko_slot = None
+    ko_direction = None
+    if game._last_slot_moved is not None:
+        ko_slot = game._last_slot_moved[0] * 7 + game._last_slot_moved[1]
+        ko_direction = game._prev_direction
+    return marbles, turn_color, captured, ko_slot, ko_direction
+
+
+def _transformed_key(state, transform):
+    """
+    hashes a color state after a transform. Like KubaGame.get_hash, but turn and captures are keyed by color so the
+    key doesn't depend on player names or order.
+    :param state: tuple from _color_state
+    :param transform: transform number, 0-15
+    :return: 64-bit integer key
+    """
+    marbles, turn_color, captured, ko_slot, ko_direction = state
+    colors = COLOR_MAPS[transform]
+    marble_keys = _TRANSFORMED_KEYS[transform]
+
+    key = 0
+    for slot, marble in marbles:
+        key ^= marble_keys[marble][slot]
+    if turn_color is not None:
+        key ^= ZOBRIST_TURN[0 if colors[turn_color] == 'W' else 1]
+    key ^= ZOBRIST_CAPTURES[0][captured[colors['W']]]
+    key ^= ZOBRIST_CAPTURES[1][captured[colors['B']]]
+    if ko_slot is not None:
+        key ^= ZOBRIST_KO[DIRECTION_MAPS[transform][ko_direction]][SLOT_MAPS[transform][ko_slot]]
+    return key
+
+
+def position_key(game, transform=0):
+    """
+    hashes a game's position, optionally after a transform, keying whose turn it is and red marbles captured by
+    color so that games with different player names hash the same
+    :param game: KubaGame
+    :param transform: transform number, 0-15
+    :return: 64-bit integer key
+    """
+    return _transformed_key(_color_state(game), transform)
+
+
+def canonical_key(game):
+    """
+    finds the canonical key of a game's position: the smallest position_key over all 16 transforms. Equivalent
+    positions have the same canonical key.
+    :param game: KubaGame
+    :return: tuple of (canonical key, transform that maps the game's position to the canonical position). When
+    several transforms give the canonical key, the position is symmetric under them and the lowest is returned.
+    """
+    state = _color_state(game)
+    best_key = None
+    best_transform = 0
+    for transform in range(TRANSFORM_COUNT):
+        key = _transformed_key(state, transform)
+        if best_key is None or key < best_key:
+            best_key, best_transform = key, transform
+    return best_key, best_transform
+
+
+def transformed_game(game, transform):
+    """
+    makes a copy of a game with a transform applied: marbles and Ko state are moved and the colors swapped if the
+    transform swaps them. Players keep their names and red marble counts, and with a color swap each plays the other
+    color. The copy has no moves to pop.
+    :param game: KubaGame or a subclass
+    :param transform: transform number, 0-15
+    :return: new game of the same class
+    """
+    new_game = copy.deepcopy(game)
+    slot_map = SLOT_MAPS[transform]
+    colors = COLOR_MAPS[transform]
+
+    board = [['X'] * 7 for _ in range(7)]
+    for slot, marble in enumerate(m for row in game.get_board() for m in row):
+        row, col = SLOT_COORDINATES[slot_map[slot]]
+        board[row][col] = colors[marble]
+    new_game._board = board
+    new_game._board_hash = new_game._scan_board_hash()
+    new_game._marble_counts = dict(zip(('W', 'B', 'R'), new_game._scan_marble_count()))
+
+    players = []
+    for player in game._players:
+        new_player = Player(player.get_playername(), colors[player.get_marble_color()])
+        for _ in range(player.get_red_count()):
+            new_player.inc_red_count()
+        players.append(new_player)
+    new_game._players = players
+
+    if game._last_slot_moved is not None:
+        new_game._last_slot_moved = transform_slot(game._last_slot_moved, transform)
+        new_game._prev_direction = transform_direction(game._prev_direction, transform)
+
+    new_game._accessible = {direction: set() for direction in new_game._accessible}
+    new_game._update_accessibility(SLOT_COORDINATES)
+    new_game._undo_stack = []
+    return new_game
@@ -0,0 +1,479 @@
+# Description: Endgame tablebase for Kuba positions with few marbles left. generate enumerates every position with up
+#              to max_marbles marbles on the board, solves them by retrograde analysis and writes one signed 16-bit
+#              value per position to a file: n > 0 means the player to move wins in n moves (counting both players'
+#              moves), -n that they lose in n moves, 0 that neither player can force a win. Wins follow make_move:
+#              capturing a 7th red marble or knocking off the other player's last marble. A player with no legal move
+#              doesn't lose, the game just can't go on, so those positions are draws.
+#              Positions are stored from the point of view of the player to move, as if they played W, so the turn
+#              isn't part of the index. Red marbles captured are stored as the number each player still needs, with
+#              every need above the reds left on the board counted as one value, and the Ko rule only when it blocks
+#              a move that would otherwise be legal. Each position then has one dense index computed from the
+#              combination of occupied slots and their colors, and Tablebase.probe looks a game up in O(1) through a
+#              memory-mapped file.
+#              Usage: python KubaTablebase.py PATH [--max-marbles N]
+
+import argparse
+import itertools
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+from math import comb
+
+from KubaGame import RAYS, BEHIND_SLOTS, OPPOSITE_DIRECTIONS
+
+TABLEBASE_MAGIC = b'KUBATB01'
+
+# magic, max marbles, number of entries
+TABLEBASE_HEADER = struct.Struct('<8sII')
+HEADER_SIZE = 16
+VALUE = struct.Struct('<h')
+
+DEFAULT_MAX_MARBLES = 3
+
+# value of index entries that aren't positions: Ko states that block nothing are stored as no Ko
+NOT_A_POSITION = -32768
+
+DIRECTIONS = ('L', 'R', 'F', 'B')
+SWAPPED_COLORS = {'W': 'B', 'B': 'W', 'R': 'R', 'X': 'X'}
+RED_MARBLES_TO_WIN = 7
+
+
+class MaterialClass:
+    """
+    Represents the positions with the same number of marbles of each color: the player to move's (W), the other
+    player's (B) and red. Its part of the index is laid out as occupied slots, then their colors, then red marbles
+    needed, then Ko.
+    """
+
+    def __init__(self, mover_count, opponent_count, red_count, offset):
+        """
+        initializes MaterialClass instance
+        :param mover_count: marbles of the player to move
+        :param opponent_count: marbles of the other player
+        :param red_count: red marbles
+        :param offset: index of the class's first entry
+        no return value
+        """
+        self.counts = (mover_count, opponent_count, red_count)
+        self.marbles = mover_count + opponent_count + red_count
+        self.arrangements = sorted(set(itertools.permutations('W' * mover_count + 'B' * opponent_count
+                                                              + 'R' * red_count)))
+        self.arrangement_ranks = {colors: rank for rank, colors in enumerate(self.arrangements)}
+
+        # each player needs 1 to red_count reds, or red_count + 1 for a red win they can't reach any more
+        self.need_count = red_count + 1
+        # no Ko, or the Ko rule blocking one of the mover's marbles in one direction
+        self.ko_count = 1 + 4 * mover_count
+        self.offset = offset
+        self.size = comb(49, self.marbles) * len(self.arrangements) * self.need_count ** 2 * self.ko_count
+
+
+class TablebaseLayout:
+    """
+    Represents the index of a tablebase: which material classes it covers and where each position is stored
+    """
+
+    def __init__(self, max_marbles):
+        """
+        initializes TablebaseLayout instance
+        :param max_marbles: most marbles on the board, both players need at least one
+        no return value
+        """
+        self.max_marbles = max_marbles
+        self.classes = {}
+        offset = 0
+        for total in range(2, max_marbles + 1):
+            for red_count in range(total - 1):
+                for mover_count in range(1, total - red_count):
+                    material = MaterialClass(mover_count, total - red_count - mover_count, red_count, offset)
+                    self.classes[material.counts] = material
+                    offset += material.size
+        self.size = offset
+
+    def locate(self, board):
+        """
+        :param board: list of 49 marbles, with the player to move as W
+        :return: tuple of (MaterialClass of the board, rank of the board among the boards of its class, sorted list of
+        occupied slot indices)
+        """
+        occupied = [slot for slot in range(49) if board[slot] != 'X']
+        colors = tuple(board[slot] for slot in occupied)
+        material = self.classes[(colors.count('W'), colors.count('B'), colors.count('R'))]
+        rank = 0
+        for position, slot in enumerate(occupied):
+            rank += comb(slot, position + 1)
+        return material, rank * len(material.arrangements) + material.arrangement_ranks[colors], occupied
+
+    @staticmethod
+    def entry(material, part, mover_need, opponent_need, ko_index):
+        """
+        :param material: MaterialClass of the position
+        :param part: rank of the board, from locate
+        :param mover_need: red marbles the player to move still needs to capture
+        :param opponent_need: red marbles the other player still needs to capture
+        :param ko_index: index of the canonical Ko state, from _ko_index
+        :return: index of the position's entry
+        """
+        need_count = material.need_count
+        need_index = (min(mover_need, need_count) - 1) * need_count + min(opponent_need, need_count) - 1
+        return material.offset + (part * need_count * need_count + need_index) * material.ko_count + ko_index
+
+    def index(self, board, mover_need, opponent_need, ko):
+        """
+        gets the index of a position, which must be covered by the layout
+        :param board: list of 49 marbles, with the player to move as W
+        :param mover_need: red marbles the player to move still needs to capture
+        :param opponent_need: red marbles the other player still needs to capture
+        :param ko: (slot index, direction) move the Ko rule forbids the player to move, or None
+        :return: index of the position's entry
+        """
+        material, part, occupied = self.locate(board)
+        return self.entry(material, part, mover_need, opponent_need,
+                          _ko_index(board, occupied, _canonical_ko(board, ko)))
+
+
+def _canonical_ko(board, ko):
+    """
+    :param board: list of 49 marbles, with the player to move as W
+    :param ko: (slot index, direction) move the Ko rule forbids, or None
+    :return: ko if the move would be legal without the Ko rule, None if the rule doesn't change anything
+    """
+    if ko is None:
+        return None
+    slot, direction = ko
+    if board[slot] != 'W':
+        return None
+    behind = BEHIND_SLOTS[direction][slot]
+    if behind is not None and board[behind] != 'X':
+        return None
+    ray = RAYS[direction][slot]
+    if board[ray[-1]] == 'W' and all(board[other] != 'X' for other in ray):
+        return None
+    return ko
+
+
+def _ko_index(board, occupied, ko):
+    """
+    :return: index of a canonical Ko state within its position: 0 for none, otherwise from the rank of the blocked
+    marble among the mover's marbles and the blocked direction
+    """
+    if ko is None:
+        return 0
+    slot, direction = ko
+    rank = sum(1 for other in occupied if other < slot and board[other] == 'W')
+    return 1 + rank * 4 + DIRECTIONS.index(direction)
+
+
+def _moves(board, ko):
+    """
+    generates the moves of the player to move, who plays W, the same way KubaGame.legal_moves does
+    :param board: list of 49 marbles
+    :param ko: (slot index, direction) move the Ko rule forbids, or None
+    :return: list of (slot index, direction, board after the move, slot the pushed line ended on, color of the marble
+    pushed off or None)
+    """
+    moves = []
+    for slot in range(49):
+        if board[slot] != 'W':
+            continue
+        for direction in DIRECTIONS:
+            behind = BEHIND_SLOTS[direction][slot]
+            if behind is not None and board[behind] != 'X':
+                continue
+            if ko is not None and ko[0] == slot and ko[1] == direction:
+                continue
+
+            ray = RAYS[direction][slot]
+            end = 0
+            while end < len(ray) - 1 and board[ray[end]] != 'X':
+                end += 1
+            fallen_marble = board[ray[end]] if board[ray[end]] != 'X' and end == len(ray) - 1 else None
+            if fallen_marble == 'W':
+                continue
+
+            new_board = list(board)
+            for position in range(end, 0, -1):
+                new_board[ray[position]] = board[ray[position - 1]]
+            new_board[slot] = 'X'
+            moves.append((slot, direction, new_board, ray[end], fallen_marble))
+    return moves
+
+
+def _successor(layout, move):
+    """
+    locates the position after a move, seen by the other player, apart from the red marbles each player needs
+    :param layout: TablebaseLayout
+    :param move: tuple from _moves
+    :return: tuple of (MaterialClass, board rank, Ko index, whether a red marble was captured) of the position after
+    the move, None if the move knocks off the other player's last marble and wins
+    """
+    _, direction, new_board, end_slot, fallen_marble = move
+    if fallen_marble == 'B' and 'B' not in new_board:
+        return None
+    swapped = [SWAPPED_COLORS[marble] for marble in new_board]
+    material, part, occupied = layout.locate(swapped)
+    ko_index = _ko_index(swapped, occupied, _canonical_ko(swapped, (end_slot, OPPOSITE_DIRECTIONS[direction])))
+    return material, part, ko_index, fallen_marble == 'R'
+
+
+def _solve_layer(layout, values, total, progress):
+    """
+    solves the positions with total marbles on the board, once every position with fewer marbles is solved. Moves
+    that knock a marble off lead to smaller layers; the rest stay in this layer and are solved by retrograde
+    analysis: positions are finalized in order of distance, a position with a lost successor is won one move later,
+    and a position all of whose successors are won is lost one move after the slowest of them.
+    :param layout: TablebaseLayout
+    :param values: array of values for the whole layout, filled in for this layer
+    :param total: number of marbles in the layer
+    :param progress: function called with a status string, or None
+    :return: no return value
+    """
+    materials = [material for material in layout.classes.values() if material.marbles == total]
+    start = min(material.offset for material in materials)
+    stop = max(material.offset + material.size for material in materials)
+
+    remaining = array('i', bytes(4 * (stop - start)))
+    loss_after = array('h', bytes(2 * (stop - start)))
+    can_lose = bytearray(stop - start)
+    edge_sources = array('i')
+    edge_targets = array('i')
+    win_buckets = {}
+    loss_buckets = {}
+
+    for material in materials:
+        mover_count = material.counts[0]
+        need_count = material.need_count
+        for occupied in itertools.combinations(range(49), total):
+            for colors in material.arrangements:
+                board = ['X'] * 49
+                for slot, marble in zip(occupied, colors):
+                    board[slot] = marble
+                part = layout.locate(board)[1]
+                all_moves = _moves(board, None)
+                successors = [_successor(layout, move) for move in all_moves]
+                mover_slots = [slot for slot in occupied if board[slot] == 'W']
+
+                ko_states = [None] + [(slot, direction) for slot in mover_slots for direction in DIRECTIONS]
+                for ko_index, ko in enumerate(ko_states):
+                    if ko is not None and _canonical_ko(board, ko) is None:
+                        continue
+                    moves = [(move, successor) for move, successor in zip(all_moves, successors)
+                             if ko is None or move[0] != ko[0] or move[1] != ko[1]]
+
+                    for mover_need in range(1, need_count + 1):
+                        for opponent_need in range(1, need_count + 1):
+                            index = (material.offset + (part * need_count ** 2 + (mover_need - 1) * need_count
+                                                        + opponent_need - 1) * material.ko_count + ko_index)
+                            local = index - start
+                            values[index] = 0
+                            if not moves:
+                                continue
+
+                            best_win = None
+                            slowest_loss = 0
+                            drawn = False
+                            internal = 0
+                            for move, successor in moves:
+                                if successor is None or (successor[3] and mover_need == 1):
+                                    best_win = 1
+                                    continue
+                                successor_material, successor_part, successor_ko, red_captured = successor
+                                successor_index = layout.entry(successor_material, successor_part, opponent_need,
+                                                               mover_need - red_captured, successor_ko)
+                                if move[4] is None:
+                                    edge_sources.append(local)
+                                    edge_targets.append(successor_index - start)
+                                    internal += 1
+                                    continue
+                                value = values[successor_index]
+                                if value < 0:
+                                    if best_win is None or 1 - value < best_win:
+                                        best_win = 1 - value
+                                elif value > 0:
+                                    slowest_loss = max(slowest_loss, value + 1)
+                                else:
+                                    drawn = True
+
+                            remaining[local] = internal
+                            loss_after[local] = slowest_loss
+                            if best_win is not None:
+                                win_buckets.setdefault(best_win, []).append(local)
+                            elif not drawn:
+                                can_lose[local] = 1
+                                if internal == 0:
+                                    loss_buckets.setdefault(slowest_loss, []).append(local)
+        if progress is not None:
+            progress("enumerated %s: %d entries" % (material.counts, material.size))
+
+    # predecessors of each position, in compressed rows
+    first_edge = array('i', bytes(4 * (stop - start + 1)))
+    for target in edge_targets:
+        first_edge[target + 1] += 1
+    for local in range(stop - start):
+        first_edge[local + 1] += first_edge[local]
+    fill = array('i', first_edge)
+    predecessors = array('i', bytes(4 * len(edge_targets)))
+    for source, target in zip(edge_sources, edge_targets):
+        predecessors[fill[target]] = source
+        fill[target] += 1
+    del edge_sources, edge_targets, fill
+
+    distance = 1
+    while win_buckets or loss_buckets:
+        for local in win_buckets.pop(distance, ()):
+            if values[start + local] != 0:
+                continue
+            values[start + local] = distance
+            for edge in range(first_edge[local], first_edge[local + 1]):
+                predecessor = predecessors[edge]
+                if values[start + predecessor] != 0:
+                    continue
+                remaining[predecessor] -= 1
+                if loss_after[predecessor] < distance + 1:
+                    loss_after[predecessor] = distance + 1
+                if remaining[predecessor] == 0 and can_lose[predecessor]:
+                    loss_buckets.setdefault(loss_after[predecessor], []).append(predecessor)
+
+        for local in loss_buckets.pop(distance, ()):
+            if values[start + local] != 0:
+                continue
+            values[start + local] = -distance
+            for edge in range(first_edge[local], first_edge[local + 1]):
+                predecessor = predecessors[edge]
+                if values[start + predecessor] == 0:
+                    win_buckets.setdefault(distance + 1, []).append(predecessor)
+        distance += 1
+        if distance > 32767:
+            raise OverflowError("distance to win doesn't fit in 16 bits")
+
+
+def generate(path, max_marbles=DEFAULT_MAX_MARBLES, progress=None):
+    """
+    builds a tablebase and writes it to path
+    :param path: file to write
+    :param max_marbles: most marbles on the board covered by the tablebase. Sizes grow quickly: 3 takes about three
+    million entries.
+    :param progress: function called with a status string as each part is done, or None
+    :return: dictionary with the number of entries, won, lost and drawn positions and the longest win
+    """
+    layout = TablebaseLayout(max_marbles)
+    values = array('h', [NOT_A_POSITION]) * layout.size
+    for total in range(2, max_marbles + 1):
+        _solve_layer(layout, values, total, progress)
+        if progress is not None:
+            progress("solved positions with %d marbles" % total)
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+    with open(path, 'wb') as tablebase_file:
+        tablebase_file.write(TABLEBASE_HEADER.pack(TABLEBASE_MAGIC, max_marbles, layout.size).ljust(HEADER_SIZE,
+                                                                                                     b'\0'))
+        values.tofile(tablebase_file)
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    positions = [value for value in values if value != NOT_A_POSITION]
+    return {
+        'entries': layout.size,
+        'positions': len(positions),
+        'won': sum(1 for value in positions if value > 0),
+        'lost': sum(1 for value in positions if value < 0),
+        'drawn': sum(1 for value in positions if value == 0),
+        'longest_win': max(positions, default=0),
+    }
+
+
+class Tablebase:
+    """
+    Represents a tablebase file mapped into memory, for looking up games whose positions it covers
+    """
+
+    def __init__(self, path):
+        """
+        initializes Tablebase instance
+        :param path: file written by generate
+        no return value
+        """
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, max_marbles, size = TABLEBASE_HEADER.unpack_from(self._map, 0)
+        if magic != TABLEBASE_MAGIC or len(self._map) != HEADER_SIZE + 2 * size:
+            self.close()
+            raise ValueError(path + " is not a Kuba tablebase")
+        self._layout = TablebaseLayout(max_marbles)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        closes the file
+        no parameters
+        :return: no return value
+        """
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def get_max_marbles(self):
+        """
+        :return: most marbles on the board covered by the tablebase
+        """
+        return self._layout.max_marbles
+
+    def probe(self, game):
+        """
+        looks up the position of a game
+        :param game: KubaGame or a subclass
+        :return: value for the player whose turn it is: n > 0 if they win in n moves, -n if they lose in n moves, 0 if
+        neither player can force a win. None if the position isn't covered: too many marbles, the game is over or it
+        is the first move, when either player may move.
+        """
+        playername = game.get_current_turn()
+        if playername is None or game.get_winner() is not None:
+            return None
+        board = [marble for row in game.get_board() for marble in row]
+        if 49 - board.count('X') > self._layout.max_marbles:
+            return None
+
+        first, second = game.get_playernames()
+        mover = game.get_player_from_name(playername)
+        opponent = game.get_player_from_name(second if playername == first else first)
+        if mover.get_marble_color() == 'B':
+            board = [SWAPPED_COLORS[marble] for marble in board]
+
+        ko = None
+        if game._last_slot_moved is not None:
+            row, col = game._last_slot_moved
+            ko = (row * 7 + col, OPPOSITE_DIRECTIONS[game._prev_direction])
+        index = self._layout.index(board, RED_MARBLES_TO_WIN - mover.get_red_count(),
+                                   RED_MARBLES_TO_WIN - opponent.get_red_count(), ko)
+        return VALUE.unpack_from(self._map, HEADER_SIZE + 2 * index)[0]
+
+
+def main(argv=None):
+    """
+    command line entry point: generates a tablebase and prints its statistics as JSON
+    :param argv: command line arguments, defaults to sys.argv
+    :return: no return value
+    """
+    parser = argparse.ArgumentParser(description="Generate a Kuba endgame tablebase.")
+    parser.add_argument('path', help="file to write")
+    parser.add_argument('--max-marbles', type=int, default=DEFAULT_MAX_MARBLES,
+                        help="most marbles on the board to cover (default %d)" % DEFAULT_MAX_MARBLES)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = generate(args.path, args.max_marbles, lambda status: print(status, file=sys.stderr))
+    stats['seconds'] = time.perf_counter() - start
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
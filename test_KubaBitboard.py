@@ -0,0 +1,94 @@
+# Description: Tests that BitboardKubaGame plays recorded games exactly the way KubaGame does. Games of seeded random
+#              moves are written as KubaRecord records, read back, and replayed through both engines side by side.
+
+import random
+import unittest
+
+from KubaGame import KubaGame
+from KubaBitboard import BitboardKubaGame
+from KubaRecord import MOVES, encode_game, decode_game, decode_move
+
+PLAYERS = (('White', 'W'), ('Black', 'B'))
+
+
+def _record_random_game(seed, max_moves=200):
+    """
+    plays seeded random legal moves on a KubaGame and records them
+    :param seed: seed for the moves and for which player moves first
+    :param max_moves: number of moves after which the game is stopped if nobody has won
+    :return: GameRecord read back from the encoded game
+    """
+    rng = random.Random(seed)
+    game = KubaGame(PLAYERS[0], PLAYERS[1])
+    first_mover = rng.randrange(2)
+    playername = PLAYERS[first_mover][0]
+    moves = []
+    while game.get_winner() is None and len(moves) < max_moves:
+        legal = sorted(game.legal_moves(playername))
+        if not legal:
+            break
+        move = rng.choice(legal)
+        game.make_move(playername, move[0], move[1])
+        moves.append(move)
+        playername = game.get_current_turn()
+    return decode_game(encode_game(PLAYERS[0], PLAYERS[1], first_mover, moves))[0]
+
+
+class TestBitboardMatchesKubaGame(unittest.TestCase):
+    """
+    Contains unit tests comparing BitboardKubaGame with KubaGame
+    """
+
+    def assert_same_state(self, game, bitboard_game):
+        """
+        asserts that both games are in the same state
+        """
+        self.assertEqual(game.get_board(), bitboard_game.get_board())
+        self.assertEqual(game.get_marble_count(), bitboard_game.get_marble_count())
+        for playername, _ in PLAYERS:
+            self.assertEqual(game.get_captured(playername), bitboard_game.get_captured(playername))
+        self.assertEqual(game.get_winner(), bitboard_game.get_winner())
+        self.assertEqual(game.get_current_turn(), bitboard_game.get_current_turn())
+        self.assertEqual(game.get_hash(), bitboard_game.get_hash())
+
+    def test_recorded_games(self):
+        """
+        tests that every recorded move, and every other move either player could try before it, gets the same
+        MoveResult from both engines, and that both engines are in the same state after each move
+        """
+        for seed in range(12):
+            record = _record_random_game(seed)
+            game = KubaGame(record.player1, record.player2)
+            bitboard_game = BitboardKubaGame(record.player1, record.player2)
+            playername = (record.player1, record.player2)[record.first_mover][0]
+            for move_number, move_byte in enumerate(record.moves, 1):
+                for name, _ in PLAYERS:
+                    self.assertEqual(set(game.legal_moves(name)), set(bitboard_game.legal_moves(name)))
+                    for coordinates, direction in MOVES:
+                        self.assertEqual(game.validate_move(name, coordinates, direction),
+                                         bitboard_game.validate_move(name, coordinates, direction),
+                                         (seed, move_number, name, coordinates, direction))
+
+                coordinates, direction = decode_move(move_byte)
+                result = game.make_move(playername, coordinates, direction)
+                self.assertTrue(result)
+                self.assertIs(bitboard_game.make_move(playername, coordinates, direction), result)
+                self.assert_same_state(game, bitboard_game)
+                playername = game.get_current_turn()
+
+    def test_rejected_moves_leave_state(self):
+        """
+        tests that both engines reject the same invalid move with the same MoveResult and don't change
+        """
+        game = KubaGame(PLAYERS[0], PLAYERS[1])
+        bitboard_game = BitboardKubaGame(PLAYERS[0], PLAYERS[1])
+        for playername, coordinates, direction in (('White', (0, 0), 'L'), ('White', (0, 5), 'R'),
+                                                   ('Black', (1, 1), 'B'), ('White', (1, 1), 'R')):
+            result = game.make_move(playername, coordinates, direction)
+            self.assertFalse(result)
+            self.assertIs(bitboard_game.make_move(playername, coordinates, direction), result)
+            self.assert_same_state(game, bitboard_game)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# Description: Tests that EvaluationCache keeps every stored entry, including one whose fields are all zero, and tells
+#              stored entries apart from empty slots.
+
+import os
+import tempfile
+import unittest
+
+from KubaCache import EvaluationCache, _pack_data, _unpack_data
+from KubaSearch import EXACT
+
+
+class TestEvaluationCache(unittest.TestCase):
+    """
+    Contains unit tests for EvaluationCache
+    """
+
+    def setUp(self):
+        """
+        creates a small cache in a temporary directory
+        """
+        self._directory = tempfile.TemporaryDirectory()
+        self._cache = EvaluationCache(os.path.join(self._directory.name, 'test.cache'), slots=16, bucket_size=4)
+
+    def tearDown(self):
+        """
+        closes and removes the cache
+        """
+        self._cache.close()
+        self._directory.cleanup()
+
+    def test_data_word_round_trip(self):
+        """
+        tests that packed fields unpack to the same values, and that no entry packs to the empty slot's 0
+        """
+        self.assertNotEqual(_pack_data(0, 0, EXACT, 0, 0), 0)
+        self.assertEqual(_unpack_data(_pack_data(-5, 7, 2, 195, 8191)), (-5, 7, 2, 195, 8191))
+
+    def test_all_zero_entry_is_kept(self):
+        """
+        tests that an entry with value, depth, bound, move and generation all 0 is found, counted, and not
+        overwritten as if its slot were empty
+        """
+        self.assertEqual(self._cache.get_generation(), 0)
+        self.assertTrue(self._cache.store(4, 0, 0, EXACT, ((0, 0), 'L')))
+        self.assertEqual(len(self._cache), 1)
+
+        # the other keys of the same bucket fill the empty slots around it
+        for key in (8, 12, 16):
+            self._cache.store(key, 3, 1)
+        entry = self._cache.lookup(4)
+        self.assertIsNotNone(entry)
+        self.assertEqual((entry.depth, entry.value, entry.bound, entry.move), (0, 0, EXACT, ((0, 0), 'L')))
+        self.assertEqual(len(self._cache), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# Description: Tests that importing the Kuba rules engine stays within KubaBench.IMPORT_TIME_BUDGET and doesn't
+#              load pygame, which only KubaGUI needs.
+
+import os
+import subprocess
+import sys
+import unittest
+
+from KubaBench import IMPORT_TIME_BUDGET
+
+IMPORT_CODE = ("import sys, time\n"
+               "start = time.perf_counter()\n"
+               "import KubaGame\n"
+               "print(time.perf_counter() - start, 'pygame' in sys.modules)\n")
+
+
+def _import_in_subprocess():
+    """
+    imports KubaGame in a fresh interpreter
+    :return: tuple of (seconds the import took, whether pygame was loaded)
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, '-c', IMPORT_CODE], cwd=here, capture_output=True, text=True,
+                            check=True).stdout.split()
+    return float(output[0]), output[1] == 'True'
+
+
+class TestKubaGameImport(unittest.TestCase):
+    """
+    Contains unit tests for importing KubaGame
+    """
+
+    def test_import_within_budget(self):
+        """
+        tests that the fastest of a few imports finishes within the budget, so a busy machine doesn't fail it
+        """
+        best = min(_import_in_subprocess()[0] for _ in range(3))
+        self.assertLess(best, IMPORT_TIME_BUDGET)
+
+    def test_import_does_not_load_pygame(self):
+        """
+        tests that pygame isn't in sys.modules after importing KubaGame
+        """
+        self.assertFalse(_import_in_subprocess()[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# Description: Tests every engine against the perft counts from the starting position, so a faster backend that
+#              gets a rule wrong fails here instead of only when someone runs KubaPerft.py --check.
+
+import unittest
+
+from KubaPerft import perft, ENGINES, PLAYERS, STARTING_POSITION_COUNTS
+
+# deepest counts checked; depth 5 and 6 take too long for a test run
+MAX_TEST_DEPTH = 4
+
+
+class TestStartingPositionCounts(unittest.TestCase):
+    """
+    Contains unit tests comparing perft from the starting position with STARTING_POSITION_COUNTS
+    """
+
+    def test_engines(self):
+        """
+        tests each engine at every depth up to MAX_TEST_DEPTH, counting in this process
+        """
+        for engine_name, engine in sorted(ENGINES.items()):
+            for depth in range(1, MAX_TEST_DEPTH + 1):
+                with self.subTest(engine=engine_name, depth=depth):
+                    game = engine(PLAYERS[0], PLAYERS[1])
+                    self.assertEqual(perft(game, depth), STARTING_POSITION_COUNTS[depth])
+
+    def test_engines_in_process_pool(self):
+        """
+        tests each engine at MAX_TEST_DEPTH with the root moves split across two processes
+        """
+        for engine_name, engine in sorted(ENGINES.items()):
+            with self.subTest(engine=engine_name):
+                game = engine(PLAYERS[0], PLAYERS[1])
+                self.assertEqual(perft(game, MAX_TEST_DEPTH, processes=2), STARTING_POSITION_COUNTS[MAX_TEST_DEPTH])
+
+    def test_game_left_unchanged(self):
+        """
+        tests that perft leaves the game it searched as it was
+        """
+        for engine_name, engine in sorted(ENGINES.items()):
+            with self.subTest(engine=engine_name):
+                game = engine(PLAYERS[0], PLAYERS[1])
+                board, key = game.get_board(), game.get_hash()
+                perft(game, 3)
+                self.assertEqual((game.get_board(), game.get_hash(), game.get_current_turn()), (board, key, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# Description: Tests that AIPlayer's win and loss values mean the same distance to the end of the game whether they
+#              were searched directly or read from a transposition table filled from a different root.
+
+import random
+import unittest
+
+from KubaGame import KubaGame
+from KubaSearch import AIPlayer, TranspositionTable, WIN_VALUE, WIN_THRESHOLD, _value_to_table, _value_from_table
+
+PLAYERS = (('White', 'W'), ('Black', 'B'))
+
+
+def _endgame(seed):
+    """
+    plays seeded random moves, mostly captures, to a few moves before the game is won
+    :param seed: seed for the moves
+    :return: tuple of (game, name of the player who made the last move, that move), None if the game was too short
+    """
+    rng = random.Random(seed)
+    game = KubaGame(PLAYERS[0], PLAYERS[1])
+    playername = PLAYERS[0][0]
+    history = []
+    while game.get_winner() is None and len(history) < 300:
+        moves = sorted(game.legal_moves(playername))
+        if not moves:
+            break
+        captures = [move for move in moves if game.get_pushed_off_marble(move[0], move[1]) is not None]
+        move = rng.choice(captures if captures and rng.random() < 0.9 else moves)
+        game.push_move(playername, move[0], move[1])
+        history.append((playername, move))
+        playername = game.get_current_turn()
+
+    for _ in range(min(2, len(history))):
+        game.pop_move()
+        history.pop()
+    if len(history) < 2 or game.get_winner() is not None:
+        return None
+    playername, move = history[-1]
+    return game, playername, move
+
+
+class TestWinValues(unittest.TestCase):
+    """
+    Contains unit tests for how AIPlayer stores win and loss values
+    """
+
+    def test_table_values_count_from_the_position(self):
+        """
+        tests that a win stored at one ply is read back as the same distance to the end at another ply
+        """
+        # a win on move 5 from the root, seen from a position 2 moves from the root, is 3 moves away
+        stored = _value_to_table(WIN_VALUE - 5, 2)
+        self.assertEqual(stored, WIN_VALUE - 3)
+        self.assertEqual(_value_from_table(stored, 2), WIN_VALUE - 5)
+        self.assertEqual(_value_from_table(stored, 6), WIN_VALUE - 9)
+        self.assertEqual(_value_from_table(_value_to_table(5 - WIN_VALUE, 2), 0), 3 - WIN_VALUE)
+        self.assertEqual(_value_from_table(_value_to_table(37, 2), 6), 37)
+
+    def test_shared_table_keeps_win_distance(self):
+        """
+        tests that searching a position with a table filled by a search from the position before it gives the same
+        value as searching it with an empty table, when either search finds a win or a loss
+        """
+        wins = 0
+        for seed in range(40):
+            endgame = _endgame(seed)
+            if endgame is None:
+                continue
+            game, parent_name, move = endgame
+            game.pop_move()
+            parent_color = game.get_player_from_name(parent_name).get_marble_color()
+            table = TranspositionTable(1 << 16)
+            AIPlayer(parent_name, parent_color, time_budget=60, max_depth=4, table=table).choose_move(game)
+            game.push_move(parent_name, move[0], move[1])
+
+            playername = game.get_current_turn()
+            marble_color = game.get_player_from_name(playername).get_marble_color()
+            fresh = AIPlayer(playername, marble_color, time_budget=60, max_depth=3)
+            fresh.choose_move(game)
+            shared = AIPlayer(playername, marble_color, time_budget=60, max_depth=3, table=table)
+            shared.choose_move(game)
+            # deeper entries from the first search can change other values, but not the distance to a win
+            value = fresh.get_search_info()['value']
+            shared_value = shared.get_search_info()['value']
+            if abs(value) >= WIN_THRESHOLD or abs(shared_value) >= WIN_THRESHOLD:
+                wins += 1
+                self.assertEqual(shared_value, value, seed)
+        self.assertGreater(wins, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
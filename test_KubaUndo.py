@@ -0,0 +1,98 @@
+# Description: Tests that KubaGame.pop_move restores the exact state from before the matching push_move, on both the
+#              list engine and the bitboard engine. Search, perft, MCTS and the tablebase all rely on this.
+
+import random
+import unittest
+
+from KubaGame import KubaGame
+from KubaBitboard import BitboardKubaGame
+
+PLAYERS = (('White', 'W'), ('Black', 'B'))
+
+
+def _snapshot(game):
+    """
+    copies every part of the game state that push_move changes
+    :param game: KubaGame or BitboardKubaGame
+    :return: dictionary of the state
+    """
+    return {
+        'board': game.get_board(),
+        'marble_counts': dict(game._marble_counts),
+        'red_counts': tuple(game.get_captured(playername) for playername, _ in PLAYERS),
+        'turn': game.get_current_turn(),
+        'winner': game.get_winner(),
+        'ko': (game._last_slot_moved, game._prev_direction),
+        'hash': game.get_hash(),
+        'accessible': {direction: set(slots) for direction, slots in game._accessible.items()},
+    }
+
+
+class TestPushPop(unittest.TestCase):
+    """
+    Contains unit tests for push_move and pop_move
+    """
+
+    def check_engine(self, engine):
+        """
+        pushes seeded random legal moves, mostly captures, until the game ends or a length limit is reached, then
+        pops them all, checking after each pop that the state is the one from before the move was pushed
+        :param engine: KubaGame or BitboardKubaGame
+        """
+        wins = 0
+        for seed in range(30):
+            rng = random.Random(seed)
+            game = engine(PLAYERS[0], PLAYERS[1])
+            snapshots = []
+            playername = rng.choice(PLAYERS)[0]
+            length = rng.randrange(20, 400)
+            while game.get_winner() is None and len(snapshots) < length:
+                moves = sorted(game.legal_moves(playername))
+                if not moves:
+                    break
+                # mostly take captures when there are any, so that games get won
+                captures = [move for move in moves if game.get_pushed_off_marble(move[0], move[1]) is not None]
+                move = rng.choice(captures if captures and rng.random() < 0.8 else moves)
+                snapshots.append((_snapshot(game), (playername,) + move))
+                self.assertTrue(game.push_move(playername, move[0], move[1]))
+                playername = game.get_current_turn()
+            if game.get_winner() is not None:
+                wins += 1
+
+            while snapshots:
+                before, move = snapshots.pop()
+                self.assertEqual(game.pop_move(), move)
+                self.assertEqual(_snapshot(game), before, (engine.__name__, seed, len(snapshots)))
+            self.assertEqual(game._undo_stack, [])
+            self.assertEqual(_snapshot(game), _snapshot(engine(PLAYERS[0], PLAYERS[1])))
+        # some games have to end in a win for the winner to be restored
+        self.assertGreater(wins, 0)
+
+    def test_list_engine(self):
+        """
+        tests push_move and pop_move on KubaGame
+        """
+        self.check_engine(KubaGame)
+
+    def test_bitboard_engine(self):
+        """
+        tests push_move and pop_move on BitboardKubaGame
+        """
+        self.check_engine(BitboardKubaGame)
+
+    def test_rejected_push_is_not_stacked(self):
+        """
+        tests that a move push_move rejects changes nothing and isn't taken back by pop_move
+        """
+        for engine in (KubaGame, BitboardKubaGame):
+            game = engine(PLAYERS[0], PLAYERS[1])
+            self.assertTrue(game.push_move('White', (6, 6), 'F'))
+            before = _snapshot(game)
+            self.assertFalse(game.push_move('White', (0, 0), 'B'))
+            self.assertEqual(_snapshot(game), before)
+            self.assertEqual(game.pop_move(), ('White', (6, 6), 'F'))
+            self.assertEqual(game._undo_stack, [])
+
+
+if __name__ == '__main__':
+    unittest.main()